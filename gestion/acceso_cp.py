@@ -0,0 +1,122 @@
+# /var/www/tickets/gestion/acceso_cp.py
+"""
+Verificación de credenciales para las terminales de CP.
+
+- El usuario se busca por LOWER(username), que usa el índice de la migración
+  0017 en lugar de recorrer auth_user.
+- Una verificación exitosa se guarda CP_CACHE_TTL segundos bajo un HMAC de
+  usuario y contraseña (nunca la contraseña) junto con la versión de autorización
+  del usuario. Guardar el usuario (cambio de contraseña, desactivarlo) o cambiar
+  sus grupos sube esa versión, así que la entrada deja de valer en el acto.
+  Solo con caché compartida (ver autorizacion.cache_compartida): con una por
+  proceso la invalidación no llegaría a los otros workers y cada verificación
+  corre el hash.
+- Cada IP tiene una cubeta de tokens por request (un lote consume uno por
+  credencial) y cada usuario otra que solo se gasta cuando hay que correr el hash
+  de la contraseña, que es lo caro. La IP es la de views._ip_cliente: detrás de
+  un proxy hay que configurar CABECERA_IP_CLIENTE o todas las terminales
+  compartirían la cubeta del proxy.
+"""
+
+import math
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.functions import Lower
+from django.utils.crypto import salted_hmac
+
+from . import limites, metricas
+from .autorizacion import cache_compartida, contexto_de_usuario, version_usuario
+
+OK = (200, 'ok', 'Acceso concedido.')
+FALTAN_CREDENCIALES = (400, 'error', 'Faltan credenciales.')
+CREDENCIALES_INVALIDAS = (401, 'error', 'Credenciales inválidas.')
+INACTIVO = (403, 'error', 'La cuenta de usuario está inactiva.')
+SIN_PERMISO = (403, 'error', 'Usuario no tiene permisos para CP.')
+DEMASIADOS_INTENTOS = (429, 'error', 'Demasiados intentos. Reintente más tarde.')
+# Etiqueta de cada resultado en tickets_verificar_acceso_cp_total
+NOMBRES_RESULTADOS = {
+    OK: 'ok', FALTAN_CREDENCIALES: 'faltan_credenciales', CREDENCIALES_INVALIDAS: 'credenciales_invalidas',
+    INACTIVO: 'inactivo', SIN_PERMISO: 'sin_permiso', DEMASIADOS_INTENTOS: 'limite_usuario',
+}
+
+_NO_CARGADO = object()
+
+
+def _usuarios_por_nombre(nombres):
+    """ {nombre en minúsculas: usuario} en una sola consulta sobre el índice de LOWER(username). """
+    minusculas = {nombre.lower() for nombre in nombres}
+    usuarios = get_user_model().objects.alias(username_minusculas=Lower('username')).filter(username_minusculas__in=minusculas)
+    return {usuario.username.lower(): usuario for usuario in usuarios}
+
+
+def _clave_cache(username: str, password: str) -> str:
+    return 'cp:ok:' + salted_hmac('gestion.acceso_cp', f'{username.lower()}\0{password}', algorithm='sha256').hexdigest()
+
+
+def limite_ip(ip: str, costo: int = 1) -> float:
+    """ Segundos de espera para la IP, o 0 si puede seguir. """
+    return limites.consumir(
+        limites.clave('cp_ip', ip or '-'),
+        getattr(settings, 'CP_IP_CAPACIDAD', 120),
+        getattr(settings, 'CP_IP_POR_SEGUNDO', 2),
+        costo,
+    )
+
+
+def verificar(username, password, usuario=_NO_CARGADO):
+    """ Devuelve (código HTTP, status, mensaje). `usuario` evita la consulta si ya se cargó (None = no existe). """
+    resultado = _verificar(username, password, usuario)
+    metricas.ACCESO_CP.inc(resultado=NOMBRES_RESULTADOS[resultado])
+    return resultado
+
+
+def _verificar(username, password, usuario):
+    if not username or not password or not isinstance(username, str) or not isinstance(password, str):
+        return FALTAN_CREDENCIALES
+
+    clave = _clave_cache(username, password) if cache_compartida() else None
+    if clave:
+        guardado = cache.get(clave)
+        if guardado and guardado['version'] == version_usuario(guardado['user_id']):
+            metricas.CACHE.inc(cache='acceso_cp', resultado='acierto')
+            return OK
+        metricas.CACHE.inc(cache='acceso_cp', resultado='fallo')
+
+    if limites.consumir(
+        limites.clave('cp_usuario', username.lower()),
+        getattr(settings, 'CP_USUARIO_CAPACIDAD', 10),
+        getattr(settings, 'CP_USUARIO_POR_SEGUNDO', 0.2),
+    ):
+        return DEMASIADOS_INTENTOS
+
+    if usuario is _NO_CARGADO:
+        usuario = _usuarios_por_nombre([username]).get(username.lower())
+    if usuario is None or not usuario.check_password(password):
+        return CREDENCIALES_INVALIDAS
+    if not usuario.is_active:
+        return INACTIVO
+    # La versión se lee antes que los grupos: si cambian en el medio, la entrada nace vencida
+    version = version_usuario(usuario.pk)
+    if not contexto_de_usuario(usuario.pk).acceso_cp:
+        return SIN_PERMISO
+    if clave:
+        cache.set(clave, {'user_id': usuario.pk, 'version': version}, getattr(settings, 'CP_CACHE_TTL', 60))
+    return OK
+
+
+def verificar_lote(credenciales):
+    """ Verifica una lista de {'username', 'password'} con una sola consulta de usuarios. """
+    nombres = [c.get('username') for c in credenciales if isinstance(c.get('username'), str) and c.get('username')]
+    usuarios = _usuarios_por_nombre(nombres) if nombres else {}
+    resultados = []
+    for credencial in credenciales:
+        username, password = credencial.get('username'), credencial.get('password')
+        usuario = usuarios.get(username.lower()) if isinstance(username, str) else None
+        resultados.append((username, verificar(username, password, usuario)))
+    return resultados
+
+
+def segundos_reintento(espera: float) -> str:
+    return str(max(1, math.ceil(espera)))
@@ -0,0 +1,99 @@
+# /var/www/tickets/gestion/acciones_masivas.py
+"""
+Cambio de estado, de área o de asignado para varios tickets a la vez.
+
+`aplicar()` hace las mismas sentencias sin importar cuántos tickets se elijan:
+una lectura de los que de verdad cambian, un UPDATE, una pasada por el rollup de
+informes (y por el de palabras si cambia el área) y un INSERT con las
+notificaciones. Solo se mueve fecha_actualizacion, que es lo que sigue el
+dashboard en vivo: fecha_ultima_modificacion queda para los comentarios. La auditoría va en un solo lote. Como el
+UPDATE no pasa por save(), las señales de Ticket no corren y los rollups se
+ajustan acá, igual que en gestion.comentarios. El índice de texto no se toca
+porque solo guarda título, descripción y comentarios.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import auditoria, notificaciones
+from .models import FrecuenciaPalabra, ResumenTicket, Ticket
+
+ESTADO = 'estado'
+AREA = 'area'
+USUARIO = 'usuario'
+
+CAMPOS = {ESTADO: 'estado', AREA: 'area_asignada', USUARIO: 'usuario_asignado'}
+_SIN_VALOR = {ESTADO: '', AREA: 'Sin área', USUARIO: 'Sin asignar'}
+
+
+def _nombre(objeto, accion):
+    return str(objeto) if objeto is not None else _SIN_VALOR[accion]
+
+
+def _evento_auditoria(accion, actor, ticket_id, anterior, nuevo, valor):
+    if accion == ESTADO:
+        return {
+            'tipo': auditoria.CAMBIO_ESTADO,
+            'mensaje': f"Usuario '{actor.username}' cambió el estado del ticket #{ticket_id} de '{anterior}' a '{nuevo}'.",
+            'actor': actor, 'ticket': ticket_id, 'anterior': anterior, 'nuevo': nuevo,
+        }
+    if accion == AREA:
+        return {
+            'tipo': auditoria.TICKET_REASIGNADO_AREA,
+            'mensaje': f"Usuario '{actor.username}' pasó el ticket #{ticket_id} del área '{anterior}' a '{nuevo}'.",
+            'actor': actor, 'ticket': ticket_id, 'anterior': anterior, 'nuevo': nuevo,
+        }
+    return {
+        'tipo': auditoria.TICKET_ASIGNADO,
+        'mensaje': f"Usuario '{actor.username}' asignó el ticket #{ticket_id} a '{nuevo}'.",
+        'actor': actor, 'ticket': ticket_id, 'usuario': valor, 'anterior': anterior, 'nuevo': nuevo,
+    }
+
+
+def aplicar(tickets, accion, valor, actor):
+    """
+    Pasa a `valor` (un EstadoTicket, Area o User; None quita el área o el asignado)
+    el campo de `accion` en los tickets del queryset `tickets`, que ya viene filtrado
+    por permisos. Devuelve cuántos tickets cambiaron.
+    """
+    campo = CAMPOS[accion]
+    columna = f'{campo}_id'
+    columnas = {'id', columna, *ResumenTicket.CAMPOS_CLAVE, *FrecuenciaPalabra.CAMPOS_CLAVE}
+    nuevo = _nombre(valor, accion)
+    nuevo_id = valor.pk if valor is not None else None
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        # Bloqueadas hasta el commit: un guardado simultáneo no puede descontar las mismas claves del rollup
+        filas = list(tickets.exclude(**{campo: valor}).order_by('id').select_for_update(of=('self',)).values(*columnas))
+        if not filas:
+            return 0
+        ids = [fila['id'] for fila in filas]
+        Ticket.objects.filter(id__in=ids).update(**{
+            campo: valor, 'fecha_actualizacion': ahora,
+        })
+
+        antes = [Ticket(**fila) for fila in filas]
+        despues = [Ticket(**{**fila, columna: nuevo_id, 'fecha_actualizacion': ahora}) for fila in filas]
+        resuelto_id = ResumenTicket.estado_resuelto_id()
+        ResumenTicket.registrar_cambios([
+            (ResumenTicket.clave_de(a, resuelto_id), ResumenTicket.clave_de(d, resuelto_id)) for a, d in zip(antes, despues)
+        ])
+        if accion == AREA:
+            FrecuenciaPalabra.registrar_cambios([
+                (FrecuenciaPalabra.clave_de(a), FrecuenciaPalabra.clave_de(d)) for a, d in zip(antes, despues)
+            ])
+
+        if accion == ESTADO:
+            notificaciones.encolar_eventos_tickets([(i, notificaciones.CAMBIO_ESTADO, nuevo) for i in ids], actor)
+        elif valor is not None:
+            evento = notificaciones.CAMBIO_AREA if accion == AREA else notificaciones.ASIGNACION
+            notificaciones.encolar_eventos_tickets([(i, evento, nuevo) for i in ids], actor)
+
+    modelo = Ticket._meta.get_field(campo).related_model
+    anteriores = modelo.objects.in_bulk({fila[columna] for fila in filas} - {None})
+    auditoria.registrar_varios([
+        _evento_auditoria(accion, actor, fila['id'], _nombre(anteriores.get(fila[columna]), accion), nuevo, valor)
+        for fila in filas
+    ])
+    return len(filas)
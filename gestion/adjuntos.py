@@ -0,0 +1,268 @@
+# /var/www/tickets/gestion/adjuntos.py
+"""
+Almacenamiento de adjuntos por contenido.
+
+Cada archivo se guarda una sola vez en ADJUNTOS_ROOT/<aa>/<bb>/<sha256>, y los
+ArchivoAdjunto con el mismo contenido apuntan al mismo ContenidoAdjunto. Con
+`SubidaConHash` en FILE_UPLOAD_HANDLERS el hash se calcula mientras el upload se
+escribe en disco y el temporal ya queda en el mismo sistema de archivos: guardarlo
+es un rename. Sin ese handler, `guardar()` hashea al copiar en bloques.
+
+Las miniaturas de imágenes se generan con la cola de trabajos (requiere Pillow;
+sin Pillow los adjuntos se muestran sin miniatura).
+
+La descarga pasa por `responder()`, que delega la transferencia en el servidor web
+según ADJUNTOS_SERVIDOR: 'nginx' (X-Accel-Redirect a ADJUNTOS_ACCEL_PREFIJO, una
+location `internal`) o 'sendfile' (X-Sendfile, Apache/lighttpd). Sin servidor
+configurado se transmite desde Django en bloques, con soporte de Range.
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+
+from . import metricas, trabajos
+from .models import ArchivoAdjunto, ContenidoAdjunto
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 64 * 1024
+_RE_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Tipos que el navegador puede mostrar sin riesgo; el resto se descarga siempre
+TIPOS_EN_LINEA = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/pdf', 'text/plain'}
+TIPOS_CON_MINIATURA = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+
+
+def raiz() -> str:
+    return getattr(settings, 'ADJUNTOS_ROOT', os.path.join(settings.MEDIA_ROOT, 'adjuntos'))
+
+
+def ruta_absoluta(ruta: str) -> str:
+    return os.path.join(raiz(), ruta)
+
+
+def directorio_temporal() -> str:
+    directorio = os.path.join(raiz(), 'tmp')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+class _TemporalEnRaiz(TemporaryUploadedFile):
+    """ Igual que TemporaryUploadedFile, pero creado dentro de ADJUNTOS_ROOT para poder moverlo con rename. """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        archivo = tempfile.NamedTemporaryFile(suffix='.subida', dir=directorio_temporal())
+        UploadedFile.__init__(self, archivo, name, content_type, size, charset, content_type_extra)
+
+
+class SubidaConHash(FileUploadHandler):
+    """ Upload handler: escribe cada bloque en disco y lo suma al SHA-256 a medida que llega. """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+        self.file = _TemporalEnRaiz(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def _temporal_con_hash(archivo):
+    """ Devuelve (ruta_temporal, sha256, propio); `propio` indica que hay que borrar el temporal si no se usa. """
+    sha256 = getattr(archivo, 'sha256', None)
+    if sha256 and hasattr(archivo, 'temporary_file_path'):
+        return archivo.temporary_file_path(), sha256, False
+    resumen = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix='.subida', dir=directorio_temporal(), delete=False) as destino:
+        for bloque in archivo.chunks(TAMANO_BLOQUE):
+            resumen.update(bloque)
+            destino.write(bloque)
+    return destino.name, resumen.hexdigest(), True
+
+
+def _referenciar(sha256, tamano, tipo_mime):
+    """ Suma una referencia al contenido, creándolo si no existe. Devuelve (contenido, creado). """
+    existente = ContenidoAdjunto.objects.filter(sha256=sha256)
+    if not existente.update(referencias=F('referencias') + 1):
+        ruta = os.path.join(sha256[:2], sha256[2:4], sha256)
+        try:
+            with transaction.atomic():
+                return ContenidoAdjunto.objects.create(
+                    sha256=sha256, tamano=tamano, tipo_mime=tipo_mime, ruta=ruta, referencias=1,
+                ), True
+        except IntegrityError:
+            # Otro request subió el mismo contenido entre el UPDATE y el INSERT
+            existente.update(referencias=F('referencias') + 1)
+    return existente.get(), False
+
+
+def guardar(archivo) -> ContenidoAdjunto:
+    """ Guarda un archivo subido (o cualquier File) y devuelve su ContenidoAdjunto, ya con la referencia sumada. """
+    ruta_temporal, sha256, propio = _temporal_con_hash(archivo)
+    try:
+        tipo_mime = mimetypes.guess_type(archivo.name or '')[0] or 'application/octet-stream'
+        contenido, creado = _referenciar(sha256, archivo.size, tipo_mime)
+        # La referencia ya está tomada: la limpieza no puede borrar el archivo a partir de acá
+        destino = ruta_absoluta(contenido.ruta)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(ruta_temporal, destino)
+            os.chmod(destino, getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None) or 0o644)
+            propio = False
+        if creado and tipo_mime in TIPOS_CON_MINIATURA:
+            trabajos.encolar('miniatura_adjunto', {'contenido_id': contenido.pk})
+        return contenido
+    finally:
+        if propio:
+            os.unlink(ruta_temporal)
+
+
+def adjuntar(ticket, archivos, comentario=None):
+    """
+    Guarda `archivos` y crea todos los ArchivoAdjunto con un solo INSERT. Las referencias
+    sumadas por guardar() se revierten junto con el INSERT si algo falla a mitad de camino.
+    """
+    if not archivos:
+        return []
+    metricas.ADJUNTOS.inc(len(archivos))
+    metricas.ADJUNTOS_BYTES.inc(sum(archivo.size for archivo in archivos))
+    with transaction.atomic():
+        return ArchivoAdjunto.objects.bulk_create([
+            ArchivoAdjunto(ticket=ticket, comentario=comentario, contenido=guardar(archivo), nombre=os.path.basename(archivo.name)[:255])
+            for archivo in archivos
+        ])
+
+
+@trabajos.tipo('miniatura_adjunto')
+def generar_miniatura(contenido_id):
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow no está instalado: no se generan miniaturas de adjuntos")
+        return
+    contenido = ContenidoAdjunto.objects.filter(pk=contenido_id).first()
+    if contenido is None or contenido.miniatura:
+        return
+    lado = getattr(settings, 'ADJUNTOS_MINIATURA_LADO', 320)
+    ruta = os.path.join('miniaturas', contenido.sha256[:2], f'{contenido.sha256}.jpg')
+    destino = ruta_absoluta(ruta)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    with Image.open(ruta_absoluta(contenido.ruta)) as imagen:
+        imagen.thumbnail((lado, lado))
+        with tempfile.NamedTemporaryFile(suffix='.jpg', dir=directorio_temporal(), delete=False) as temporal:
+            imagen.convert('RGB').save(temporal, 'JPEG', quality=80)
+    os.replace(temporal.name, destino)
+    os.chmod(destino, getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None) or 0o644)
+    ContenidoAdjunto.objects.filter(pk=contenido_id).update(miniatura=ruta)
+
+
+@trabajos.tipo('liberar_contenido_adjunto')
+def liberar_contenido(contenido_id):
+    """ Borra el contenido si sigue sin referencias. El bloqueo de la fila lo serializa con una subida del mismo archivo. """
+    with transaction.atomic():
+        contenido = ContenidoAdjunto.objects.select_for_update().filter(pk=contenido_id, referencias__lte=0).first()
+        if contenido is None:
+            return
+        for ruta in (contenido.ruta, contenido.miniatura):
+            if ruta:
+                try:
+                    os.unlink(ruta_absoluta(ruta))
+                except FileNotFoundError:
+                    pass
+        contenido.delete()
+
+
+def _rango(cabecera, tamano):
+    """ (inicio, fin) inclusivo de un Range de un solo tramo; None si no hay; False si no se puede satisfacer. """
+    coincidencia = _RE_RANGO.match(cabecera.strip()) if cabecera else None
+    if not coincidencia:
+        return None
+    desde, hasta = coincidencia.groups()
+    if not desde and not hasta:
+        return None
+    if not desde:
+        # Sufijo: los últimos N bytes
+        inicio, fin = max(tamano - int(hasta), 0), tamano - 1
+    else:
+        inicio, fin = int(desde), min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio > fin or inicio >= tamano:
+        return False
+    return inicio, fin
+
+
+def _bloques(ruta, inicio, cantidad):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while cantidad > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, cantidad))
+            if not bloque:
+                break
+            cantidad -= len(bloque)
+            yield bloque
+
+
+def responder(request, ruta, nombre, tipo_mime, etag=None, ruta_interna=None):
+    """
+    Respuesta de descarga para el archivo en `ruta` (absoluta). `ruta_interna` es la
+    ruta relativa a ADJUNTOS_ROOT, necesaria para X-Accel-Redirect.
+    """
+    if etag:
+        etag = quote_etag(etag)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            respuesta = HttpResponseNotModified()
+            respuesta['ETag'] = etag
+            return respuesta
+
+    servidor = getattr(settings, 'ADJUNTOS_SERVIDOR', '')
+    if servidor == 'nginx' and ruta_interna:
+        respuesta = HttpResponse(content_type=tipo_mime)
+        respuesta['X-Accel-Redirect'] = getattr(settings, 'ADJUNTOS_ACCEL_PREFIJO', '/adjuntos-internos/') + ruta_interna
+    elif servidor == 'sendfile':
+        respuesta = HttpResponse(content_type=tipo_mime)
+        respuesta['X-Sendfile'] = ruta
+    else:
+        try:
+            tamano = os.path.getsize(ruta)
+        except FileNotFoundError:
+            return HttpResponse('El archivo no está disponible.', status=404)
+        rango = _rango(request.META.get('HTTP_RANGE', ''), tamano)
+        if rango is False:
+            respuesta = HttpResponse(status=416)
+            respuesta['Content-Range'] = f'bytes */{tamano}'
+            return respuesta
+        inicio, fin = rango or (0, tamano - 1)
+        respuesta = StreamingHttpResponse(_bloques(ruta, inicio, fin - inicio + 1), content_type=tipo_mime)
+        respuesta['Content-Length'] = str(fin - inicio + 1)
+        if rango:
+            respuesta.status_code = 206
+            respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        respuesta['Accept-Ranges'] = 'bytes'
+
+    respuesta['Content-Disposition'] = content_disposition_header(tipo_mime not in TIPOS_EN_LINEA, nombre)
+    respuesta['X-Content-Type-Options'] = 'nosniff'
+    respuesta['Cache-Control'] = 'private, max-age=86400'
+    if etag:
+        respuesta['ETag'] = etag
+    return respuesta
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class GestionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion'
+
+    def ready(self):
+        from django.core import checks
+        from .autorizacion import revisar_cache
+        checks.register(revisar_cache, checks.Tags.caches, deploy=True)
+        from . import auditoria
+        auditoria.iniciar()
+        from . import adjuntos, notificaciones  # noqa: F401 (registran los tipos de trabajo)
@@ -0,0 +1,250 @@
+# /var/www/tickets/gestion/auditoria.py
+"""
+Eventos de auditoría estructurados.
+
+`registrar()` arma el evento (tipo, actor, ticket o usuario afectado, valor anterior
+y nuevo) y lo entrega al logger 'audit' con el texto legible de siempre
+("TIPO: mensaje"), así el archivo que muestra ver_logs_view no cambia.
+
+`iniciar()` (desde GestionConfig.ready) deja al logger 'audit' con un solo handler
+que encola el registro: el request nunca espera al disco. Un hilo escritor por
+proceso toma los registros en lotes, se los pasa a los handlers que tenía el
+logger, agrega las líneas JSON a audit.jsonl y los guarda en EventoAuditoria.
+Con AUDITORIA_ASINCRONA = False el lote se escribe en el mismo hilo.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+INICIO_SESION = 'INICIO DE SESIÓN'
+CIERRE_SESION = 'CIERRE DE SESIÓN'
+LOGIN_FALLIDO = 'INTENTO DE LOGIN FALLIDO'
+ERROR_LOGIN = 'ERROR EN LOGIN'
+TICKET_CREADO = 'TICKET CREADO'
+TICKET_CREADO_TAREA = 'TICKET CREADO (TAREA)'
+TICKET_ASIGNADO = 'TICKET ASIGNADO'
+TICKET_REASIGNADO_AREA = 'CAMBIO DE ÁREA'
+COMENTARIO_ANADIDO = 'COMENTARIO AÑADIDO'
+COMENTARIOS_IMPORTADOS = 'COMENTARIOS IMPORTADOS'
+CAMBIO_ESTADO = 'CAMBIO DE ESTADO'
+TAREA_CREADA = 'TAREA CREADA'
+AREA_CREADA = 'ÁREA CREADA'
+AVISO_CREADO = 'AVISO CREADO'
+USUARIO_CREADO = 'USUARIO CREADO'
+ESTADO_USUARIO = 'ESTADO DE USUARIO'
+CAMBIO_CONTRASENA = 'CAMBIO DE CONTRASEÑA'
+
+EVENTOS = [
+    INICIO_SESION, CIERRE_SESION, LOGIN_FALLIDO, ERROR_LOGIN,
+    TICKET_CREADO, TICKET_CREADO_TAREA, TICKET_ASIGNADO, TICKET_REASIGNADO_AREA, COMENTARIO_ANADIDO, COMENTARIOS_IMPORTADOS, CAMBIO_ESTADO,
+    TAREA_CREADA, AREA_CREADA, AVISO_CREADO,
+    USUARIO_CREADO, ESTADO_USUARIO, CAMBIO_CONTRASENA,
+]
+
+audit_log = logging.getLogger('audit')
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+def ruta_jsonl() -> str:
+    return getattr(settings, 'AUDIT_JSONL_PATH', os.path.join(settings.BASE_DIR, 'audit.jsonl'))
+
+
+def registrar(tipo, mensaje, actor=None, ticket=None, usuario=None, anterior=None, nuevo=None, nivel=logging.INFO):
+    """
+    Emite un evento. `actor` es un usuario o, si no hay usuario autenticado, el nombre
+    con el que se intentó entrar; `ticket` y `usuario` son el objeto afectado.
+    """
+    evento = _evento(tipo, mensaje, actor, ticket, usuario, anterior, nuevo, nivel)
+    audit_log.log(nivel, '%s: %s', tipo, mensaje, extra={'auditoria': evento})
+
+
+def registrar_varios(eventos, nivel=logging.INFO):
+    """
+    Varios eventos de una misma operación, cada uno con los argumentos de registrar().
+    Se entregan juntos a los handlers: con el handler síncrono son un solo write de
+    audit.jsonl y un solo bulk_create.
+    """
+    if not eventos or not audit_log.isEnabledFor(nivel):
+        return
+    registros = [
+        audit_log.makeRecord(
+            audit_log.name, nivel, __file__, 0, '%s: %s', (evento['tipo'], evento['mensaje']), None,
+            extra={'auditoria': _evento(nivel=nivel, **evento)},
+        )
+        for evento in eventos
+    ]
+    sincrono = next((h for h in audit_log.handlers if isinstance(h, HandlerAuditoriaSincrono)), None)
+    if sincrono is not None:
+        sincrono.emitir_varios(registros)
+        return
+    # Con la cola, el hilo escritor ya toma los registros seguidos como un lote
+    for registro in registros:
+        audit_log.handle(registro)
+
+
+def _evento(tipo, mensaje, actor=None, ticket=None, usuario=None, anterior=None, nuevo=None, nivel=logging.INFO):
+    if isinstance(actor, str):
+        actor_id, actor_nombre = None, actor
+    else:
+        actor_id, actor_nombre = getattr(actor, 'pk', None), getattr(actor, 'username', '') or ''
+    return {
+        'fecha': timezone.now().isoformat(),
+        'nivel': logging.getLevelName(nivel),
+        'tipo': tipo,
+        'actor_id': actor_id,
+        'actor': actor_nombre,
+        'ticket_id': getattr(ticket, 'pk', ticket),
+        'usuario_id': getattr(usuario, 'pk', usuario),
+        'anterior': None if anterior is None else str(anterior),
+        'nuevo': None if nuevo is None else str(nuevo),
+        'mensaje': mensaje,
+    }
+
+
+def _escribir_jsonl(eventos):
+    lineas = ''.join(json.dumps(evento, ensure_ascii=False) + '\n' for evento in eventos)
+    # Un solo write en modo append: las líneas de distintos procesos no se mezclan
+    with open(ruta_jsonl(), 'a', encoding='utf-8') as f:
+        f.write(lineas)
+
+
+def _guardar_eventos(eventos):
+    from .models import EventoAuditoria
+
+    EventoAuditoria.objects.bulk_create([
+        EventoAuditoria(
+            fecha=evento['fecha'],
+            nivel=evento['nivel'],
+            tipo=evento['tipo'],
+            actor_id=evento['actor_id'],
+            actor_nombre=evento['actor'][:150],
+            ticket_id=evento['ticket_id'],
+            usuario_afectado_id=evento['usuario_id'],
+            valor_anterior=(evento['anterior'] or '')[:255],
+            valor_nuevo=(evento['nuevo'] or '')[:255],
+            mensaje=evento['mensaje'],
+        )
+        for evento in eventos
+    ])
+
+
+def escribir_lote(registros, handlers):
+    """ Pasa los registros a los handlers originales y guarda los eventos en JSON lines y en la base. """
+    for registro in registros:
+        for handler in handlers:
+            if registro.levelno >= handler.level:
+                handler.handle(registro)
+
+    eventos = [registro.auditoria for registro in registros if hasattr(registro, 'auditoria')]
+    if not eventos:
+        return
+    try:
+        _escribir_jsonl(eventos)
+    except OSError:
+        logger.exception("No se pudo escribir %s", ruta_jsonl())
+    try:
+        _guardar_eventos(eventos)
+    except DatabaseError:
+        logger.exception("No se pudieron guardar %d eventos de auditoría", len(eventos))
+
+
+class EscritorAuditoria(threading.Thread):
+    """ Consume la cola en lotes de hasta AUDITORIA_LOTE registros. """
+
+    def __init__(self, cola, handlers):
+        super().__init__(name='escritor-auditoria', daemon=True)
+        self.cola = cola
+        self.handlers = handlers
+
+    def run(self):
+        tamano_lote = getattr(settings, 'AUDITORIA_LOTE', 200)
+        terminar = False
+        while not terminar:
+            lote = [self.cola.get()]
+            while len(lote) < tamano_lote:
+                try:
+                    lote.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            terminar = any(registro is _FIN for registro in lote)
+            registros = [registro for registro in lote if registro is not _FIN]
+            if not registros:
+                continue
+            try:
+                escribir_lote(registros, self.handlers)
+            except Exception:
+                logger.exception("Error escribiendo un lote de auditoría")
+            finally:
+                close_old_connections()
+
+    def detener(self, espera=5):
+        self.cola.put(_FIN)
+        self.join(espera)
+
+
+class ColaAuditoria(QueueHandler):
+    """
+    Encola los registros del logger 'audit'. El hilo escritor se arranca en el primer
+    registro de cada proceso, así también funciona en los workers creados con fork.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self._escritor = None
+        self._pid = None
+        self._candado = threading.Lock()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            with self._candado:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._escritor = EscritorAuditoria(self.queue, self.handlers)
+                    self._escritor.start()
+                    self._pid = os.getpid()
+                    atexit.register(self._escritor.detener)
+        super().enqueue(record)
+
+
+class HandlerAuditoriaSincrono(logging.Handler):
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+
+    def emit(self, record):
+        escribir_lote([record], self.handlers)
+
+    def emitir_varios(self, records):
+        with self.lock:
+            escribir_lote([record for record in records if self.filter(record)], self.handlers)
+
+
+_iniciado = False
+
+
+def iniciar():
+    global _iniciado
+    if _iniciado:
+        return
+    _iniciado = True
+    handlers = audit_log.handlers[:]
+    for handler in handlers:
+        audit_log.removeHandler(handler)
+    if getattr(settings, 'AUDITORIA_ASINCRONA', True):
+        audit_log.addHandler(ColaAuditoria(handlers))
+    else:
+        audit_log.addHandler(HandlerAuditoriaSincrono(handlers))
+    if audit_log.level == logging.NOTSET:
+        audit_log.setLevel(logging.INFO)
@@ -0,0 +1,156 @@
+# /var/www/tickets/gestion/autorizacion.py
+"""
+Contexto de autorización del usuario: nombres de grupos, perfil y área.
+
+Se carga con una sola consulta, se memoriza en el request y se guarda en la
+caché entre requests con claves versionadas. Para invalidar basta con subir
+la versión del usuario (o la global); las entradas viejas expiran solas.
+
+Subir la versión solo llega a los demás workers si la caché es compartida
+(Redis, Memcached, base de datos). Con LocMemCache, que es una por proceso, el
+contexto no se guarda entre requests y `manage.py check --deploy` avisa con
+gestion.W001. Un servidor de un solo proceso puede declarar CACHE_COMPARTIDA = True.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import cache
+
+from . import metricas
+
+GRUPO_VER_TODOS = 'Ver todos los tickets'
+GRUPO_INFORME = 'Informe'
+GRUPO_AVISOS = 'Enviar Avisos'
+GRUPO_CP = 'CP Access'
+
+_CLAVE_VERSION_GLOBAL = 'autorizacion:version'
+_ATRIBUTO_REQUEST = '_contexto_autorizacion'
+_CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class ContextoAutorizacion:
+    def __init__(self, user_id, grupos=(), perfil_id=None, area_id=None, area_nombre=None, numero_interno=None):
+        self.user_id = user_id
+        self.grupos = frozenset(grupos)
+        self.perfil_id = perfil_id
+        self.area_id = area_id
+        self.area_nombre = area_nombre
+        self.numero_interno = numero_interno
+
+    def tiene_grupo(self, nombre: str) -> bool:
+        return nombre in self.grupos
+
+    @property
+    def puede_ver_todos(self) -> bool:
+        return GRUPO_VER_TODOS in self.grupos
+
+    @property
+    def puede_ver_informes(self) -> bool:
+        return GRUPO_INFORME in self.grupos
+
+    @property
+    def puede_enviar_avisos(self) -> bool:
+        return GRUPO_AVISOS in self.grupos
+
+    @property
+    def acceso_cp(self) -> bool:
+        return GRUPO_CP in self.grupos
+
+    def a_dict(self):
+        return {
+            'user_id': self.user_id,
+            'grupos': sorted(self.grupos),
+            'perfil_id': self.perfil_id,
+            'area_id': self.area_id,
+            'area_nombre': self.area_nombre,
+            'numero_interno': self.numero_interno,
+        }
+
+
+def cache_compartida() -> bool:
+    """ Si la caché por defecto la ven todos los workers, y se puede invalidar desde cualquiera. """
+    compartida = getattr(settings, 'CACHE_COMPARTIDA', None)
+    if compartida is not None:
+        return compartida
+    return settings.CACHES['default']['BACKEND'] not in _CACHES_POR_PROCESO
+
+
+def revisar_cache(app_configs, **kwargs):
+    if cache_compartida():
+        return []
+    return [checks.Warning(
+        "La caché por defecto es de un solo proceso.",
+        hint=(
+            "Sin una caché compartida no se guardan entre requests los contextos de autorización ni los "
+            "accesos de CP ya verificados, y los límites de intentos se cuentan por worker. Configure Redis "
+            "o Memcached, o CACHE_COMPARTIDA = True si el servidor corre un solo proceso."
+        ),
+        id='gestion.W001',
+    )]
+
+
+def _cargar(user_id) -> ContextoAutorizacion:
+    """ Una sola consulta: una fila por grupo (LEFT JOIN) con los datos del perfil repetidos. """
+    filas = get_user_model().objects.filter(pk=user_id).values_list(
+        'groups__name', 'perfil__id', 'perfil__area_id', 'perfil__area__nombre', 'perfil__numero_interno'
+    )
+    grupos = []
+    perfil_id = area_id = area_nombre = numero_interno = None
+    for grupo, perfil_id, area_id, area_nombre, numero_interno in filas:
+        if grupo:
+            grupos.append(grupo)
+    return ContextoAutorizacion(user_id, grupos, perfil_id, area_id, area_nombre, numero_interno)
+
+
+def _clave_version(user_id) -> str:
+    return f'autorizacion:version:{user_id}'
+
+
+def version_usuario(user_id) -> str:
+    """ Cambia con cada invalidación del usuario: al guardarlo (contraseña, activo), al cambiar sus grupos o perfil. """
+    versiones = cache.get_many([_CLAVE_VERSION_GLOBAL, _clave_version(user_id)])
+    return f'{versiones.get(_CLAVE_VERSION_GLOBAL, 0)}:{versiones.get(_clave_version(user_id), 0)}'
+
+
+def contexto_de_usuario(user_id) -> ContextoAutorizacion:
+    """ Contexto de cualquier usuario por id, pasando por la caché compartida. """
+    if not cache_compartida():
+        return _cargar(user_id)
+    clave = f'autorizacion:ctx:{user_id}:{version_usuario(user_id)}'
+    datos = cache.get(clave)
+    if datos is not None:
+        metricas.CACHE.inc(cache='autorizacion', resultado='acierto')
+        return ContextoAutorizacion(**datos)
+    metricas.CACHE.inc(cache='autorizacion', resultado='fallo')
+    contexto = _cargar(user_id)
+    cache.set(clave, contexto.a_dict(), getattr(settings, 'AUTORIZACION_CACHE_TIMEOUT', 300))
+    return contexto
+
+
+def contexto_autorizacion(request) -> ContextoAutorizacion:
+    """ Contexto del usuario del request, calculado como mucho una vez por request. """
+    contexto = getattr(request, _ATRIBUTO_REQUEST, None)
+    if contexto is None:
+        contexto = contexto_de_usuario(request.user.pk)
+        setattr(request, _ATRIBUTO_REQUEST, contexto)
+    return contexto
+
+
+def _subir_version(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, None)
+
+
+def invalidar_usuario(user_id):
+    _subir_version(_clave_version(user_id))
+
+
+def invalidar_todos():
+    """ Para cambios que afectan a muchos usuarios a la vez (renombrar un grupo o un área). """
+    _subir_version(_CLAVE_VERSION_GLOBAL)
@@ -0,0 +1,212 @@
+# /var/www/tickets/gestion/benchmark.py
+"""
+Benchmark de las vistas de gestion.
+
+`seed_benchmark` llena la base con datos sintéticos y crea un usuario fijo por rol
+(ROLES). `ejecutar()` recorre todas las URLs con nombre de gestion.urls con el
+cliente de pruebas de Django, como cada rol, y devuelve por caso los percentiles
+de latencia y la cantidad de consultas SQL. Las claves de los casos usan el
+nombre de la URL y no sus ids, así que un baseline sirve para cualquier base
+generada con la misma semilla.
+
+`comparar()` marca como regresión un caso cuyo p95 crece más que el umbral
+relativo y a la vez más que un margen absoluto (el ruido de una vista de pocos
+milisegundos no cuenta), que hace más consultas que en el baseline o que cambió
+de código de respuesta.
+"""
+
+import json
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from .models import ArchivoAdjunto, ArticuloConocimiento, Ticket
+from .paginacion import codificar_cursor
+
+ROLES = {
+    'superusuario': 'bench_admin',
+    'staff': 'bench_staff',
+    'area': 'bench_area',
+    'usuario': 'bench_usuario',
+}
+CLAVE_USUARIOS = 'benchmark'
+
+# Cierran la sesión del cliente o modifican datos en cada repetición; las muestras del perfilador solo viven en el cache
+OMITIDAS = {'logout', 'process_login', 'toggle_usuario', 'importar_comentarios', 'acciones_tickets', 'perfil_muestra'}
+
+BUSQUEDA = 'impresora'
+
+Caso = namedtuple('Caso', 'clave nombre url metodo cuerpo')
+
+
+def _variantes(nombre):
+    """ (etiqueta, query string) a medir por cada URL; la etiqueta no incluye valores que cambian entre corridas. """
+    if nombre == 'dashboard':
+        return [('', ''), ('?vista=todos', '?vista=todos'), ('?estado=', '?estado='), ('?q', f'?q={BUSQUEDA}')]
+    if nombre == 'buscar_tickets':
+        return [('?q', f'?q={BUSQUEDA}'), ('?vista=todos&q', f'?vista=todos&q={BUSQUEDA}')]
+    if nombre == 'cambios_dashboard':
+        desde = codificar_cursor(timezone.now() - timedelta(days=1), 0)
+        return [('?desde', f'?desde={desde}'), ('?vista=todos&desde', f'?vista=todos&desde={desde}')]
+    if nombre == 'comentarios_ticket':
+        return [('?antes', f'?antes={2 ** 62}')]
+    return [('', '')]
+
+
+def _cuerpo_post(nombre, username):
+    """ (método, cuerpo JSON) de las APIs que solo aceptan POST. """
+    if nombre == 'verificar_acceso_cp_api':
+        return 'post', json.dumps({'username': username, 'password': CLAVE_USUARIOS})
+    if nombre == 'verificar_acceso_cp_lote':
+        credenciales = [{'username': u, 'password': CLAVE_USUARIOS} for u in ROLES.values()]
+        return 'post', json.dumps({'credenciales': credenciales})
+    return 'get', None
+
+
+def ids_de_ejemplo(usuarios):
+    """
+    Valores para los parámetros de las URLs: el último ticket del rol 'usuario' que
+    tenga adjunto (seed_benchmark siempre deja uno), su tarea y su adjunto.
+    """
+    usuario = usuarios[ROLES['usuario']]
+    adjunto = (
+        ArchivoAdjunto.objects.filter(ticket__usuario_creador=usuario)
+        .order_by('-ticket_id', '-id').values('id', 'ticket_id', 'ticket__tarea_id').first()
+    )
+    if adjunto is None:
+        return None
+    return {
+        'ticket_id': adjunto['ticket_id'],
+        'adjunto_id': adjunto['id'],
+        'tarea_id': adjunto['ticket__tarea_id'],
+        'user_id': usuario.id,
+        'articulo_id': ArticuloConocimiento.objects.order_by('-id').values_list('id', flat=True).first(),
+    }
+
+
+def casos(ids, username, nombres=None):
+    """ Un Caso por URL con nombre de gestion.urls y por variante; se salta las que no tienen con qué completarse. """
+    from . import urls
+
+    resultado = []
+    for patron in urls.urlpatterns:
+        if not isinstance(patron, URLPattern) or not patron.name or patron.name in OMITIDAS:
+            continue
+        if nombres and patron.name not in nombres:
+            continue
+        parametros = getattr(patron.pattern, 'converters', {})
+        kwargs = {parametro: ids.get(parametro) for parametro in parametros}
+        if any(valor is None for valor in kwargs.values()):
+            continue
+        url = reverse(patron.name, kwargs=kwargs or None)
+        metodo, cuerpo = _cuerpo_post(patron.name, username)
+        for etiqueta, query in _variantes(patron.name):
+            resultado.append(Caso(f'{metodo.upper()} {patron.name}{etiqueta}', patron.name, url + query, metodo, cuerpo))
+    return resultado
+
+
+def percentil(valores, p):
+    """ Percentil por rango más cercano sobre una lista no vacía. """
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, -(-len(ordenados) * p // 100) - 1))
+    return ordenados[int(indice)]
+
+
+def _pedir(cliente, caso):
+    if caso.metodo == 'post':
+        respuesta = cliente.post(caso.url, caso.cuerpo, content_type='application/json')
+    else:
+        respuesta = cliente.get(caso.url)
+    if respuesta.streaming:
+        # La descarga cuenta entera, como la vería el navegador
+        for _ in respuesta.streaming_content:
+            pass
+    respuesta.close()
+    return respuesta
+
+
+def medir(cliente, caso, repeticiones, calentamiento=1):
+    for _ in range(calentamiento):
+        _pedir(cliente, caso)
+    tiempos, consultas = [], []
+    for _ in range(repeticiones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = _pedir(cliente, caso)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(len(capturadas.captured_queries))
+    return {
+        'status': respuesta.status_code,
+        'p50': round(percentil(tiempos, 50), 2),
+        'p95': round(percentil(tiempos, 95), 2),
+        'p99': round(percentil(tiempos, 99), 2),
+        'consultas': max(consultas),
+    }
+
+
+def ejecutar(repeticiones=10, calentamiento=1, roles=None, nombres=None, al_medir=None):
+    """
+    Mide todos los casos para cada rol y devuelve {"<rol> <caso>": métricas}.
+    `al_medir(clave, métricas)` se llama después de cada caso, para mostrar progreso.
+    """
+    usuarios = {u.username: u for u in get_user_model().objects.filter(username__in=ROLES.values())}
+    faltan = sorted(set(ROLES.values()) - set(usuarios))
+    if faltan:
+        raise LookupError(f"Faltan los usuarios de benchmark {', '.join(faltan)}; ejecute seed_benchmark.")
+    ids = ids_de_ejemplo(usuarios)
+    if ids is None:
+        raise LookupError("No hay tickets con adjuntos del usuario de benchmark; ejecute seed_benchmark.")
+
+    resultados = {}
+    # Los límites de intentos de CP cortarían las repeticiones con 429; acá no es lo que se mide
+    with override_settings(CP_IP_CAPACIDAD=10 ** 9, CP_USUARIO_CAPACIDAD=10 ** 9):
+        for rol, username in ROLES.items():
+            if roles and rol not in roles:
+                continue
+            cliente = Client()
+            cliente.force_login(usuarios[username])
+            for caso in casos(ids, username, nombres):
+                clave = f'{rol} {caso.clave}'
+                resultados[clave] = medir(cliente, caso, repeticiones, calentamiento)
+                if al_medir:
+                    al_medir(clave, resultados[clave])
+    return resultados
+
+
+def comparar(resultados, baseline, umbral=0.25, margen_ms=5.0):
+    """ Lista de regresiones (textos) de `resultados` contra `baseline`; los casos nuevos no cuentan. """
+    regresiones = []
+    for clave, actual in sorted(resultados.items()):
+        base = baseline.get(clave)
+        if base is None:
+            continue
+        if actual['status'] != base['status']:
+            regresiones.append(f"{clave}: respuesta {base['status']} → {actual['status']}")
+        if actual['p95'] > base['p95'] * (1 + umbral) and actual['p95'] - base['p95'] > margen_ms:
+            regresiones.append(f"{clave}: p95 {base['p95']:.1f} → {actual['p95']:.1f} ms")
+        if actual['consultas'] > base['consultas']:
+            regresiones.append(f"{clave}: {base['consultas']} → {actual['consultas']} consultas")
+    return regresiones
+
+
+def leer_baseline(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)['resultados']
+
+
+def guardar_baseline(ruta, resultados, repeticiones):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump({
+            'generado': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'tickets': Ticket.objects.count(),
+            'repeticiones': repeticiones,
+            'resultados': resultados,
+        }, archivo, indent=2, ensure_ascii=False, sort_keys=True)
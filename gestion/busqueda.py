@@ -0,0 +1,153 @@
+# /var/www/tickets/gestion/busqueda.py
+"""
+Índice de texto completo sobre título, descripción y comentarios de los tickets.
+
+En SQLite se usa la tabla virtual FTS5 `gestion_ticket_fts` (rowid = id del ticket).
+En PostgreSQL la misma tabla guarda un tsvector con índice GIN.
+Con cualquier otro motor se vuelve a los filtros `icontains`.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'gestion_ticket_fts'
+
+_RE_ID = re.compile(r'^#?(\d+)$')
+_RE_TERMINO = re.compile(r'\w+', re.UNICODE)
+
+
+def _config_pg():
+    return getattr(settings, 'BUSQUEDA_PG_CONFIG', 'spanish')
+
+
+def motor_disponible() -> bool:
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def id_buscado(texto: str):
+    """ Devuelve el id si el texto es una búsqueda exacta de ticket ('#123' o '123'). """
+    coincidencia = _RE_ID.match(texto.strip())
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+def _consulta_fts5(texto: str) -> str:
+    """ Convierte la entrada del usuario en una consulta FTS5 segura: cada término como prefijo entre comillas. """
+    return ' '.join(f'"{termino}"*' for termino in _RE_TERMINO.findall(texto))
+
+
+def filtrar(queryset, texto: str):
+    """
+    Filtra un queryset de Ticket por `texto` y lo anota con `relevancia`,
+    ordenado del más relevante al menos relevante. '#123' trae solo ese ticket;
+    un número suelto ('2024', '123') trae ese ticket primero y también los que
+    lo mencionan en el texto.
+    """
+    ticket_id = id_buscado(texto)
+    if ticket_id is not None and texto.strip().startswith('#'):
+        return queryset.filter(id=ticket_id)
+    por_id = Q(id=ticket_id) if ticket_id is not None else Q(pk__in=[])
+    orden = ['-relevancia', '-fecha_ultima_modificacion']
+    if ticket_id is not None:
+        queryset = queryset.annotate(es_id=ExpressionWrapper(Q(id=ticket_id), output_field=BooleanField()))
+        orden.insert(0, '-es_id')
+
+    if connection.vendor == 'sqlite':
+        consulta = _consulta_fts5(texto)
+        if not consulta:
+            return queryset.none()
+        # bm25 devuelve valores negativos: más bajo es más relevante
+        return queryset.filter(
+            por_id | Q(id__in=RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta]))
+        ).annotate(
+            relevancia=RawSQL(
+                f'(SELECT -bm25({TABLA_FTS}, 10.0, 5.0, 1.0) FROM {TABLA_FTS} '
+                f'WHERE {TABLA_FTS} MATCH %s AND rowid = "gestion_ticket"."id")',
+                [consulta],
+            )
+        ).order_by(*orden)
+
+    if connection.vendor == 'postgresql':
+        config = _config_pg()
+        return queryset.filter(
+            por_id | Q(id__in=RawSQL(
+                f'SELECT ticket_id FROM {TABLA_FTS} WHERE documento @@ websearch_to_tsquery(%s::regconfig, %s)',
+                [config, texto],
+            ))
+        ).annotate(
+            relevancia=RawSQL(
+                f'(SELECT ts_rank(documento, websearch_to_tsquery(%s::regconfig, %s)) FROM {TABLA_FTS} '
+                f'WHERE ticket_id = "gestion_ticket"."id")',
+                [config, texto],
+            )
+        ).order_by(*orden)
+
+    resultado = queryset.filter(por_id | Q(titulo__icontains=texto) | Q(descripcion__icontains=texto))
+    return resultado.order_by('-es_id', '-fecha_ultima_modificacion') if ticket_id is not None else resultado
+
+
+def indexar_ticket(ticket):
+    """ Reescribe la entrada del índice para un ticket (título, descripción y todos sus comentarios). """
+    if not motor_disponible():
+        return
+    comentarios = ' '.join(ticket.comentarios.values_list('cuerpo_comentario', flat=True))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [ticket.id])
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS} (rowid, titulo, descripcion, comentarios) VALUES (%s, %s, %s, %s)',
+                [ticket.id, ticket.titulo, ticket.descripcion, comentarios],
+            )
+        else:
+            config = _config_pg()
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS} (ticket_id, documento) VALUES (%s, '
+                f"setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'C')) "
+                f'ON CONFLICT (ticket_id) DO UPDATE SET documento = EXCLUDED.documento',
+                [ticket.id, config, ticket.titulo, config, ticket.descripcion, config, comentarios],
+            )
+
+
+def desindexar_ticket(ticket_id):
+    if not motor_disponible():
+        return
+    columna = 'rowid' if connection.vendor == 'sqlite' else 'ticket_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE {columna} = %s', [ticket_id])
+
+
+def reconstruir():
+    """ Vacía y vuelve a llenar el índice completo con una sola sentencia INSERT ... SELECT. """
+    if not motor_disponible():
+        return 0
+    comentarios_sqlite = (
+        "(SELECT group_concat(c.cuerpo_comentario, ' ') FROM gestion_comentario c WHERE c.ticket_id = t.id)"
+    )
+    comentarios_pg = (
+        "(SELECT string_agg(c.cuerpo_comentario, ' ') FROM gestion_comentario c WHERE c.ticket_id = t.id)"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS}')
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS} (rowid, titulo, descripcion, comentarios) '
+                f"SELECT t.id, t.titulo, t.descripcion, coalesce({comentarios_sqlite}, '') FROM gestion_ticket t"
+            )
+            cursor.execute(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('optimize')")
+        else:
+            config = _config_pg()
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS} (ticket_id, documento) '
+                f"SELECT t.id, setweight(to_tsvector(%s::regconfig, t.titulo), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, t.descripcion), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, coalesce({comentarios_pg}, '')), 'C') "
+                f'FROM gestion_ticket t',
+                [config, config, config],
+            )
+        cursor.execute(f'SELECT count(*) FROM {TABLA_FTS}')
+        return cursor.fetchone()[0]
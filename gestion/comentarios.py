@@ -0,0 +1,101 @@
+# /var/www/tickets/gestion/comentarios.py
+"""
+Alta de comentarios en una sola transacción.
+
+`comentar()` hace siempre las mismas sentencias: el INSERT del comentario, un
+UPDATE del ticket (que además lo auto-asigna si sigue sin asignar), el rollup de
+informes, el índice de texto, la marca de lectura del autor, un INSERT con todos
+los adjuntos y otro con las notificaciones. Lo único que crece con los adjuntos es
+la referencia a cada contenido (ver gestion.adjuntos). Como el ticket se actualiza
+con UPDATE y no con save(), acá se ajustan a mano el rollup y el índice que
+mantienen las señales de Ticket.
+
+`importar_hilo()` carga un hilo completo del sistema anterior conservando autor y
+fecha de cada comentario.
+"""
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from . import adjuntos, notificaciones
+from .busqueda import indexar_ticket
+from .models import Comentario, LecturaTicket, ResumenTicket, Ticket
+
+_LOTE_FECHAS = 500
+
+
+def comentar(ticket, autor, cuerpo, archivos=(), auto_asignar=False):
+    """
+    Agrega el comentario de `autor` a `ticket`. Con `auto_asignar` el ticket pasa a
+    `autor` solo si sigue sin asignado en la base. Devuelve (comentario, asignado).
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        # Con la fila bloqueada otro guardado del ticket no puede cambiar la clave entre las dos lecturas
+        anterior = ResumenTicket.clave_guardada(ticket.pk, bloquear=True)
+
+        comentario = Comentario(ticket=ticket, usuario_autor=autor, cuerpo_comentario=cuerpo)
+        comentario._ticket_actualizado = True
+        comentario.save()
+
+        cambios = {'fecha_ultima_modificacion': ahora, 'fecha_actualizacion': ahora}
+        asignado = False
+        if auto_asignar and ticket.usuario_asignado_id is None:
+            # Si otro se lo asignó mientras tanto, el UPDATE no encuentra la fila y solo se tocan las fechas
+            asignado = bool(
+                Ticket.objects.filter(pk=ticket.pk, usuario_asignado__isnull=True).update(usuario_asignado=autor, **cambios)
+            )
+        if not asignado:
+            Ticket.objects.filter(pk=ticket.pk).update(**cambios)
+
+        ticket.fecha_ultima_modificacion = ticket.fecha_actualizacion = ahora
+        if asignado:
+            ticket.usuario_asignado = autor
+        actual = ResumenTicket.clave_guardada(ticket.pk)
+        if anterior != actual:
+            ResumenTicket.registrar_cambio(anterior, actual)
+
+        indexar_ticket(ticket)
+        # El resto de usuarios queda con la marca vieja, por lo que ven el ticket como no leído
+        LecturaTicket.marcar_leido(autor.id, ticket.id, ahora)
+
+        adjuntos.adjuntar(ticket, archivos, comentario)
+
+        eventos = [(notificaciones.COMENTARIO, '')]
+        if asignado:
+            eventos.insert(0, (notificaciones.ASIGNACION, autor.username))
+        notificaciones.encolar_eventos_ticket(ticket, eventos, autor)
+
+    return comentario, asignado
+
+
+def importar_hilo(ticket, comentarios):
+    """
+    Importa `comentarios`, una lista de (autor, cuerpo, fecha), sin notificar ni marcar
+    lecturas. No toca fecha_actualizacion: el tiempo de resolución del ticket no cambia.
+    """
+    if not comentarios:
+        return []
+    with transaction.atomic():
+        nuevos = []
+        for autor, cuerpo, _ in comentarios:
+            comentario = Comentario(ticket=ticket, usuario_autor=autor, cuerpo_comentario=cuerpo)
+            comentario.prerenderizar()
+            nuevos.append(comentario)
+        nuevos = Comentario.objects.bulk_create(nuevos)
+
+        # auto_now_add pisa la fecha en el INSERT: se restauran las originales con un UPDATE por lote
+        fechas = [(comentario.pk, fecha) for comentario, (_, _, fecha) in zip(nuevos, comentarios)]
+        for i in range(0, len(fechas), _LOTE_FECHAS):
+            lote = fechas[i:i + _LOTE_FECHAS]
+            Comentario.objects.filter(pk__in=[pk for pk, _ in lote]).update(
+                fecha_creacion=Case(*[When(pk=pk, then=Value(fecha)) for pk, fecha in lote], output_field=DateTimeField())
+            )
+            for comentario, (_, fecha) in zip(nuevos[i:i + _LOTE_FECHAS], lote):
+                comentario.fecha_creacion = fecha
+
+        ultima = max(fecha for _, _, fecha in comentarios)
+        Ticket.objects.filter(pk=ticket.pk, fecha_ultima_modificacion__lt=ultima).update(fecha_ultima_modificacion=ultima)
+        indexar_ticket(ticket)
+    return nuevos
@@ -0,0 +1,129 @@
+# /var/www/tickets/gestion/directorio.py
+"""
+Directorio de internos: directorio.csv más los números cargados en los perfiles.
+
+Se arma una vez por proceso y se reutiliza mientras no cambien el mtime/tamaño del
+CSV ni la versión de perfiles (que se sube al cambiar un número interno), con un
+TTL como red de seguridad. La búsqueda por prefijo usa una lista ordenada de
+claves normalizadas (cada palabra del nombre, el nombre completo y el interno)
+recorrida con bisect. La variante pública (la página de teléfonos independiente,
+sin sesión) tiene solo los contactos del CSV.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+_CLAVE_VERSION_PERFILES = 'directorio:version_perfiles'
+_RE_PALABRA = re.compile(r'\w+')
+
+_candado = threading.Lock()
+_actuales = {}
+
+
+def ruta_csv() -> str:
+    return getattr(settings, 'DIRECTORIO_CSV_PATH', os.path.join(settings.BASE_DIR, 'directorio.csv'))
+
+
+def normalizar(texto: str) -> str:
+    """ Minúsculas y sin acentos, para comparar 'Gómez' con 'gomez'. """
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+class Directorio:
+    def __init__(self, contactos, firma):
+        self.contactos = sorted(contactos, key=lambda c: normalizar(c[0]))
+        claves = set()
+        for posicion, (nombre, interno) in enumerate(self.contactos):
+            nombre_normalizado = normalizar(nombre)
+            claves.add((nombre_normalizado, posicion))
+            claves.update((palabra, posicion) for palabra in _RE_PALABRA.findall(nombre_normalizado))
+            claves.add((interno.lower(), posicion))
+        self._indice = sorted(claves)
+        self._claves = [clave for clave, _ in self._indice]
+        self.etag = hashlib.sha1(json.dumps([firma, self.contactos]).encode('utf-8')).hexdigest()[:20]
+        self.creado = time.monotonic()
+        self.firma = firma
+
+    def buscar(self, prefijo: str):
+        """ Contactos con alguna palabra del nombre, el nombre completo o el interno que empiece por `prefijo`. """
+        prefijo = normalizar(prefijo.strip())
+        if not prefijo:
+            return self.contactos
+        posiciones = set()
+        for i in range(bisect_left(self._claves, prefijo), len(self._claves)):
+            if not self._claves[i].startswith(prefijo):
+                break
+            posiciones.add(self._indice[i][1])
+        return [self.contactos[p] for p in sorted(posiciones)]
+
+
+def _leer_csv(ruta):
+    contactos = []
+    try:
+        with open(ruta, mode='r', encoding='utf-8') as csvfile:
+            for row in csv.reader(csvfile):
+                if len(row) == 2:
+                    nombre = row[0].replace('"', '').strip()
+                    interno = row[1].strip()
+                    if nombre and interno:
+                        contactos.append((nombre, interno))
+    except FileNotFoundError:
+        pass
+    return contactos
+
+
+def _leer_perfiles():
+    from .models import Perfil
+
+    filas = Perfil.objects.filter(user__is_active=True).exclude(numero_interno__isnull=True).exclude(numero_interno='') \
+        .values_list('user__username', 'user__first_name', 'user__last_name', 'numero_interno')
+    for username, nombre, apellido, interno in filas:
+        yield (f'{nombre} {apellido}'.strip() or username.capitalize()), interno.strip()
+
+
+def _firma():
+    ruta = ruta_csv()
+    try:
+        estado = os.stat(ruta)
+        archivo = (estado.st_mtime_ns, estado.st_size)
+    except FileNotFoundError:
+        archivo = None
+    return [archivo, cache.get(_CLAVE_VERSION_PERFILES, 0)]
+
+
+def obtener(publico=False) -> Directorio:
+    """ Con `publico` solo el CSV: los números de los perfiles no salen sin sesión. """
+    firma = _firma()
+    ttl = getattr(settings, 'DIRECTORIO_TTL', 300)
+    directorio = _actuales.get(publico)
+    if directorio is not None and directorio.firma == firma and time.monotonic() - directorio.creado < ttl:
+        return directorio
+    with _candado:
+        if _actuales.get(publico) is not directorio:
+            return _actuales[publico]
+        contactos = _leer_csv(ruta_csv())
+        vistos = {(normalizar(nombre), interno) for nombre, interno in contactos}
+        for nombre, interno in ([] if publico else _leer_perfiles()):
+            if (normalizar(nombre), interno) not in vistos:
+                vistos.add((normalizar(nombre), interno))
+                contactos.append((nombre, interno))
+        _actuales[publico] = Directorio(contactos, firma)
+        return _actuales[publico]
+
+
+def invalidar_perfiles():
+    try:
+        cache.incr(_CLAVE_VERSION_PERFILES)
+    except ValueError:
+        cache.set(_CLAVE_VERSION_PERFILES, 1, None)
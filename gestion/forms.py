@@ -141,6 +141,22 @@ class StatusChangeForm(BaseForm):
         fields = ['estado']
         labels = {'estado': 'Cambiar Estado del Ticket'}
 
+class AccionesTicketsForm(forms.Form):
+    """ Acción del dashboard sobre los tickets marcados; los ids se leen aparte (ver acciones_tickets_view). """
+    accion = forms.ChoiceField(choices=[('estado', 'Cambiar estado'), ('area', 'Reasignar área'), ('usuario', 'Asignar a')])
+    estado = forms.ModelChoiceField(queryset=EstadoTicket.objects.all(), required=False)
+    area = forms.ModelChoiceField(queryset=Area.objects.all(), required=False)
+    usuario = forms.ModelChoiceField(queryset=User.objects.filter(is_active=True), required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('accion') == 'estado' and not cleaned_data.get('estado'):
+            raise forms.ValidationError("Seleccione el nuevo estado.")
+        return cleaned_data
+
+    def valor(self):
+        return self.cleaned_data[self.cleaned_data['accion']]
+
 class AdminPasswordChangeForm(SetPasswordForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,29 @@
+# /var/www/tickets/gestion/limites.py
+"""
+Límites de frecuencia con cubetas de tokens guardadas en la caché compartida.
+
+Cada cubeta guarda (tokens, instante) y se rellena a `por_segundo` tokens por
+segundo hasta `capacidad`. Leer y escribir no es atómico: con requests simultáneos
+puede pasar alguno de más, que alcanza para frenar ráfagas y fuerza bruta.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+def clave(prefijo: str, valor: str) -> str:
+    """ Clave de caché segura para cualquier valor (nombres de usuario con espacios, IPv6...). """
+    return f'limite:{prefijo}:{hashlib.sha1(valor.encode("utf-8")).hexdigest()}'
+
+
+def consumir(clave_cubeta: str, capacidad: float, por_segundo: float, costo: float = 1) -> float:
+    """ Consume `costo` tokens. Devuelve 0 si alcanzaron, o los segundos que faltan para que alcancen. """
+    ahora = time.time()
+    tokens, instante = cache.get(clave_cubeta) or (capacidad, ahora)
+    tokens = min(capacidad, tokens + (ahora - instante) * por_segundo)
+    if tokens < costo:
+        return (costo - tokens) / por_segundo
+    cache.set(clave_cubeta, (tokens - costo, ahora), int(capacidad / por_segundo) + 1)
+    return 0
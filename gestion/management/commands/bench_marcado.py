@@ -0,0 +1,87 @@
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from gestion.marcado import renderizar
+from gestion.models import Comentario, Ticket
+
+
+def _formatos_anteriores(text):
+    """ Implementación previa: siete re.sub sin compilar por línea. Se conserva solo para comparar. """
+    text = re.sub(r'N\((.*?)\)', r'<strong>\1</strong>', text)
+    text = re.sub(r'I\((.*?)\)', r'<em>\1</em>', text)
+    text = re.sub(r'S\((.*?)\)', r'<u>\1</u>', text)
+    text = re.sub(r'T\((.*?)\)', r'<s>\1</s>', text)
+    text = re.sub(r'M\(([^,)]+),\s*([^)]+)\)', r'<mark style="background-color:\1;">\2</mark>', text)
+    text = re.sub(r'C\(([^,)]+),\s*([^)]+)\)', r'<span style="color:\1;">\2</span>', text)
+    text = re.sub(r'url\((.*?)\)', r'<a href="\1" target="_blank" class="text-indigo-600 hover:underline">\1</a>', text)
+    return text
+
+
+def renderizar_anterior(value):
+    if not value:
+        return ""
+    new_html = []
+    in_ul = False
+    in_ol = False
+    for line in value.split('\n'):
+        stripped_line = line.strip()
+        if not stripped_line:
+            if in_ul or in_ol:
+                if in_ul: new_html.append('</ul>'); in_ul = False
+                if in_ol: new_html.append('</ol>'); in_ol = False
+            continue
+        if stripped_line.startswith('* '):
+            if in_ol: new_html.append('</ol>'); in_ol = False
+            if not in_ul: new_html.append('<ul>'); in_ul = True
+            new_html.append(f'<li>{_formatos_anteriores(stripped_line[2:])}</li>')
+        elif re.match(r'^\d+\.\s', stripped_line):
+            if in_ul: new_html.append('</ul>'); in_ul = False
+            if not in_ol: new_html.append('<ol>'); in_ol = True
+            item_content = re.sub(r'^\d+\.\s', '', stripped_line)
+            new_html.append(f'<li>{_formatos_anteriores(item_content)}</li>')
+        else:
+            if in_ul: new_html.append('</ul>'); in_ul = False
+            if in_ol: new_html.append('</ol>'); in_ol = False
+            new_html.append(f'<p>{_formatos_anteriores(line)}</p>')
+    if in_ul: new_html.append('</ul>')
+    if in_ol: new_html.append('</ol>')
+    return ''.join(new_html)
+
+
+TEXTO_EJEMPLO = """El equipo N(no enciende) desde I(ayer) por la tarde.
+Pasos realizados:
+1. Revisar C(#E63946, cable de alimentación)
+2. Probar otro S(enchufe)
+3. Consultar url(https://intranet/soporte/equipos)
+
+* M(#FFF3B0, Urgente): T(no) se puede trabajar
+* C(#E63946, N(importante)) y M(#FFF3B0, S(revisar))
+* Contacto interno 1234
+"""
+
+
+class Command(BaseCommand):
+    help = "Compara el renderizador de marcado anterior con el actual (tiempo por texto y coincidencia de la salida)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=2000)
+        parser.add_argument('--desde-bd', action='store_true', help="Usa hasta 500 descripciones y comentarios reales.")
+
+    def handle(self, *args, **options):
+        textos = [TEXTO_EJEMPLO, TEXTO_EJEMPLO * 10]
+        if options['desde_bd']:
+            textos += list(Ticket.objects.values_list('descripcion', flat=True)[:250])
+            textos += list(Comentario.objects.values_list('cuerpo_comentario', flat=True)[:250])
+
+        distintos = sum(1 for t in textos if renderizar_anterior(t) != renderizar(t))
+        repeticiones = options['repeticiones']
+        for nombre, funcion in (('anterior', renderizar_anterior), ('actual', renderizar)):
+            segundos = min(timeit.repeat(lambda: [funcion(t) for t in textos], number=repeticiones, repeat=3))
+            por_texto = segundos / (repeticiones * len(textos)) * 1e6
+            self.stdout.write(f"{nombre:>9}: {por_texto:8.2f} µs por texto")
+        if distintos:
+            self.stdout.write(self.style.WARNING(f"{distintos} de {len(textos)} textos producen HTML distinto."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Salida idéntica en los {len(textos)} textos."))
@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from gestion import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Recorre todas las URLs de gestion como cada rol de benchmark (ver seed_benchmark), mide latencia y "
+        "consultas SQL, y falla si alguna URL empeoró respecto del baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=None, help="Archivo JSON del baseline (por defecto BENCHMARK_BASELINE).")
+        parser.add_argument('--guardar', action='store_true', help="Guarda esta corrida como baseline en lugar de comparar.")
+        parser.add_argument('--repeticiones', type=int, default=10)
+        parser.add_argument('--calentamiento', type=int, default=1)
+        parser.add_argument('--umbral', type=float, default=0.25, help="Aumento relativo del p95 que se tolera (0.25 = 25%%).")
+        parser.add_argument('--margen-ms', type=float, default=5.0, help="Aumento absoluto del p95 por debajo del cual nunca falla.")
+        parser.add_argument('--rol', action='append', choices=list(benchmark.ROLES), help="Solo estos roles (repetible).")
+        parser.add_argument('--url', action='append', help="Solo estos nombres de URL (repetible).")
+
+    def handle(self, *args, **options):
+        ruta = options['baseline'] or getattr(
+            settings, 'BENCHMARK_BASELINE', os.path.join(settings.BASE_DIR, 'benchmark_baseline.json')
+        )
+        baseline = None
+        if not options['guardar']:
+            if not os.path.exists(ruta):
+                raise CommandError(f"No existe el baseline {ruta}; genérelo con --guardar.")
+            baseline = benchmark.leer_baseline(ruta)
+
+        # Habilita 'testserver' en ALLOWED_HOSTS para el cliente de pruebas
+        setup_test_environment()
+
+        def mostrar(clave, metricas):
+            self.stdout.write(
+                f"{clave:<55} {metricas['status']:>3} {metricas['p50']:>8.1f} {metricas['p95']:>8.1f} "
+                f"{metricas['p99']:>8.1f} {metricas['consultas']:>5}"
+            )
+
+        self.stdout.write(f"{'caso':<55} {'cód':>3} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql':>5}")
+        try:
+            resultados = benchmark.ejecutar(
+                options['repeticiones'], options['calentamiento'], options['rol'], options['url'], al_medir=mostrar,
+            )
+        except LookupError as error:
+            raise CommandError(str(error))
+
+        if options['guardar']:
+            benchmark.guardar_baseline(ruta, resultados, options['repeticiones'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline guardado en {ruta} ({len(resultados)} casos)."))
+            return
+
+        nuevos = sorted(set(resultados) - set(baseline))
+        if nuevos:
+            self.stdout.write(self.style.WARNING(f"{len(nuevos)} casos sin baseline: {', '.join(nuevos)}"))
+        regresiones = benchmark.comparar(resultados, baseline, options['umbral'], options['margen_ms'])
+        if regresiones:
+            for regresion in regresiones:
+                self.stderr.write(regresion)
+            raise CommandError(f"{len(regresiones)} regresiones respecto de {ruta}.")
+        self.stdout.write(self.style.SUCCESS(f"Sin regresiones respecto de {ruta} ({len(resultados)} casos)."))
@@ -0,0 +1,56 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion import adjuntos
+from gestion.models import ArchivoAdjunto
+
+
+class Command(BaseCommand):
+    help = "Pasa los adjuntos guardados en adjuntos_tickets/ al almacenamiento por contenido, sin duplicados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conservar', action='store_true', help="No borra los archivos originales.")
+        parser.add_argument('--lote', type=int, default=200)
+
+    def handle(self, *args, **options):
+        pendientes = ArchivoAdjunto.objects.filter(contenido__isnull=True).exclude(archivo='')
+        migrados = faltantes = 0
+        originales = set()
+        ultimo_id = 0
+        while True:
+            lote = list(pendientes.filter(id__gt=ultimo_id).order_by('id')[:options['lote']])
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+            for adjunto in lote:
+                try:
+                    archivo = adjunto.archivo.open('rb')
+                except FileNotFoundError:
+                    faltantes += 1
+                    self.stderr.write(f"Adjunto {adjunto.id}: no existe {adjunto.archivo.name}")
+                    continue
+                with archivo, transaction.atomic():
+                    contenido = adjuntos.guardar(archivo)
+                    ArchivoAdjunto.objects.filter(pk=adjunto.pk).update(
+                        contenido=contenido, nombre=os.path.basename(adjunto.archivo.name)[:255],
+                    )
+                originales.add(adjunto.archivo.name)
+                migrados += 1
+
+        borrados = 0
+        if not options['conservar']:
+            # Solo los que ya no usa ningún adjunto sin migrar
+            en_uso = set(pendientes.values_list('archivo', flat=True))
+            for nombre in originales - en_uso:
+                try:
+                    os.unlink(default_storage.path(nombre))
+                    borrados += 1
+                except FileNotFoundError:
+                    pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{migrados} adjuntos migrados, {borrados} archivos originales borrados, {faltantes} sin archivo."
+        ))
@@ -0,0 +1,56 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion import trabajos
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de trabajos en segundo plano (notificaciones push de tickets, etc.)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=getattr(settings, 'TRABAJOS_HILOS', 4),
+                            help="Trabajos ejecutados en paralelo (por defecto TRABAJOS_HILOS o 4).")
+        parser.add_argument('--lote', type=int, default=20, help="Trabajos reservados por consulta (por defecto 20).")
+        parser.add_argument('--espera', type=float, default=1.0, help="Segundos entre consultas cuando la cola está vacía.")
+        parser.add_argument('--purgar-dias', type=int, default=7, help="Borra los trabajos terminados hace más de N días.")
+        parser.add_argument('--una-vez', action='store_true', help="Vacía la cola y termina, en lugar de quedarse esperando.")
+
+    def handle(self, *args, **options):
+        self.detener = False
+        signal.signal(signal.SIGTERM, self._senal)
+        signal.signal(signal.SIGINT, self._senal)
+
+        worker = trabajos.identificador_worker()
+        procesados = 0
+        ultima_purga = 0.0
+        self.stdout.write(f"Worker {worker} con {options['hilos']} hilos.")
+
+        with ThreadPoolExecutor(max_workers=options['hilos'], thread_name_prefix='trabajo') as pool:
+            while not self.detener:
+                if time.monotonic() - ultima_purga > 3600:
+                    borrados = trabajos.purgar(options['purgar_dias'])
+                    if borrados:
+                        self.stdout.write(f"Purgados {borrados} trabajos terminados.")
+                    ultima_purga = time.monotonic()
+
+                # Al menos un trabajo por hilo; el lote entero queda reservado hasta que termine su último trabajo
+                lote = trabajos.reservar(worker, max(options['lote'], options['hilos']))
+                close_old_connections()
+                if not lote:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['espera'])
+                    continue
+                list(pool.map(trabajos.ejecutar, lote))
+                procesados += len(lote)
+
+        self.stdout.write(self.style.SUCCESS(f"Worker detenido: {procesados} trabajos procesados."))
+
+    def _senal(self, numero, marco):
+        # Termina el lote en curso y sale
+        self.detener = True
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from gestion import busqueda
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el índice de texto completo de tickets y comentarios."
+
+    def handle(self, *args, **options):
+        if not busqueda.motor_disponible():
+            self.stdout.write(self.style.WARNING(
+                "El motor de base de datos no tiene índice de texto completo; se usan filtros icontains."
+            ))
+            return
+        total = busqueda.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Índice de búsqueda reconstruido: {total} tickets."))
@@ -0,0 +1,62 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.models import FrecuenciaPalabra, ResumenTicket
+
+
+class Command(BaseCommand):
+    help = "Compara el rollup de informes y la tabla de palabras con los tickets y los reconstruye."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-verificar', action='store_true', help="Solo informa diferencias, sin reconstruir.")
+
+    def diferencias(self):
+        esperado = ResumenTicket.calcular_desde_tickets()
+        guardado = {
+            (r.estado_id, r.area_id_clave, r.usuario_asignado_id_clave): (r.total, r.segundos_resolucion)
+            for r in ResumenTicket.objects.filter(total__gt=0)
+        }
+        distintas = []
+        for clave in sorted(set(esperado) | set(guardado)):
+            total_esperado, segundos_esperados = esperado.get(clave, (0, 0))
+            total_guardado, segundos_guardados = guardado.get(clave, (0, 0))
+            if total_esperado != total_guardado or abs(segundos_esperados - segundos_guardados) > 1:
+                distintas.append((clave, (total_esperado, segundos_esperados), (total_guardado, segundos_guardados)))
+        return distintas
+
+    def diferencias_palabras(self):
+        esperado = FrecuenciaPalabra.calcular_desde_tickets()
+        guardado = Counter({
+            (f.mes, f.area_id_clave, f.palabra): f.total for f in FrecuenciaPalabra.objects.filter(total__gt=0)
+        })
+        return [clave for clave in set(esperado) | set(guardado) if esperado[clave] != guardado[clave]]
+
+    def handle(self, *args, **options):
+        distintas = self.diferencias()
+        for (estado_id, area_id, usuario_id), esperado, guardado in distintas:
+            self.stdout.write(
+                f"estado={estado_id} área={area_id} usuario={usuario_id}: "
+                f"esperado {esperado[0]} ({esperado[1]:.0f}s), rollup {guardado[0]} ({guardado[1]:.0f}s)"
+            )
+
+        palabras_distintas = self.diferencias_palabras()
+        if palabras_distintas:
+            self.stdout.write(f"Frecuencias de palabras: {len(palabras_distintas)} filas difieren.")
+
+        if options['solo_verificar']:
+            if distintas or palabras_distintas:
+                raise CommandError(
+                    f"El rollup de informes difiere en {len(distintas)} celdas "
+                    f"y las frecuencias de palabras en {len(palabras_distintas)} filas."
+                )
+            self.stdout.write(self.style.SUCCESS("El rollup de informes coincide con los tickets."))
+            return
+
+        ResumenTicket.reconstruir()
+        FrecuenciaPalabra.reconstruir()
+        if self.diferencias() or self.diferencias_palabras():
+            raise CommandError("El rollup sigue sin coincidir después de reconstruirlo.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollup de informes reconstruido ({len(distintas)} celdas y {len(palabras_distintas)} palabras corregidas)."
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from gestion.marcado import VERSION_RENDER
+from gestion.models import ArticuloConocimiento, Comentario, Ticket
+
+
+class Command(BaseCommand):
+    help = "Renderiza y guarda el HTML del marcado de tickets, comentarios y artículos con la versión actual."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help="Re-renderiza también las filas que ya están al día.")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por bulk_update (por defecto 1000).")
+
+    def handle(self, *args, **options):
+        for modelo in (Ticket, Comentario, ArticuloConocimiento):
+            pendientes = modelo.objects.all()
+            if not options['todos']:
+                pendientes = pendientes.filter(~Q(version_html=VERSION_RENDER))
+            campos = list(modelo.CAMPOS_MARCADO.values()) + ['version_html']
+            columnas = ['pk'] + list(modelo.CAMPOS_MARCADO)
+
+            total = 0
+            lote = []
+            for fila in pendientes.only(*columnas).iterator(chunk_size=options['lote']):
+                fila.prerenderizar()
+                lote.append(fila)
+                if len(lote) >= options['lote']:
+                    total += modelo.objects.bulk_update(lote, campos)
+                    lote = []
+            if lote:
+                total += modelo.objects.bulk_update(lote, campos)
+            self.stdout.write(f"{modelo._meta.verbose_name_plural}: {total} filas renderizadas.")
+        self.stdout.write(self.style.SUCCESS(f"HTML del marcado al día (versión {VERSION_RENDER})."))
@@ -0,0 +1,320 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from gestion import adjuntos, autorizacion, benchmark, busqueda, directorio
+from gestion.marcado import VERSION_RENDER, renderizar
+from gestion.models import (
+    ArchivoAdjunto, Area, ArticuloConocimiento, Aviso, CategoriaConocimiento, Comentario, ContenidoAdjunto,
+    EstadoTicket, FrecuenciaPalabra, LecturaAvisos, LecturaTicket, Perfil, ResumenTicket, Tarea, Ticket,
+)
+
+# Cantidades con --escala 1
+BASE = {
+    'areas': 40,
+    'usuarios': 3000,
+    'tickets': 1_000_000,
+    'adjuntos': 150_000,
+    'avisos': 2_000,
+    'tareas': 5_000,
+    'articulos': 2_000,
+}
+
+VERBOS = ['No funciona', 'Falla', 'Solicitud de', 'Error en', 'Consulta sobre', 'Cambio de', 'Instalación de', 'Reclamo por']
+OBJETOS = [
+    'la impresora', 'el correo', 'la VPN', 'el monitor', 'el teclado', 'el sistema de sueldos', 'acceso a carpeta compartida',
+    'el teléfono interno', 'licencia de Office', 'el proyector', 'la red wifi', 'usuario bloqueado', 'el escáner',
+    'la notebook', 'el sistema de expedientes', 'la firma digital',
+]
+LUGARES = ['', 'en Mesa de Entradas', 'del 2º piso', 'de Contaduría', 'en la sala de reuniones', 'de Recursos Humanos', 'en Tesorería']
+DESCRIPCIONES = [
+    "Desde N(esta mañana) no puedo trabajar.\n\nPasos realizados:\n1. Reinicié el equipo\n2. Revisé los cables",
+    "El equipo muestra un error al iniciar: I(servicio no disponible).",
+    "Solicito la instalación para el personal nuevo del área.\n* Urgente para el lunes\n* Contacto interno 1234",
+    "Pasa de forma intermitente, sobre todo a la tarde. Adjunto captura.",
+    "M(#FFF3B0, Prioridad alta): afecta a toda la oficina.",
+    "Ver procedimiento en url(https://intranet/soporte/procedimientos)",
+    "El usuario indica que olvidó la contraseña y quedó bloqueado después de tres intentos.",
+    "Necesitamos S(urgente) el cambio antes del cierre de mes.",
+]
+COMENTARIOS = [
+    "Tomado, lo reviso en el día.",
+    "Se reinició el servicio y quedó funcionando. Por favor confirmar.",
+    "Sigue pasando, ahora con otro mensaje de error.",
+    "Se pidió el repuesto a Compras. N(Demora estimada: una semana).",
+    "Ya funciona, gracias.",
+    "¿Pueden indicar el número de inventario del equipo?",
+    "Se escaló al proveedor.",
+    "1. Se actualizó el controlador\n2. Se probó la impresión\n3. OK",
+]
+CATEGORIAS = ['Impresoras', 'Correo', 'Redes', 'Sistemas internos', 'Hardware', 'Accesos', 'Telefonía', 'Software']
+ESTADOS = [('Pendiente', 2), ('Aceptado', 2), ('Finalizado', 6)]
+# Horas entre la creación y la última modificación; se asignan por id módulo la cantidad
+ANTIGUEDADES = (1, 4, 24, 72, 240)
+# El rol 'usuario' crea uno de cada tantos tickets, siempre en el área del rol 'area' y en la primera tarea
+CADA_TICKET_DE_USUARIO = 200
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos para benchmark: áreas, usuarios con perfiles y grupos, tickets, "
+        "comentarios, adjuntos, avisos, tareas y artículos, más un usuario fijo por rol de benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0, help="Multiplica todas las cantidades (1 = un millón de tickets).")
+        for nombre, cantidad in BASE.items():
+            parser.add_argument(f'--{nombre}', type=int, help=f"Pisa la cantidad de {nombre} (con --escala 1: {cantidad}).")
+        parser.add_argument('--comentarios-por-ticket', type=float, default=3.0)
+        parser.add_argument('--dias', type=int, default=730, help="Antigüedad del ticket más viejo.")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument(
+            '--forzar', action='store_true',
+            help="Agrega los datos aunque ya haya tickets, usuarios o áreas (nunca en una base real).",
+        )
+
+    def handle(self, *args, **options):
+        if not options['forzar'] and (Ticket.objects.exists() or User.objects.exists() or Area.objects.exists()):
+            raise CommandError(
+                "La base ya tiene tickets, usuarios o áreas: seed_benchmark es para una base vacía. "
+                "Use --forzar si de verdad quiere agregar datos sintéticos a esta base."
+            )
+        if User.objects.filter(username__in=benchmark.ROLES.values()).exists():
+            raise CommandError("La base ya tiene datos de benchmark; use una base vacía.")
+
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        cantidades = {
+            nombre: options[nombre] if options[nombre] is not None else max(1, round(base * options['escala']))
+            for nombre, base in BASE.items()
+        }
+        self.ahora = timezone.now()
+
+        self.estados = [EstadoTicket.objects.get_or_create(nombre_estado=nombre)[0] for nombre, _ in ESTADOS]
+        self.pesos_estados = [peso for _, peso in ESTADOS]
+        self.areas = self.crear_areas(cantidades['areas'])
+        self.usuarios, self.staff, self.roles = self.crear_usuarios(cantidades['usuarios'])
+        self.paso(f"{len(self.areas)} áreas y {len(self.usuarios)} usuarios")
+
+        self.tareas = self.crear_tareas(cantidades['tareas'])
+        self.paso(f"{len(self.tareas)} tareas")
+
+        tickets = self.crear_tickets(cantidades['tickets'], options['dias'], options['comentarios_por_ticket'])
+        self.paso(f"{len(tickets)} tickets con sus comentarios")
+
+        self.crear_adjuntos(cantidades['adjuntos'], tickets)
+        self.paso(f"{cantidades['adjuntos']} adjuntos")
+
+        self.crear_avisos(cantidades['avisos'])
+        self.crear_articulos(cantidades['articulos'])
+        self.paso(f"{cantidades['avisos']} avisos y {cantidades['articulos']} artículos")
+
+        # Todo se insertó con bulk_create, sin las señales que mantienen estas tablas
+        ResumenTicket.reconstruir()
+        FrecuenciaPalabra.reconstruir()
+        busqueda.reconstruir()
+        autorizacion.invalidar_todos()
+        directorio.invalidar_perfiles()
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos de benchmark generados. Usuarios por rol: {', '.join(benchmark.ROLES.values())} "
+            f"(contraseña '{benchmark.CLAVE_USUARIOS}')."
+        ))
+
+    def paso(self, mensaje):
+        self.stdout.write(f"  {mensaje}")
+
+    def en_lotes(self, cantidad):
+        for inicio in range(0, cantidad, self.lote):
+            yield range(inicio, min(inicio + self.lote, cantidad))
+
+    def crear_areas(self, cantidad):
+        existentes = set(Area.objects.values_list('nombre', flat=True))
+        Area.objects.bulk_create([Area(nombre=f'Área {i + 1}') for i in range(cantidad) if f'Área {i + 1}' not in existentes])
+        return list(Area.objects.filter(nombre__in=[f'Área {i + 1}' for i in range(cantidad)]).order_by('id'))
+
+    def crear_usuarios(self, cantidad):
+        grupos = {
+            nombre: Group.objects.get_or_create(name=nombre)[0]
+            for nombre in (autorizacion.GRUPO_VER_TODOS, autorizacion.GRUPO_INFORME, autorizacion.GRUPO_AVISOS, autorizacion.GRUPO_CP)
+        }
+        # Un solo hash para todos: check_password sigue costando lo mismo y el seed no tarda minutos en hashear
+        clave = make_password(benchmark.CLAVE_USUARIOS)
+        area_rol = self.areas[0]
+        # (campos de User, área, grupos) de cada usuario fijo
+        roles = {
+            benchmark.ROLES['superusuario']: (dict(is_superuser=True, is_staff=True), area_rol, list(grupos)),
+            benchmark.ROLES['staff']: (dict(is_staff=True), self.areas[1 % len(self.areas)],
+                                       [autorizacion.GRUPO_VER_TODOS, autorizacion.GRUPO_INFORME, autorizacion.GRUPO_AVISOS]),
+            benchmark.ROLES['area']: ({}, area_rol, [autorizacion.GRUPO_CP]),
+            benchmark.ROLES['usuario']: ({}, self.areas[2 % len(self.areas)], []),
+        }
+        nuevos = [User(username=nombre, password=clave, **campos) for nombre, (campos, _, _) in roles.items()]
+        for i in range(cantidad):
+            nuevos.append(User(
+                username=f'usuario{i + 1:06d}', password=clave, first_name=f'Nombre{i + 1}', last_name='Apellido',
+                email=f'usuario{i + 1}@example.com', is_staff=self.azar.random() < 0.03,
+                is_active=self.azar.random() > 0.05,
+            ))
+        with transaction.atomic():
+            usuarios = User.objects.bulk_create(nuevos, batch_size=self.lote)
+            perfiles, membresias = [], []
+            for usuario in usuarios:
+                if usuario.username in roles:
+                    _, area, nombres_grupos = roles[usuario.username]
+                else:
+                    area = self.azar.choice(self.areas)
+                    nombres_grupos = [
+                        nombre for nombre, probabilidad in (
+                            (autorizacion.GRUPO_VER_TODOS, 0.05), (autorizacion.GRUPO_INFORME, 0.02),
+                            (autorizacion.GRUPO_AVISOS, 0.01), (autorizacion.GRUPO_CP, 0.03),
+                        ) if self.azar.random() < probabilidad
+                    ]
+                perfiles.append(Perfil(user=usuario, area=area, numero_interno=str(self.azar.randint(1000, 9999))))
+                membresias += [User.groups.through(user_id=usuario.id, group_id=grupos[nombre].id) for nombre in nombres_grupos]
+            Perfil.objects.bulk_create(perfiles, batch_size=self.lote)
+            User.groups.through.objects.bulk_create(membresias, batch_size=self.lote)
+
+        roles_creados = {u.username: u for u in usuarios if u.username in roles}
+        staff = [u for u in usuarios if u.is_staff]
+        return usuarios, staff, roles_creados
+
+    def crear_tareas(self, cantidad):
+        with transaction.atomic():
+            tareas = Tarea.objects.bulk_create([
+                Tarea(
+                    titulo=f'Proyecto {i + 1}: {self.azar.choice(VERBOS).lower()} {self.azar.choice(OBJETOS)}',
+                    descripcion=self.azar.choice(DESCRIPCIONES),
+                    usuario_creador=self.azar.choice(self.staff) if self.staff else self.roles[benchmark.ROLES['staff']],
+                    finalizada=self.azar.random() < 0.3,
+                )
+                for i in range(cantidad)
+            ], batch_size=self.lote)
+            relaciones = []
+            for i, tarea in enumerate(tareas):
+                areas = {self.areas[0]} if i == 0 else set(self.azar.sample(self.areas, min(len(self.areas), self.azar.randint(1, 3))))
+                relaciones += [Tarea.areas_asignadas.through(tarea_id=tarea.id, area_id=area.id) for area in areas]
+            Tarea.areas_asignadas.through.objects.bulk_create(relaciones, batch_size=self.lote)
+        return tareas
+
+    def crear_tickets(self, cantidad, dias, comentarios_por_ticket):
+        """ Tickets con fechas crecientes según el id, como en producción, y sus comentarios. """
+        descripciones = [(texto, renderizar(texto)) for texto in DESCRIPCIONES]
+        comentarios = [(texto, renderizar(texto)) for texto in COMENTARIOS]
+        # Los roles solo crean los tickets fijos, así el caso medido es siempre el mismo
+        activos = [u for u in self.usuarios if u.is_active and u.username not in self.roles] or [self.roles[benchmark.ROLES['staff']]]
+        usuario_rol = self.roles[benchmark.ROLES['usuario']]
+        inicio = self.ahora - timedelta(days=dias)
+        paso = timedelta(days=dias) / max(cantidad, 1)
+        ids = []
+        for lote in self.en_lotes(cantidad):
+            nuevos = []
+            for i in lote:
+                descripcion, descripcion_html = self.azar.choice(descripciones)
+                estado = self.azar.choices(self.estados, self.pesos_estados)[0]
+                if i % CADA_TICKET_DE_USUARIO == 0:
+                    creador, area, tarea = usuario_rol, self.areas[0], self.tareas[0]
+                else:
+                    creador = self.azar.choice(activos)
+                    area = self.azar.choice(self.areas) if self.azar.random() < 0.9 else None
+                    tarea = self.azar.choice(self.tareas) if self.azar.random() < 0.05 else None
+                asignado = self.azar.choice(self.staff) if self.staff and estado.nombre_estado != 'Pendiente' else None
+                nuevos.append(Ticket(
+                    titulo=f'{self.azar.choice(VERBOS)} {self.azar.choice(OBJETOS)} {self.azar.choice(LUGARES)}'.strip(),
+                    descripcion=descripcion, descripcion_html=descripcion_html, version_html=VERSION_RENDER,
+                    fecha_ultima_modificacion=inicio + paso * (i + self.azar.random()),
+                    usuario_creador=creador, estado=estado, area_asignada=area, usuario_asignado=asignado, tarea=tarea,
+                ))
+            with transaction.atomic():
+                creados = Ticket.objects.bulk_create(nuevos)
+                desde, hasta = creados[0].id, creados[-1].id
+                # auto_now_add/auto_now pisan las fechas en el INSERT: se derivan de la última modificación
+                en_lote = Ticket.objects.filter(id__range=(desde, hasta)).alias(resto=Mod('id', len(ANTIGUEDADES)))
+                for resto, horas in enumerate(ANTIGUEDADES):
+                    en_lote.filter(resto=resto).update(
+                        fecha_creacion=F('fecha_ultima_modificacion') - timedelta(hours=horas),
+                        fecha_actualizacion=F('fecha_ultima_modificacion'),
+                    )
+                self.crear_comentarios(creados, comentarios, comentarios_por_ticket, activos)
+            ids += [ticket.id for ticket in creados]
+        return ids
+
+    def crear_comentarios(self, tickets, textos, por_ticket, activos):
+        nuevos, lecturas = [], []
+        for ticket in tickets:
+            for _ in range(min(int(self.azar.expovariate(1 / por_ticket)), 30) if por_ticket else 0):
+                cuerpo, cuerpo_html = self.azar.choice(textos)
+                autor = (ticket.usuario_asignado or ticket.usuario_creador) if self.azar.random() < 0.7 else self.azar.choice(activos)
+                nuevos.append(Comentario(
+                    ticket=ticket, usuario_autor=autor, cuerpo_comentario=cuerpo, cuerpo_html=cuerpo_html, version_html=VERSION_RENDER,
+                ))
+            # La mitad de los creadores leyó su ticket hasta el último cambio
+            if self.azar.random() < 0.5:
+                lecturas.append(LecturaTicket(usuario=ticket.usuario_creador, ticket=ticket, leido_hasta=ticket.fecha_ultima_modificacion))
+        creados = Comentario.objects.bulk_create(nuevos)
+        if creados:
+            Comentario.objects.filter(id__range=(creados[0].id, creados[-1].id)).update(
+                fecha_creacion=Subquery(Ticket.objects.filter(id=OuterRef('ticket_id')).values('fecha_ultima_modificacion')[:1])
+            )
+        LecturaTicket.objects.bulk_create(lecturas, ignore_conflicts=True)
+
+    def crear_adjuntos(self, cantidad, tickets):
+        """ Pocos contenidos distintos referenciados muchas veces, como con el almacenamiento por contenido. """
+        extensiones = ['txt', 'csv', 'log', 'pdf']
+        contenidos = []
+        for i in range(min(cantidad, 200)):
+            extension = extensiones[i % len(extensiones)]
+            datos = f"Archivo de prueba {i}\n".encode() * self.azar.randint(10, 5000)
+            contenidos.append((adjuntos.guardar(ContentFile(datos, name=f'archivo{i}.{extension}')), extension))
+        usados = dict.fromkeys((contenido.id for contenido, _ in contenidos), 0)
+
+        # El último ticket del rol 'usuario' siempre tiene uno: benchmark_vistas lo usa para las URLs con id
+        ultimo_de_usuario = tickets[(len(tickets) - 1) // CADA_TICKET_DE_USUARIO * CADA_TICKET_DE_USUARIO]
+        for lote in self.en_lotes(cantidad):
+            nuevos = []
+            for i in lote:
+                contenido, extension = self.azar.choice(contenidos)
+                usados[contenido.id] += 1
+                nuevos.append(ArchivoAdjunto(
+                    ticket_id=ultimo_de_usuario if i == 0 else self.azar.choice(tickets),
+                    contenido=contenido, nombre=f'documento-{i + 1}.{extension}',
+                ))
+            ArchivoAdjunto.objects.bulk_create(nuevos)
+        with transaction.atomic():
+            for contenido_id, referencias in usados.items():
+                ContenidoAdjunto.objects.filter(id=contenido_id).update(referencias=referencias)
+
+    def crear_avisos(self, cantidad):
+        autores = [u for u in self.staff if u.is_active] or [self.roles[benchmark.ROLES['staff']]]
+        avisos = Aviso.objects.bulk_create([
+            Aviso(titulo=f'Aviso {i + 1}: corte programado', cuerpo=self.azar.choice(DESCRIPCIONES), autor=self.azar.choice(autores))
+            for i in range(cantidad)
+        ], batch_size=self.lote)
+        # Los roles leyeron casi todo; del resto de usuarios, la mitad leyó hasta algún punto
+        marcas = [LecturaAvisos(usuario=u, ultimo_leido_id=avisos[int(len(avisos) * 0.9)].id) for u in self.roles.values()]
+        marcas += [
+            LecturaAvisos(usuario=u, ultimo_leido_id=self.azar.choice(avisos).id)
+            for u in self.usuarios if u.username not in self.roles and self.azar.random() < 0.5
+        ]
+        LecturaAvisos.objects.bulk_create(marcas, batch_size=self.lote)
+
+    def crear_articulos(self, cantidad):
+        categorias = [CategoriaConocimiento.objects.get_or_create(nombre=nombre)[0] for nombre in CATEGORIAS]
+        textos = [(texto, renderizar(texto)) for texto in DESCRIPCIONES + COMENTARIOS]
+        nuevos = []
+        for i in range(cantidad):
+            contenido, contenido_html = self.azar.choice(textos)
+            nuevos.append(ArticuloConocimiento(
+                titulo=f'¿Cómo resolver: {self.azar.choice(VERBOS).lower()} {self.azar.choice(OBJETOS)}? ({i + 1})',
+                contenido=contenido, contenido_html=contenido_html, version_html=VERSION_RENDER,
+                categoria=self.azar.choice(categorias), autor=self.azar.choice(self.staff) if self.staff else None,
+            ))
+        ArticuloConocimiento.objects.bulk_create(nuevos, batch_size=self.lote)
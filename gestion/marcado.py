@@ -0,0 +1,127 @@
+# /var/www/tickets/gestion/marcado.py
+"""
+Renderizado del marcado propio de tickets, comentarios y artículos:
+N(negrita), I(cursiva), S(subrayado), T(tachado), M(color, resaltado),
+C(color, texto), url(enlace), listas con '* ' y '1. '.
+
+Las marcas en línea se aplican de adentro hacia afuera, como las anidaba el
+editor (por ejemplo C(red, N(importante))): cada pasada del patrón compilado
+reemplaza solo las marcas sin paréntesis adentro, hasta que no queda ninguna.
+Una última pasada más permisiva toma las que tienen paréntesis sueltos en el
+texto, como hacía el renderizador anterior. Cuando cambie la salida hay que
+subir VERSION_RENDER: las filas guardadas con otra versión se vuelven a
+renderizar al mostrarse.
+
+El texto se escapa antes de aplicar el marcado: el único HTML de la salida es
+el que generan las marcas, y url() solo enlaza direcciones http, https, mailto
+o rutas del sitio. El color de M() y C() va dentro de un atributo style: solo se
+acepta un nombre o un #hex; cualquier otro valor (por ejemplo un url() ya
+convertido en enlace, o 'red;position:fixed') deja la marca como texto.
+"""
+
+import re
+
+from django.utils.html import conditional_escape
+
+VERSION_RENDER = 4
+
+_RE_EN_LINEA_INTERNA = re.compile(
+    r'(?P<simple>[NIST])\((?P<texto>[^()]*)\)'
+    r'|(?P<color>[MC])\((?P<valor>[^,()]+),\s*(?P<texto_color>[^()]+)\)'
+    r'|url\((?P<url>[^()]*)\)'
+)
+_RE_EN_LINEA = re.compile(
+    r'(?P<simple>[NIST])\((?P<texto>.*?)\)'
+    r'|(?P<color>[MC])\((?P<valor>[^,)]+),\s*(?P<texto_color>[^)]+)\)'
+    r'|url\((?P<url>.*?)\)'
+)
+_RE_ITEM_NUMERADO = re.compile(r'^\d+\.\s')
+_RE_URL_PERMITIDA = re.compile(r'(?:https?://|mailto:|/(?!/))', re.IGNORECASE)
+_RE_COLOR = re.compile(r'#[0-9a-fA-F]{3,8}|[a-zA-Z]{1,20}')
+
+_ETIQUETAS_SIMPLES = {'N': 'strong', 'I': 'em', 'S': 'u', 'T': 's'}
+
+
+def _reemplazo(coincidencia) -> str:
+    simple = coincidencia.group('simple')
+    if simple:
+        etiqueta = _ETIQUETAS_SIMPLES[simple]
+        return f'<{etiqueta}>{coincidencia.group("texto")}</{etiqueta}>'
+    color = coincidencia.group('color')
+    if color:
+        valor, texto = coincidencia.group('valor').strip(), coincidencia.group('texto_color')
+        if not _RE_COLOR.fullmatch(valor):
+            # Queda como texto; los paréntesis como entidades para que la pasada siguiente no lo vuelva a tomar
+            return f'{color}&#40;{coincidencia.group("valor")}, {texto}&#41;'
+        if color == 'M':
+            return f'<mark style="background-color:{valor};">{texto}</mark>'
+        return f'<span style="color:{valor};">{texto}</span>'
+    url = coincidencia.group('url')
+    if not _RE_URL_PERMITIDA.match(url):
+        # javascript: y otros esquemas quedan como texto, sin enlace
+        return url
+    return f'<a href="{url}" target="_blank" class="text-indigo-600 hover:underline">{url}</a>'
+
+
+def formatos_en_linea(texto: str) -> str:
+    # Cada reemplazo quita un paréntesis y el HTML generado no agrega ninguno: el ciclo termina
+    cantidad = 1
+    while cantidad:
+        texto, cantidad = _RE_EN_LINEA_INTERNA.subn(_reemplazo, texto)
+    return _RE_EN_LINEA.sub(_reemplazo, texto)
+
+
+def renderizar(valor: str) -> str:
+    """ Convierte el marcado en HTML. Devuelve un str plano; quien lo muestre decide si marcarlo seguro. """
+    if not valor:
+        return ''
+
+    valor = str(conditional_escape(valor))
+    html = []
+    en_ul = en_ol = False
+
+    for linea in valor.split('\n'):
+        limpia = linea.strip()
+
+        if not limpia:
+            if en_ul:
+                html.append('</ul>')
+                en_ul = False
+            if en_ol:
+                html.append('</ol>')
+                en_ol = False
+            continue
+
+        if limpia.startswith('* '):
+            if en_ol:
+                html.append('</ol>')
+                en_ol = False
+            if not en_ul:
+                html.append('<ul>')
+                en_ul = True
+            html.append(f'<li>{formatos_en_linea(limpia[2:])}</li>')
+
+        elif _RE_ITEM_NUMERADO.match(limpia):
+            if en_ul:
+                html.append('</ul>')
+                en_ul = False
+            if not en_ol:
+                html.append('<ol>')
+                en_ol = True
+            html.append(f'<li>{formatos_en_linea(_RE_ITEM_NUMERADO.sub("", limpia, count=1))}</li>')
+
+        else:
+            if en_ul:
+                html.append('</ul>')
+                en_ul = False
+            if en_ol:
+                html.append('</ol>')
+                en_ol = False
+            html.append(f'<p>{formatos_en_linea(linea)}</p>')
+
+    if en_ul:
+        html.append('</ul>')
+    if en_ol:
+        html.append('</ol>')
+
+    return ''.join(html)
@@ -0,0 +1,255 @@
+# /var/www/tickets/gestion/metricas.py
+"""
+Métricas en formato de texto de Prometheus para /metrics.
+
+Cada proceso (worker de gunicorn, procesar_trabajos) escribe sus contadores e
+histogramas en su propio archivo METRICAS_DIR/<pid>.db, mapeado en memoria:
+incrementar es sumar a un double en una posición fija, sin locks entre procesos
+ni llamadas al sistema. /metrics lee todos los archivos del directorio y suma
+por serie, así que el resultado es el mismo sin importar qué worker atiende el
+scrape. Los archivos de procesos que terminaron se conservan para que los
+contadores no retrocedan; el directorio se vacía al reiniciar el servicio
+(por ejemplo en on_starting de gunicorn) y no debe compartirse entre servicios.
+
+Formato del archivo: 8 bytes de cabecera con los bytes usados, y después
+entradas [largo uint32][clave utf-8, con relleno a múltiplo de 8][valor double].
+La cabecera se actualiza después de escribir la entrada completa, así que quien
+lee nunca ve una entrada a medias.
+
+Los contadores e histogramas de requests los alimenta
+gestion.rendimiento.MedicionRendimientoMiddleware, que ya mide tiempo y consultas.
+Los gauges (tickets abiertos, trabajos en cola) no se guardan: se calculan al
+hacer el scrape desde el rollup de informes y la tabla de trabajos.
+"""
+
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+TAMANO_INICIAL = 64 * 1024
+_CABECERA = struct.Struct('i4x')
+_LARGO = struct.Struct('i')
+_VALOR = struct.Struct('d')
+
+TRAMOS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TRAMOS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_candado = threading.Lock()
+_archivo = None
+_familias = {}
+
+
+def directorio() -> str:
+    return getattr(settings, 'METRICAS_DIR', os.path.join(settings.BASE_DIR, 'metricas'))
+
+
+class _ArchivoValores:
+    """ {clave: double} del proceso actual en un archivo mapeado en memoria. """
+
+    def __init__(self, ruta):
+        self.pid = os.getpid()
+        self._archivo = open(ruta, 'a+b')
+        if os.fstat(self._archivo.fileno()).st_size == 0:
+            self._archivo.truncate(TAMANO_INICIAL)
+        self._mapear()
+        self._usado = _CABECERA.unpack_from(self._mmap, 0)[0] or _CABECERA.size
+        self._posiciones = {clave: posicion for clave, posicion, _ in _entradas(self._mmap, self._usado)}
+
+    def _mapear(self):
+        self._tamano = os.fstat(self._archivo.fileno()).st_size
+        self._mmap = mmap.mmap(self._archivo.fileno(), self._tamano)
+
+    def _agregar(self, clave):
+        datos = clave.encode('utf-8')
+        relleno = (_LARGO.size + len(datos) + 7) // 8 * 8 - _LARGO.size - len(datos)
+        largo_entrada = _LARGO.size + len(datos) + relleno + _VALOR.size
+        while self._usado + largo_entrada > self._tamano:
+            self._mmap.close()
+            self._archivo.truncate(self._tamano * 2)
+            self._mapear()
+        inicio = self._usado
+        _LARGO.pack_into(self._mmap, inicio, len(datos))
+        self._mmap[inicio + _LARGO.size:inicio + _LARGO.size + len(datos)] = datos
+        posicion = inicio + _LARGO.size + len(datos) + relleno
+        _VALOR.pack_into(self._mmap, posicion, 0.0)
+        self._usado += largo_entrada
+        _CABECERA.pack_into(self._mmap, 0, self._usado)
+        self._posiciones[clave] = posicion
+        return posicion
+
+    def sumar(self, clave, valor):
+        posicion = self._posiciones.get(clave)
+        if posicion is None:
+            posicion = self._agregar(clave)
+        _VALOR.pack_into(self._mmap, posicion, _VALOR.unpack_from(self._mmap, posicion)[0] + valor)
+
+
+def _entradas(datos, usado):
+    """ (clave, posición del valor, valor) de cada entrada hasta `usado`. """
+    posicion = _CABECERA.size
+    while posicion < usado:
+        largo = _LARGO.unpack_from(datos, posicion)[0]
+        clave = bytes(datos[posicion + _LARGO.size:posicion + _LARGO.size + largo]).decode('utf-8')
+        posicion_valor = (posicion + _LARGO.size + largo + 7) // 8 * 8
+        yield clave, posicion_valor, _VALOR.unpack_from(datos, posicion_valor)[0]
+        posicion = posicion_valor + _VALOR.size
+
+
+def _archivo_del_proceso():
+    global _archivo
+    # Después de un fork el hijo abre su propio archivo
+    if _archivo is None or _archivo.pid != os.getpid():
+        os.makedirs(directorio(), exist_ok=True)
+        _archivo = _ArchivoValores(os.path.join(directorio(), f'{os.getpid()}.db'))
+    return _archivo
+
+
+def _sumar(clave, valor):
+    if not getattr(settings, 'METRICAS_HABILITADAS', True):
+        return
+    with _candado:
+        _archivo_del_proceso().sumar(clave, valor)
+
+
+class Contador:
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas, self.tipo = nombre, ayuda, tuple(etiquetas), 'counter'
+        _familias[nombre] = self
+
+    def inc(self, valor=1, **etiquetas):
+        _sumar(json.dumps([self.nombre, '', [str(etiquetas[e]) for e in self.etiquetas]]), valor)
+
+
+class Histograma:
+
+    def __init__(self, nombre, ayuda, etiquetas=(), tramos=TRAMOS_SEGUNDOS):
+        self.nombre, self.ayuda, self.etiquetas, self.tipo = nombre, ayuda, tuple(etiquetas), 'histogram'
+        self.tramos = tuple(tramos) + (math.inf,)
+        _familias[nombre] = self
+
+    def observar(self, valor, **etiquetas):
+        valores = [str(etiquetas[e]) for e in self.etiquetas]
+        tramo = next(limite for limite in self.tramos if valor <= limite)
+        # Se guarda el tramo propio (no acumulado); el acumulado se arma al exponer
+        _sumar(json.dumps([self.nombre, _formato_numero(tramo), valores]), 1)
+        _sumar(json.dumps([self.nombre, 'sum', valores]), valor)
+
+
+REQUESTS = Contador('tickets_http_requests_total', 'Requests atendidos por nombre de URL.', ('vista', 'metodo', 'codigo'))
+DURACION = Histograma('tickets_http_request_duration_seconds', 'Duración de los requests por nombre de URL.', ('vista',))
+CONSULTAS = Histograma(
+    'tickets_http_request_sql_queries', 'Consultas SQL por request, por nombre de URL.', ('vista',), TRAMOS_CONSULTAS,
+)
+LOGINS = Contador('tickets_login_total', 'Intentos de inicio de sesión.', ('resultado',))
+ACCESO_CP = Contador('tickets_verificar_acceso_cp_total', 'Verificaciones de acceso de CP por resultado.', ('resultado',))
+CACHE = Contador('tickets_cache_total', 'Consultas a cachés de la aplicación.', ('cache', 'resultado'))
+ADJUNTOS = Contador('tickets_adjuntos_subidos_total', 'Archivos adjuntos recibidos.')
+ADJUNTOS_BYTES = Contador('tickets_adjuntos_subidos_bytes_total', 'Bytes de archivos adjuntos recibidos.')
+TRABAJOS = Contador('tickets_trabajos_ejecutados_total', 'Trabajos de la cola ejecutados.', ('tipo', 'resultado'))
+
+
+METODOS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def registrar_request(vista, metodo, codigo, segundos, consultas):
+    # El método lo elige el cliente: fuera de los conocidos se agrupa para no crear series sin límite
+    REQUESTS.inc(vista=vista, metodo=metodo if metodo in METODOS else 'otro', codigo=codigo)
+    DURACION.observar(segundos, vista=vista)
+    CONSULTAS.observar(consultas, vista=vista)
+
+
+def _formato_numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return repr(float(valor)) if valor != int(valor) else f'{int(valor)}'
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def leer_todos():
+    """ {(familia, sufijo, valores de etiquetas): suma de todos los procesos}. """
+    totales = {}
+    for ruta in glob.glob(os.path.join(directorio(), '*.db')):
+        try:
+            with open(ruta, 'rb') as archivo:
+                datos = archivo.read()
+        except FileNotFoundError:
+            continue
+        if len(datos) < _CABECERA.size:
+            continue
+        for clave, _, valor in _entradas(datos, _CABECERA.unpack_from(datos, 0)[0]):
+            familia, sufijo, valores = json.loads(clave)
+            clave = (familia, sufijo, tuple(valores))
+            totales[clave] = totales.get(clave, 0.0) + valor
+    return totales
+
+
+def _gauges():
+    """ [(nombre, ayuda, etiquetas, [(valores, valor)])] calculados en el momento. """
+    from django.db.models import Count, Sum
+
+    from .models import Area, ResumenTicket, Trabajo
+
+    por_estado, por_area = {}, {}
+    filas = ResumenTicket.objects.filter(total__gt=0).exclude(estado__nombre_estado='Finalizado').values_list(
+        'estado__nombre_estado', 'area_id_clave'
+    ).annotate(cantidad=Sum('total')).order_by()
+    for estado, area_id, cantidad in filas:
+        por_estado[estado] = por_estado.get(estado, 0) + cantidad
+        por_area[area_id] = por_area.get(area_id, 0) + cantidad
+    nombres_areas = dict(Area.objects.filter(id__in=[a for a in por_area if a]).values_list('id', 'nombre'))
+    trabajos = Trabajo.objects.filter(estado__in=[Trabajo.PENDIENTE, Trabajo.EN_CURSO, Trabajo.FALLIDO]).values_list(
+        'tipo', 'estado'
+    ).annotate(cantidad=Count('id')).order_by()
+    return [
+        ('tickets_abiertos', 'Tickets no finalizados por estado.', ('estado',),
+         [((estado,), cantidad) for estado, cantidad in sorted(por_estado.items())]),
+        ('tickets_abiertos_por_area', 'Tickets no finalizados por área.', ('area',),
+         [((nombres_areas.get(area_id, 'Sin área'),), cantidad) for area_id, cantidad in sorted(por_area.items())]),
+        ('tickets_trabajos_en_cola', 'Trabajos sin terminar por tipo y estado.', ('tipo', 'estado'),
+         [((tipo, estado), cantidad) for tipo, estado, cantidad in trabajos]),
+    ]
+
+
+def exposicion() -> str:
+    """ Texto para /metrics (formato de exposición 0.0.4). """
+    totales = leer_todos()
+    por_familia = {}
+    for (familia, sufijo, valores), valor in totales.items():
+        por_familia.setdefault(familia, {}).setdefault(valores, {})[sufijo] = valor
+
+    lineas = []
+    for nombre, familia in _familias.items():
+        lineas += [f'# HELP {nombre} {familia.ayuda}', f'# TYPE {nombre} {familia.tipo}']
+        for valores, muestras in sorted(por_familia.get(nombre, {}).items()):
+            if familia.tipo == 'counter':
+                lineas.append(f"{nombre}{_etiquetas(familia.etiquetas, valores)} {_formato_numero(muestras.get('', 0))}")
+                continue
+            acumulado = 0
+            for limite in familia.tramos:
+                texto = _formato_numero(limite)
+                acumulado += muestras.get(texto, 0)
+                lineas.append(f"{nombre}_bucket{_etiquetas(familia.etiquetas, valores, ('le', texto))} {_formato_numero(acumulado)}")
+            lineas.append(f"{nombre}_sum{_etiquetas(familia.etiquetas, valores)} {repr(float(muestras.get('sum', 0)))}")
+            lineas.append(f"{nombre}_count{_etiquetas(familia.etiquetas, valores)} {_formato_numero(acumulado)}")
+
+    for nombre, ayuda, etiquetas, filas in _gauges():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} gauge']
+        lineas += [f'{nombre}{_etiquetas(etiquetas, valores)} {valor}' for valores, valor in filas]
+    return '\n'.join(lineas) + '\n'
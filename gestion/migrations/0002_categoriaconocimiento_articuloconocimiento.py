@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoriaConocimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Categoría de Conocimiento',
+                'verbose_name_plural': 'Categorías de Conocimiento',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArticuloConocimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(help_text='El título del artículo o la pregunta frecuente.', max_length=200)),
+                ('contenido', models.TextField(help_text='La respuesta o solución detallada.')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('ultima_actualizacion', models.DateTimeField(auto_now=True)),
+                ('autor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('categoria', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='articulos', to='gestion.categoriaconocimiento')),
+            ],
+            options={
+                'verbose_name': 'Artículo de Conocimiento',
+                'verbose_name_plural': 'Artículos de Conocimiento',
+                'ordering': ['-ultima_actualizacion'],
+            },
+        ),
+    ]
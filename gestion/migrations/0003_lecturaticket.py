@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0002_categoriaconocimiento_articuloconocimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leido_hasta', models.DateTimeField()),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas', to='gestion.ticket')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas_tickets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'ticket'), name='lectura_ticket_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def m2m_a_marcas(apps, schema_editor):
+    """ Convierte cada fila (ticket, usuario) de comentarios_leidos_por en una marca de lectura. """
+    Ticket = apps.get_model('gestion', 'Ticket')
+    LecturaTicket = apps.get_model('gestion', 'LecturaTicket')
+    Relacion = Ticket.comentarios_leidos_por.through
+
+    filas = Relacion.objects.values_list('ticket_id', 'user_id', 'ticket__fecha_ultima_modificacion')
+    lote = []
+    for ticket_id, user_id, fecha in filas.iterator(chunk_size=2000):
+        lote.append(LecturaTicket(ticket_id=ticket_id, usuario_id=user_id, leido_hasta=fecha))
+        if len(lote) >= 2000:
+            LecturaTicket.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        LecturaTicket.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+def marcas_a_m2m(apps, schema_editor):
+    """ Solo se restauran las marcas que siguen al día: equivalen a estar en el M2M. """
+    Ticket = apps.get_model('gestion', 'Ticket')
+    LecturaTicket = apps.get_model('gestion', 'LecturaTicket')
+    Relacion = Ticket.comentarios_leidos_por.through
+
+    lote = []
+    marcas = LecturaTicket.objects.filter(leido_hasta__gte=F('ticket__fecha_ultima_modificacion'))
+    for ticket_id, user_id in marcas.values_list('ticket_id', 'usuario_id').iterator(chunk_size=2000):
+        lote.append(Relacion(ticket_id=ticket_id, user_id=user_id))
+        if len(lote) >= 2000:
+            Relacion.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        Relacion.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0003_lecturaticket'),
+    ]
+
+    operations = [
+        migrations.RunPython(m2m_a_marcas, marcas_a_m2m),
+    ]
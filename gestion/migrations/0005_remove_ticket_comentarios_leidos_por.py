@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0004_migrar_comentarios_leidos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ticket',
+            name='comentarios_leidos_por',
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0005_remove_ticket_comentarios_leidos_por'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='area_asignada',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets_en_area', to='gestion.area'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='estado',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, to='gestion.estadoticket'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='tarea',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='gestion.tarea'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='usuario_creador',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, related_name='tickets_creados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('tarea__isnull', True)), fields=['-fecha_ultima_modificacion', '-id'], name='ticket_dash_fum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['area_asignada', '-fecha_ultima_modificacion', '-id'], name='ticket_area_fum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['usuario_creador', '-fecha_ultima_modificacion', '-id'], name='ticket_creador_fum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['estado', '-fecha_ultima_modificacion', '-id'], name='ticket_estado_fum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('tarea__isnull', False)), fields=['tarea', '-fecha_ultima_modificacion'], name='ticket_tarea_fum_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['fecha_ultima_modificacion'], name='ticket_fum_idx'),
+        ),
+    ]
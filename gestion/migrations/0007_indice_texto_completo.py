@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE gestion_ticket_fts USING fts5("
+            "titulo, descripcion, comentarios, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO gestion_ticket_fts (rowid, titulo, descripcion, comentarios) "
+            "SELECT t.id, t.titulo, t.descripcion, coalesce((SELECT group_concat(c.cuerpo_comentario, ' ') "
+            "FROM gestion_comentario c WHERE c.ticket_id = t.id), '') FROM gestion_ticket t"
+        )
+    elif vendor == 'postgresql':
+        config = getattr(settings, 'BUSQUEDA_PG_CONFIG', 'spanish')
+        schema_editor.execute(
+            "CREATE TABLE gestion_ticket_fts ("
+            "ticket_id bigint PRIMARY KEY REFERENCES gestion_ticket (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "documento tsvector NOT NULL)"
+        )
+        schema_editor.execute("CREATE INDEX gestion_ticket_fts_documento_idx ON gestion_ticket_fts USING GIN (documento)")
+        schema_editor.execute(
+            "INSERT INTO gestion_ticket_fts (ticket_id, documento) "
+            "SELECT t.id, setweight(to_tsvector(%s::regconfig, t.titulo), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, t.descripcion), 'B') || "
+            "setweight(to_tsvector(%s::regconfig, coalesce((SELECT string_agg(c.cuerpo_comentario, ' ') "
+            "FROM gestion_comentario c WHERE c.ticket_id = t.id), '')), 'C') FROM gestion_ticket t",
+            [config, config, config],
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS gestion_ticket_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0006_indices_ticket'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
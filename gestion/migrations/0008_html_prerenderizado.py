@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_indice_texto_completo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articuloconocimiento',
+            name='contenido_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='articuloconocimiento',
+            name='version_html',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comentario',
+            name='cuerpo_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='comentario',
+            name='version_html',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='descripcion_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='version_html',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+
+
+def poblar_resumen(apps, schema_editor):
+    Ticket = apps.get_model('gestion', 'Ticket')
+    ResumenTicket = apps.get_model('gestion', 'ResumenTicket')
+    duracion = ExpressionWrapper(F('fecha_actualizacion') - F('fecha_creacion'), output_field=DurationField())
+    filas = Ticket.objects.order_by().values('estado_id', 'area_asignada_id', 'usuario_asignado_id').annotate(
+        cantidad=Count('id'), duracion=Sum(duracion),
+    )
+    ResumenTicket.objects.bulk_create([
+        ResumenTicket(
+            estado_id=f['estado_id'],
+            area_id_clave=f['area_asignada_id'] or 0,
+            usuario_asignado_id_clave=f['usuario_asignado_id'] or 0,
+            total=f['cantidad'],
+            segundos_resolucion=f['duracion'].total_seconds() if f['duracion'] else 0,
+        )
+        for f in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0008_html_prerenderizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area_id_clave', models.BigIntegerField(default=0)),
+                ('usuario_asignado_id_clave', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+                ('segundos_resolucion', models.FloatField(default=0)),
+                ('estado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.estadoticket')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('estado', 'area_id_clave', 'usuario_asignado_id_clave'), name='resumen_ticket_clave')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
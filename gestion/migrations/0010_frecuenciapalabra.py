@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:01
+
+from collections import Counter
+
+from django.db import migrations, models
+
+from gestion.palabras import contar_palabras, mes_de
+
+
+def poblar_frecuencias(apps, schema_editor):
+    Ticket = apps.get_model('gestion', 'Ticket')
+    FrecuenciaPalabra = apps.get_model('gestion', 'FrecuenciaPalabra')
+    conteo = Counter()
+    for titulo, fecha, area_id in Ticket.objects.values_list('titulo', 'fecha_creacion', 'area_asignada_id').iterator():
+        mes = mes_de(fecha)
+        for palabra, cantidad in contar_palabras(titulo).items():
+            conteo[(mes, area_id or 0, palabra)] += cantidad
+    FrecuenciaPalabra.objects.bulk_create(
+        (FrecuenciaPalabra(mes=mes, area_id_clave=area_id, palabra=palabra, total=total)
+         for (mes, area_id, palabra), total in conteo.items()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_resumenticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrecuenciaPalabra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('palabra', models.CharField(max_length=150)),
+                ('mes', models.DateField()),
+                ('area_id_clave', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['area_id_clave', 'mes'], name='frecuencia_area_mes_idx')],
+                'constraints': [models.UniqueConstraint(fields=('mes', 'area_id_clave', 'palabra'), name='frecuencia_palabra_clave')],
+            },
+        ),
+        migrations.RunPython(poblar_frecuencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0010_frecuenciapalabra'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('nivel', models.CharField(max_length=10)),
+                ('tipo', models.CharField(max_length=40)),
+                ('actor_nombre', models.CharField(blank=True, max_length=150)),
+                ('valor_anterior', models.CharField(blank=True, max_length=255)),
+                ('valor_nuevo', models.CharField(blank=True, max_length=255)),
+                ('mensaje', models.TextField()),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ticket', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='eventos_auditoria', to='gestion.ticket')),
+                ('usuario_afectado', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-fecha'], name='auditoria_fecha_idx'), models.Index(fields=['tipo', '-fecha'], name='auditoria_tipo_fecha_idx'), models.Index(fields=['actor_nombre', '-fecha'], name='auditoria_actor_fecha_idx'), models.Index(condition=models.Q(('ticket__isnull', False)), fields=['ticket', '-fecha'], name='auditoria_ticket_fecha_idx')],
+            },
+        ),
+    ]
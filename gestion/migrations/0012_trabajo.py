@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_eventoauditoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('datos', models.JSONField(default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('hecho', 'Hecho'), ('fallido', 'Fallido')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reservado_por', models.CharField(blank=True, max_length=64)),
+                ('reservado_hasta', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('estado', 'pendiente')), fields=['disponible_desde'], name='trabajo_pendiente_idx'), models.Index(condition=models.Q(('estado', 'en_curso')), fields=['reservado_hasta'], name='trabajo_en_curso_idx'), models.Index(condition=models.Q(('estado', 'en_curso')), fields=['reservado_por'], name='trabajo_reservado_idx'), models.Index(condition=models.Q(('estado', 'hecho')), fields=['terminado'], name='trabajo_hecho_idx')],
+            },
+        ),
+    ]
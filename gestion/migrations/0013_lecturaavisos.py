@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_trabajo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaAvisos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_leido_id', models.BigIntegerField(default=0)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lectura_avisos', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AvisoNoLeido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aviso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.aviso')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'aviso'), name='aviso_no_leido_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+def m2m_a_marcas(apps, schema_editor):
+    """
+    La marca de agua de cada usuario es el aviso más nuevo que tenía leído; los
+    anteriores que no había leído quedan como excepciones, así nada cambia de estado.
+    """
+    Aviso = apps.get_model('gestion', 'Aviso')
+    LecturaAvisos = apps.get_model('gestion', 'LecturaAvisos')
+    AvisoNoLeido = apps.get_model('gestion', 'AvisoNoLeido')
+    Relacion = Aviso.leido_por.through
+
+    leidos = {}
+    for aviso_id, user_id in Relacion.objects.values_list('aviso_id', 'user_id').iterator(chunk_size=2000):
+        leidos.setdefault(user_id, set()).add(aviso_id)
+    todos = list(Aviso.objects.order_by('id').values_list('id', flat=True))
+
+    LecturaAvisos.objects.bulk_create(
+        [LecturaAvisos(usuario_id=user_id, ultimo_leido_id=max(ids)) for user_id, ids in leidos.items()],
+        batch_size=2000,
+    )
+    lote = []
+    for user_id, ids in leidos.items():
+        marca = max(ids)
+        for aviso_id in todos:
+            if aviso_id > marca:
+                break
+            if aviso_id not in ids:
+                lote.append(AvisoNoLeido(usuario_id=user_id, aviso_id=aviso_id))
+        if len(lote) >= 2000:
+            AvisoNoLeido.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        AvisoNoLeido.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+def marcas_a_m2m(apps, schema_editor):
+    Aviso = apps.get_model('gestion', 'Aviso')
+    LecturaAvisos = apps.get_model('gestion', 'LecturaAvisos')
+    AvisoNoLeido = apps.get_model('gestion', 'AvisoNoLeido')
+    Relacion = Aviso.leido_por.through
+
+    excepciones = set(AvisoNoLeido.objects.values_list('usuario_id', 'aviso_id'))
+    todos = list(Aviso.objects.order_by('id').values_list('id', flat=True))
+    lote = []
+    for user_id, marca in LecturaAvisos.objects.values_list('usuario_id', 'ultimo_leido_id').iterator(chunk_size=2000):
+        for aviso_id in todos:
+            if aviso_id > marca:
+                break
+            if (user_id, aviso_id) not in excepciones:
+                lote.append(Relacion(aviso_id=aviso_id, user_id=user_id))
+        if len(lote) >= 2000:
+            Relacion.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        Relacion.objects.bulk_create(lote, ignore_conflicts=True)
+    # El M2M vuelve a ser la fuente: sin esto, volver a migrar hacia adelante repite las marcas
+    AvisoNoLeido.objects.all().delete()
+    LecturaAvisos.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_lecturaavisos'),
+    ]
+
+    operations = [
+        migrations.RunPython(m2m_a_marcas, marcas_a_m2m),
+    ]
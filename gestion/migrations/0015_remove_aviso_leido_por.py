@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_migrar_avisos_leidos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='aviso',
+            name='leido_por',
+        ),
+    ]
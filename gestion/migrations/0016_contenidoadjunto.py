@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_remove_aviso_leido_por'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContenidoAdjunto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('tamano', models.BigIntegerField()),
+                ('tipo_mime', models.CharField(max_length=100)),
+                ('ruta', models.CharField(max_length=200)),
+                ('miniatura', models.CharField(blank=True, default='', max_length=200)),
+                ('referencias', models.IntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='nombre',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='archivoadjunto',
+            name='archivo',
+            field=models.FileField(blank=True, upload_to='adjuntos_tickets/'),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='contenido',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='adjuntos', to='gestion.contenidoadjunto'),
+        ),
+    ]
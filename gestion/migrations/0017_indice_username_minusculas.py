@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import migrations
+
+INDICE = 'gestion_usuario_username_lower_idx'
+
+
+def crear_indice(apps, schema_editor):
+    # Índice de expresión sobre la tabla de usuarios para las búsquedas sin distinguir mayúsculas
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        tabla = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDICE} ON {schema_editor.quote_name(tabla)} (LOWER(username))')
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_contenidoadjunto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_indice_username_minusculas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='tarea_fecha_idx'),
+        ),
+    ]
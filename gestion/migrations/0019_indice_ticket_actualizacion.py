@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_indice_tarea_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='ticket_actualizacion_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def vaciar_tiempos_abiertos(apps, schema_editor):
+    # Solo las celdas del estado resuelto suman tiempos de resolución
+    ResumenTicket = apps.get_model('gestion', 'ResumenTicket')
+    ResumenTicket.objects.exclude(estado__nombre_estado='Finalizado').update(segundos_resolucion=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0019_indice_ticket_actualizacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(vaciar_tiempos_abiertos, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,58 @@
 # /var/www/tickets/gestion/models.py
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 import os
+from collections import Counter
+
+from .autorizacion import invalidar_usuario, invalidar_todos
+from .busqueda import indexar_ticket, desindexar_ticket
+from .directorio import invalidar_perfiles
+from .marcado import VERSION_RENDER, renderizar
+from .palabras import contar_palabras, mes_de
 
 User = settings.AUTH_USER_MODEL
 
+class MarcadoPrerenderizado(models.Model):
+    """
+    Guarda el HTML del marcado al escribir. CAMPOS_MARCADO relaciona cada campo
+    de texto con su columna HTML; si `version_html` quedó vieja se re-renderiza al leer.
+    """
+    CAMPOS_MARCADO = {}
+
+    version_html = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def prerenderizar(self):
+        for fuente, destino in self.CAMPOS_MARCADO.items():
+            setattr(self, destino, renderizar(getattr(self, fuente)))
+        self.version_html = VERSION_RENDER
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.prerenderizar()
+        elif set(update_fields) & set(self.CAMPOS_MARCADO):
+            self.prerenderizar()
+            kwargs['update_fields'] = set(update_fields) | set(self.CAMPOS_MARCADO.values()) | {'version_html'}
+        super().save(*args, **kwargs)
+
+    def html(self, fuente):
+        if self.version_html != VERSION_RENDER:
+            self.prerenderizar()
+            columnas = {destino: getattr(self, destino) for destino in self.CAMPOS_MARCADO.values()}
+            type(self).objects.filter(pk=self.pk).update(version_html=VERSION_RENDER, **columnas)
+        return mark_safe(getattr(self, self.CAMPOS_MARCADO[fuente]))
+
 class Area(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     def __str__(self):
@@ -24,9 +68,12 @@ class CategoriaConocimiento(models.Model):
     def __str__(self):
         return self.nombre
 
-class ArticuloConocimiento(models.Model):
+class ArticuloConocimiento(MarcadoPrerenderizado):
+    CAMPOS_MARCADO = {'contenido': 'contenido_html'}
+
     titulo = models.CharField(max_length=200, help_text="El título del artículo o la pregunta frecuente.")
     contenido = models.TextField(help_text="La respuesta o solución detallada.")
+    contenido_html = models.TextField(blank=True, default='', editable=False)
     categoria = models.ForeignKey(CategoriaConocimiento, on_delete=models.SET_NULL, null=True, related_name='articulos')
     autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -39,6 +86,10 @@ class ArticuloConocimiento(models.Model):
 
     def __str__(self):
         return self.titulo
+
+    @property
+    def contenido_renderizado(self):
+        return self.html('contenido')
     
 # --- NUEVO MODELO DE TAREA ---
 class Tarea(models.Model):
@@ -49,6 +100,12 @@ class Tarea(models.Model):
     areas_asignadas = models.ManyToManyField(Area, related_name='tareas_asignadas')
     finalizada = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Lista de tareas: paginación por cursor sobre (fecha_creacion, id)
+            models.Index(fields=['-fecha_creacion', '-id'], name='tarea_fecha_idx'),
+        ]
+
     def __str__(self):
         return self.titulo
 
@@ -68,59 +125,641 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
     except Perfil.DoesNotExist:
         Perfil.objects.create(user=instance)
 
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_autorizacion_perfil(sender, instance, **kwargs):
+    invalidar_usuario(instance.user_id)
+
+@receiver(post_init, sender=Perfil)
+def recordar_interno(sender, instance, **kwargs):
+    instance._interno_guardado = instance.__dict__.get('numero_interno')
+
+@receiver(post_save, sender=Perfil)
+def invalidar_directorio_perfil(sender, instance, **kwargs):
+    if instance.numero_interno != instance._interno_guardado:
+        invalidar_perfiles()
+        instance._interno_guardado = instance.numero_interno
+
+@receiver(post_delete, sender=Perfil)
+def invalidar_directorio_perfil_eliminado(sender, instance, **kwargs):
+    if instance.numero_interno:
+        invalidar_perfiles()
+
+@receiver(m2m_changed, sender='auth.User_groups')
+def invalidar_autorizacion_grupos(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # group.user_set.add(...) o .clear(): pueden ser muchos usuarios
+        invalidar_todos()
+    else:
+        invalidar_usuario(instance.pk)
+
+@receiver(post_save, sender='auth.Group')
+@receiver(post_delete, sender='auth.Group')
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+def invalidar_autorizacion_nombres(sender, **kwargs):
+    # Un grupo o área recién creado todavía no figura en ningún contexto
+    if not kwargs.get('created'):
+        invalidar_todos()
+
 class EstadoTicket(models.Model):
     nombre_estado = models.CharField(max_length=25, unique=True)
     def __str__(self):
         return self.nombre_estado
 
-class Ticket(models.Model):
+class Ticket(MarcadoPrerenderizado):
+    CAMPOS_MARCADO = {'descripcion': 'descripcion_html'}
+
     # --- CAMPO AÑADIDO PARA RELACIONAR CON TAREA ---
-    tarea = models.ForeignKey(Tarea, on_delete=models.CASCADE, null=True, blank=True, related_name='tickets')
+    tarea = models.ForeignKey(Tarea, on_delete=models.CASCADE, null=True, blank=True, related_name='tickets', db_index=False)
 
     titulo = models.CharField(max_length=150)
     descripcion = models.TextField()
+    descripcion_html = models.TextField(blank=True, default='', editable=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     fecha_ultima_modificacion = models.DateTimeField(default=timezone.now)
-    usuario_creador = models.ForeignKey(User, on_delete=models.RESTRICT, related_name='tickets_creados')
-    estado = models.ForeignKey(EstadoTicket, on_delete=models.RESTRICT)
-    area_asignada = models.ForeignKey(Area, on_delete=models.SET_NULL, null=True, blank=True, related_name='tickets_en_area')
+    usuario_creador = models.ForeignKey(User, on_delete=models.RESTRICT, related_name='tickets_creados', db_index=False)
+    estado = models.ForeignKey(EstadoTicket, on_delete=models.RESTRICT, db_index=False)
+    area_asignada = models.ForeignKey(Area, on_delete=models.SET_NULL, null=True, blank=True, related_name='tickets_en_area', db_index=False)
     usuario_asignado = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tickets_asignados')
-    comentarios_leidos_por = models.ManyToManyField(User, related_name='tickets_con_comentarios_leidos', blank=True)
+
+    class Meta:
+        indexes = [
+            # Dashboard "Todos": tickets sueltos (sin tarea) en el orden de la paginación por cursor
+            models.Index(fields=['-fecha_ultima_modificacion', '-id'], name='ticket_dash_fum_idx', condition=models.Q(tarea__isnull=True)),
+            # Dashboard "Mis Tickets" (una rama del OR por área y otra por creador) y filtro por estado.
+            # Reemplazan a los índices simples de las FK, que son su prefijo.
+            models.Index(fields=['area_asignada', '-fecha_ultima_modificacion', '-id'], name='ticket_area_fum_idx'),
+            models.Index(fields=['usuario_creador', '-fecha_ultima_modificacion', '-id'], name='ticket_creador_fum_idx'),
+            models.Index(fields=['estado', '-fecha_ultima_modificacion', '-id'], name='ticket_estado_fum_idx'),
+            # Detalle de tarea: solo indexa los tickets que pertenecen a una tarea
+            models.Index(fields=['tarea', '-fecha_ultima_modificacion'], name='ticket_tarea_fum_idx', condition=models.Q(tarea__isnull=False)),
+            # Informes: tickets estancados por fecha
+            models.Index(fields=['fecha_ultima_modificacion'], name='ticket_fum_idx'),
+            # Dashboard en vivo: cambios desde el cursor
+            models.Index(fields=['fecha_actualizacion', 'id'], name='ticket_actualizacion_idx'),
+        ]
 
     def __str__(self):
         return self.titulo
 
-class Comentario(models.Model):
+    def save(self, *args, **kwargs):
+        # La clave del rollup se lee con la fila bloqueada: dos guardados simultáneos no descuentan la misma clave
+        with transaction.atomic():
+            self._clave_resumen = None if self._state.adding else ResumenTicket.clave_guardada(self.pk, bloquear=True)
+            super().save(*args, **kwargs)
+
+    @property
+    def descripcion_renderizada(self):
+        return self.html('descripcion')
+
+class LecturaTicket(models.Model):
+    """
+    Marca de lectura por (usuario, ticket). El ticket tiene comentarios sin leer
+    para el usuario si no hay marca o si `leido_hasta` es anterior a
+    `Ticket.fecha_ultima_modificacion`.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lecturas_tickets')
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='lecturas')
+    leido_hasta = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'ticket'], name='lectura_ticket_unica'),
+        ]
+
+    @classmethod
+    def marcar_leido(cls, usuario_id, ticket_id, leido_hasta):
+        """ Upsert de la marca en una sola sentencia. """
+        cls.marcar_leidos(usuario_id, [ticket_id], leido_hasta)
+
+    @classmethod
+    def marcar_leidos(cls, usuario_id, ticket_ids, leido_hasta):
+        cls.objects.bulk_create(
+            [cls(usuario_id=usuario_id, ticket_id=ticket_id, leido_hasta=leido_hasta) for ticket_id in ticket_ids],
+            update_conflicts=True,
+            unique_fields=['usuario', 'ticket'],
+            update_fields=['leido_hasta'],
+        )
+
+    @classmethod
+    def ids_no_leidos(cls, usuario, tickets):
+        """ Devuelve los ids de `tickets` (ya cargados) con comentarios sin leer para `usuario`. """
+        tickets = list(tickets)
+        marcas = dict(
+            cls.objects.filter(usuario=usuario, ticket_id__in=[t.id for t in tickets])
+            .values_list('ticket_id', 'leido_hasta')
+        )
+        return [
+            t.id for t in tickets
+            if t.id not in marcas or marcas[t.id] < t.fecha_ultima_modificacion
+        ]
+
+class ResumenTicket(models.Model):
+    """
+    Rollup para informes: cantidad de tickets por (estado, área, usuario asignado) y,
+    en las celdas del estado resuelto, la suma de tiempos de resolución
+    (fecha_actualizacion - fecha_creacion). Los tickets abiertos no suman tiempo, así
+    que comentarlos o guardarlos sin cambiar la clave no toca el rollup.
+    Se usa 0 en lugar de NULL para "sin área" / "sin asignar" para que la clave sea única.
+    """
+    estado = models.ForeignKey(EstadoTicket, on_delete=models.CASCADE, related_name='+')
+    area_id_clave = models.BigIntegerField(default=0)
+    usuario_asignado_id_clave = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+    segundos_resolucion = models.FloatField(default=0)
+
+    CAMPOS_CLAVE = ('estado_id', 'area_asignada_id', 'usuario_asignado_id', 'fecha_creacion', 'fecha_actualizacion')
+    ESTADO_RESUELTO = 'Finalizado'
+    CACHE_ESTADO_RESUELTO = 'resumen:estado_resuelto'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['estado', 'area_id_clave', 'usuario_asignado_id_clave'], name='resumen_ticket_clave'),
+        ]
+
+    @classmethod
+    def estado_resuelto_id(cls):
+        """ id del estado cuyas celdas suman tiempos de resolución (0 si no existe). """
+        return cache.get_or_set(
+            cls.CACHE_ESTADO_RESUELTO,
+            lambda: EstadoTicket.objects.filter(nombre_estado=cls.ESTADO_RESUELTO).values_list('id', flat=True).first() or 0,
+            None,
+        )
+
+    @staticmethod
+    def clave_de(ticket, resuelto_id=None):
+        """ (clave, segundos) del ticket, sin disparar consultas por campos diferidos. """
+        valores = ticket.__dict__
+        if any(campo not in valores for campo in ResumenTicket.CAMPOS_CLAVE) or valores['estado_id'] is None:
+            return None
+        if resuelto_id is None:
+            resuelto_id = ResumenTicket.estado_resuelto_id()
+        creado, actualizado = valores['fecha_creacion'], valores['fecha_actualizacion']
+        segundos = 0
+        if valores['estado_id'] == resuelto_id and creado and actualizado:
+            segundos = (actualizado - creado).total_seconds()
+        clave = (valores['estado_id'], valores['area_asignada_id'] or 0, valores['usuario_asignado_id'] or 0)
+        return clave, segundos
+
+    @classmethod
+    def clave_guardada(cls, ticket_id, bloquear=False):
+        """ Clave según la base; con `bloquear` la fila queda tomada hasta el fin de la transacción. """
+        tickets = Ticket.objects.filter(pk=ticket_id)
+        if bloquear:
+            tickets = tickets.select_for_update()
+        guardado = tickets.values(*cls.CAMPOS_CLAVE).first()
+        return cls.clave_de(Ticket(**guardado)) if guardado else None
+
+    @classmethod
+    def aplicar(cls, deltas):
+        """ Suma `deltas` ({clave: (total, segundos)}) en la misma transacción que el cambio del ticket. """
+        for (estado_id, area_id, usuario_id), (total, segundos) in deltas.items():
+            if not total and not segundos:
+                continue
+            celda = cls.objects.filter(estado_id=estado_id, area_id_clave=area_id, usuario_asignado_id_clave=usuario_id)
+            if celda.update(total=F('total') + total, segundos_resolucion=F('segundos_resolucion') + segundos):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        estado_id=estado_id, area_id_clave=area_id, usuario_asignado_id_clave=usuario_id,
+                        total=total, segundos_resolucion=segundos,
+                    )
+            except IntegrityError:
+                # Otro proceso creó la celda entre el UPDATE y el INSERT
+                celda.update(total=F('total') + total, segundos_resolucion=F('segundos_resolucion') + segundos)
+
+    @classmethod
+    def registrar_cambio(cls, anterior, actual):
+        cls.registrar_cambios([(anterior, actual)])
+
+    @classmethod
+    def registrar_cambios(cls, pares):
+        """ Varios (anterior, actual) juntos: una sola pasada de aplicar() para todas las celdas. """
+        deltas = {}
+        for anterior, actual in pares:
+            for clave_segundos, signo in ((anterior, -1), (actual, 1)):
+                if not clave_segundos:
+                    continue
+                clave, segundos = clave_segundos
+                total_previo, segundos_previos = deltas.get(clave, (0, 0))
+                deltas[clave] = (total_previo + signo, segundos_previos + signo * segundos)
+        cls.aplicar(deltas)
+
+    @classmethod
+    def vaciar_clave(cls, campo, valor):
+        """ Pasa a 0 las celdas de un área o usuario borrado (el SET_NULL de las FK no dispara señales de Ticket). """
+        with transaction.atomic():
+            celdas = list(cls.objects.select_for_update().filter(**{campo: valor}))
+            deltas = {}
+            for celda in celdas:
+                setattr(celda, campo, 0)
+                clave = (celda.estado_id, celda.area_id_clave, celda.usuario_asignado_id_clave)
+                total, segundos = deltas.get(clave, (0, 0))
+                deltas[clave] = (total + celda.total, segundos + celda.segundos_resolucion)
+            cls.objects.filter(pk__in=[celda.pk for celda in celdas]).delete()
+            cls.aplicar(deltas)
+
+    @staticmethod
+    def calcular_desde_tickets():
+        """ Agregado en vivo sobre Ticket con la misma forma que el rollup. """
+        duracion = ExpressionWrapper(F('fecha_actualizacion') - F('fecha_creacion'), output_field=DurationField())
+        resueltos = Q(estado_id=ResumenTicket.estado_resuelto_id())
+        filas = Ticket.objects.order_by().values('estado_id', 'area_asignada_id', 'usuario_asignado_id').annotate(
+            cantidad=Count('id'), duracion=Sum(duracion, filter=resueltos),
+        )
+        return {
+            (f['estado_id'], f['area_asignada_id'] or 0, f['usuario_asignado_id'] or 0):
+                (f['cantidad'], f['duracion'].total_seconds() if f['duracion'] else 0)
+            for f in filas
+        }
+
+    @classmethod
+    def reconstruir(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(estado_id=e, area_id_clave=a, usuario_asignado_id_clave=u, total=total, segundos_resolucion=segundos)
+                for (e, a, u), (total, segundos) in cls.calcular_desde_tickets().items()
+            ])
+
+@receiver(pre_delete, sender=Ticket)
+def bloquear_clave_resumen(sender, instance, **kwargs):
+    # El borrado ya corre en una transacción: se descuenta la clave guardada, no la de memoria
+    instance._clave_resumen = ResumenTicket.clave_guardada(instance.pk, bloquear=True)
+
+@receiver(post_save, sender=Ticket)
+def actualizar_resumen(sender, instance, created, update_fields, **kwargs):
+    anterior = None if created else getattr(instance, '_clave_resumen', None)
+    # Con update_fields la instancia puede tener valores que no se escribieron
+    actual = ResumenTicket.clave_de(instance) if update_fields is None else None
+    actual = actual or ResumenTicket.clave_guardada(instance.pk)
+    if anterior != actual:
+        ResumenTicket.registrar_cambio(anterior, actual)
+    instance._clave_resumen = actual
+
+@receiver(post_delete, sender=Ticket)
+def descontar_resumen(sender, instance, **kwargs):
+    ResumenTicket.registrar_cambio(instance._clave_resumen, None)
+
+@receiver(post_save, sender=EstadoTicket)
+@receiver(post_delete, sender=EstadoTicket)
+def olvidar_estado_resuelto(sender, instance, **kwargs):
+    anterior = cache.get(ResumenTicket.CACHE_ESTADO_RESUELTO)
+    cache.delete(ResumenTicket.CACHE_ESTADO_RESUELTO)
+    # Si otro estado pasó a ser el resuelto, los tiempos guardados quedan en celdas equivocadas
+    if anterior is not None and anterior != ResumenTicket.estado_resuelto_id():
+        ResumenTicket.reconstruir()
+
+@receiver(post_delete, sender=Area)
+def vaciar_area_resumen(sender, instance, **kwargs):
+    ResumenTicket.vaciar_clave('area_id_clave', instance.pk)
+
+@receiver(post_delete, sender=User)
+def vaciar_usuario_resumen(sender, instance, **kwargs):
+    ResumenTicket.vaciar_clave('usuario_asignado_id_clave', instance.pk)
+
+class FrecuenciaPalabra(models.Model):
+    """
+    Cantidad de apariciones de cada palabra de los títulos por mes de creación y área
+    (0 = sin área). Se mantiene con cada alta, edición y baja de tickets.
+    """
+    palabra = models.CharField(max_length=150)
+    mes = models.DateField()
+    area_id_clave = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+
+    CAMPOS_CLAVE = ('titulo', 'fecha_creacion', 'area_asignada_id')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'area_id_clave', 'palabra'], name='frecuencia_palabra_clave'),
+        ]
+        indexes = [
+            models.Index(fields=['area_id_clave', 'mes'], name='frecuencia_area_mes_idx'),
+        ]
+
+    @classmethod
+    def clave_de(cls, ticket):
+        valores = ticket.__dict__
+        if any(campo not in valores for campo in cls.CAMPOS_CLAVE) or valores['fecha_creacion'] is None:
+            return None
+        return valores['titulo'], mes_de(valores['fecha_creacion']), valores['area_asignada_id'] or 0
+
+    @classmethod
+    def clave_guardada(cls, ticket_id):
+        guardado = Ticket.objects.filter(pk=ticket_id).values(*cls.CAMPOS_CLAVE).first()
+        return cls.clave_de(Ticket(**guardado)) if guardado else None
+
+    @classmethod
+    def registrar_cambio(cls, anterior, actual):
+        cls.registrar_cambios([(anterior, actual)])
+
+    @classmethod
+    def registrar_cambios(cls, pares):
+        deltas = {}
+        for anterior, actual in pares:
+            for clave, signo in ((anterior, -1), (actual, 1)):
+                if not clave:
+                    continue
+                titulo, mes, area_id = clave
+                for palabra, cantidad in contar_palabras(titulo).items():
+                    deltas[(mes, area_id, palabra)] = deltas.get((mes, area_id, palabra), 0) + signo * cantidad
+        cls.aplicar(deltas)
+
+    @classmethod
+    def aplicar(cls, deltas):
+        """ Suma `deltas` ({(mes, área, palabra): cantidad}) con una lectura y un UPDATE/INSERT por (mes, área). """
+        grupos = {}
+        for (mes, area_id, palabra), cantidad in deltas.items():
+            if cantidad:
+                grupos.setdefault((mes, area_id), {})[palabra] = cantidad
+
+        for (mes, area_id), cantidades in grupos.items():
+            with transaction.atomic():
+                celdas = cls.objects.filter(mes=mes, area_id_clave=area_id, palabra__in=list(cantidades))
+                existentes = {f.palabra: f for f in celdas.select_for_update()}
+                for palabra, fila in existentes.items():
+                    fila.total = F('total') + cantidades[palabra]
+                cls.objects.bulk_update(existentes.values(), ['total'])
+
+                nuevas = [
+                    cls(palabra=palabra, mes=mes, area_id_clave=area_id, total=cantidad)
+                    for palabra, cantidad in cantidades.items() if palabra not in existentes and cantidad > 0
+                ]
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create(nuevas)
+                except IntegrityError:
+                    # Otro proceso insertó alguna de las palabras entre la lectura y el INSERT
+                    for fila in nuevas:
+                        if not celdas.filter(palabra=fila.palabra).update(total=F('total') + fila.total):
+                            fila.save()
+
+                celdas.filter(total__lte=0).delete()
+
+    @classmethod
+    def vaciar_area(cls, area_id):
+        """ Pasa a "sin área" las palabras de un área borrada (el SET_NULL no dispara señales de Ticket). """
+        with transaction.atomic():
+            filas = cls.objects.select_for_update().filter(area_id_clave=area_id)
+            deltas = {}
+            for mes, palabra, total in filas.values_list('mes', 'palabra', 'total'):
+                deltas[(mes, 0, palabra)] = deltas.get((mes, 0, palabra), 0) + total
+            filas.delete()
+            cls.aplicar(deltas)
+
+    @classmethod
+    def mas_frecuentes(cls, limite=10, desde=None, hasta=None, area_id=None):
+        """ [(palabra, total)] como Counter.most_common, opcionalmente entre meses (date) o para un área. """
+        filas = cls.objects.filter(total__gt=0)
+        if desde:
+            filas = filas.filter(mes__gte=desde.replace(day=1))
+        if hasta:
+            filas = filas.filter(mes__lte=hasta)
+        if area_id is not None:
+            filas = filas.filter(area_id_clave=area_id or 0)
+        filas = filas.values('palabra').annotate(cantidad=Sum('total')).order_by('-cantidad', 'palabra')
+        return [(f['palabra'], f['cantidad']) for f in filas[:limite]]
+
+    @staticmethod
+    def calcular_desde_tickets():
+        conteo = Counter()
+        for titulo, fecha, area_id in Ticket.objects.values_list(*FrecuenciaPalabra.CAMPOS_CLAVE).iterator():
+            mes = mes_de(fecha)
+            for palabra, cantidad in contar_palabras(titulo).items():
+                conteo[(mes, area_id or 0, palabra)] += cantidad
+        return conteo
+
+    @classmethod
+    def reconstruir(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                (cls(mes=mes, area_id_clave=area_id, palabra=palabra, total=total)
+                 for (mes, area_id, palabra), total in cls.calcular_desde_tickets().items()),
+                batch_size=1000,
+            )
+
+@receiver(post_init, sender=Ticket)
+def recordar_palabras(sender, instance, **kwargs):
+    instance._clave_palabras = FrecuenciaPalabra.clave_de(instance) if instance.pk else None
+
+@receiver(pre_save, sender=Ticket)
+@receiver(pre_delete, sender=Ticket)
+def completar_palabras(sender, instance, **kwargs):
+    if instance.pk and instance._clave_palabras is None and not instance._state.adding:
+        instance._clave_palabras = FrecuenciaPalabra.clave_guardada(instance.pk)
+
+@receiver(post_save, sender=Ticket)
+def actualizar_palabras(sender, instance, created, **kwargs):
+    anterior = None if created else instance._clave_palabras
+    actual = FrecuenciaPalabra.clave_de(instance) or FrecuenciaPalabra.clave_guardada(instance.pk)
+    if anterior != actual:
+        FrecuenciaPalabra.registrar_cambio(anterior, actual)
+    instance._clave_palabras = actual
+
+@receiver(post_delete, sender=Ticket)
+def descontar_palabras(sender, instance, **kwargs):
+    FrecuenciaPalabra.registrar_cambio(instance._clave_palabras, None)
+
+@receiver(post_delete, sender=Area)
+def vaciar_area_palabras(sender, instance, **kwargs):
+    FrecuenciaPalabra.vaciar_area(instance.pk)
+
+class Comentario(MarcadoPrerenderizado):
+    CAMPOS_MARCADO = {'cuerpo_comentario': 'cuerpo_html'}
+
     cuerpo_comentario = models.TextField()
+    cuerpo_html = models.TextField(blank=True, default='', editable=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='comentarios')
     usuario_autor = models.ForeignKey(User, on_delete=models.RESTRICT)
 
+    @property
+    def cuerpo_renderizado(self):
+        return self.html('cuerpo_comentario')
+
 @receiver(post_save, sender=Comentario)
 def actualizar_y_notificar_comentario(sender, instance, created, **kwargs):
-    if created:
+    # gestion.comentarios ya actualiza el ticket en su transacción; esto cubre los
+    # comentarios creados por otro camino (admin, shell)
+    if created and not getattr(instance, '_ticket_actualizado', False):
         ticket = instance.ticket
         ticket.fecha_ultima_modificacion = timezone.now()
-        ticket.save()
-        
-        ticket.comentarios_leidos_por.clear()
-        ticket.comentarios_leidos_por.add(instance.usuario_autor)
+        ticket.save(update_fields=['fecha_ultima_modificacion', 'fecha_actualizacion'])
+        indexar_ticket(ticket)
+
+        # El resto de usuarios queda con la marca vieja, por lo que ven el ticket como no leído
+        LecturaTicket.marcar_leido(instance.usuario_autor_id, ticket.id, ticket.fecha_ultima_modificacion)
+
+@receiver(post_save, sender=Ticket)
+def indexar_ticket_guardado(sender, instance, created, update_fields=None, **kwargs):
+    # Solo título y descripción forman parte del índice de texto
+    if created or update_fields is None or {'titulo', 'descripcion'} & set(update_fields):
+        indexar_ticket(instance)
+
+@receiver(post_delete, sender=Ticket)
+def desindexar_ticket_eliminado(sender, instance, **kwargs):
+    desindexar_ticket(instance.id)
+
+@receiver(post_delete, sender=Comentario)
+def reindexar_comentario_eliminado(sender, instance, **kwargs):
+    ticket = Ticket.objects.filter(id=instance.ticket_id).first()
+    if ticket:
+        indexar_ticket(ticket)
 
 class Aviso(models.Model):
     titulo = models.CharField(max_length=200)
     cuerpo = models.TextField()
     autor = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'is_staff': True})
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    leido_por = models.ManyToManyField(User, related_name='avisos_leidos', blank=True)
     class Meta:
         ordering = ['-fecha_creacion']
 
+class LecturaAvisos(models.Model):
+    """
+    Marca de agua de avisos leídos por usuario: están leídos todos los avisos con
+    id <= `ultimo_leido_id`, salvo los que el usuario volvió a marcar como no leídos
+    (AvisoNoLeido). Sin fila, todos los avisos están sin leer.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='lectura_avisos')
+    ultimo_leido_id = models.BigIntegerField(default=0)
+
+    @classmethod
+    def no_leidos(cls, usuario):
+        """ Queryset de los avisos sin leer para `usuario`, resuelto en una sola consulta. """
+        marca = cls.objects.filter(usuario=usuario).values('ultimo_leido_id')[:1]
+        excepciones = AvisoNoLeido.objects.filter(usuario=usuario).values('aviso_id')
+        return Aviso.objects.filter(models.Q(id__gt=Coalesce(models.Subquery(marca), 0)) | models.Q(id__in=excepciones))
+
+    @classmethod
+    def avanzar(cls, usuario_id, hasta_id):
+        """ Un UPDATE condicional (la marca nunca retrocede); la fila se crea la primera vez. """
+        if not cls.objects.filter(usuario_id=usuario_id, ultimo_leido_id__lt=hasta_id).update(ultimo_leido_id=hasta_id):
+            cls.objects.bulk_create([cls(usuario_id=usuario_id, ultimo_leido_id=hasta_id)], ignore_conflicts=True)
+
+    @classmethod
+    def marcar_todos_leidos(cls, usuario_id, hasta_id):
+        with transaction.atomic():
+            cls.avanzar(usuario_id, hasta_id)
+            AvisoNoLeido.objects.filter(usuario_id=usuario_id, aviso_id__lte=hasta_id).delete()
+
+    @classmethod
+    def marcar(cls, usuario_id, aviso_id, leido):
+        """ Marca un aviso suelto; los anteriores a la marca de agua se guardan como excepción. """
+        if leido:
+            AvisoNoLeido.objects.filter(usuario_id=usuario_id, aviso_id=aviso_id).delete()
+        elif aviso_id <= (cls.objects.filter(usuario_id=usuario_id).values_list('ultimo_leido_id', flat=True).first() or 0):
+            AvisoNoLeido.objects.bulk_create([AvisoNoLeido(usuario_id=usuario_id, aviso_id=aviso_id)], ignore_conflicts=True)
+
+class AvisoNoLeido(models.Model):
+    """ Aviso anterior a la marca de agua que el usuario dejó marcado como no leído. """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    aviso = models.ForeignKey(Aviso, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'aviso'], name='aviso_no_leido_unico'),
+        ]
+
+class ContenidoAdjunto(models.Model):
+    """
+    Archivo guardado una sola vez por su SHA-256 (gestion.adjuntos), compartido por
+    todos los ArchivoAdjunto con el mismo contenido. `referencias` cuenta esos adjuntos;
+    al llegar a 0 un trabajo en segundo plano borra la fila y el archivo.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    tamano = models.BigIntegerField()
+    tipo_mime = models.CharField(max_length=100)
+    ruta = models.CharField(max_length=200)
+    miniatura = models.CharField(max_length=200, blank=True, default='')
+    referencias = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
 class ArchivoAdjunto(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='adjuntos')
     comentario = models.ForeignKey(Comentario, on_delete=models.CASCADE, related_name='adjuntos', null=True, blank=True)
-    archivo = models.FileField(upload_to='adjuntos_tickets/')
+    # Los adjuntos anteriores al almacenamiento por contenido siguen usando `archivo`
+    archivo = models.FileField(upload_to='adjuntos_tickets/', blank=True)
+    contenido = models.ForeignKey(ContenidoAdjunto, on_delete=models.PROTECT, related_name='adjuntos', null=True, blank=True)
+    nombre = models.CharField(max_length=255, blank=True, default='')
     fecha_subida = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return os.path.basename(self.archivo.name)
\ No newline at end of file
+        return self.nombre or os.path.basename(self.archivo.name)
+
+@receiver(post_delete, sender=ArchivoAdjunto)
+def liberar_contenido_adjunto(sender, instance, **kwargs):
+    if instance.contenido_id is None:
+        return
+    ContenidoAdjunto.objects.filter(pk=instance.contenido_id).update(referencias=F('referencias') - 1)
+    if ContenidoAdjunto.objects.filter(pk=instance.contenido_id, referencias__lte=0).exists():
+        from .trabajos import encolar
+        encolar('liberar_contenido_adjunto', {'contenido_id': instance.contenido_id})
+
+class EventoAuditoria(models.Model):
+    """
+    Copia consultable del log de auditoría, escrita en lotes por gestion.auditoria.
+    Las referencias no tienen FK real: el evento sobrevive al ticket o usuario borrado.
+    """
+    fecha = models.DateTimeField()
+    nivel = models.CharField(max_length=10)
+    tipo = models.CharField(max_length=40)
+    actor = models.ForeignKey(User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    actor_nombre = models.CharField(max_length=150, blank=True)
+    ticket = models.ForeignKey(Ticket, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='eventos_auditoria')
+    usuario_afectado = models.ForeignKey(User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    valor_anterior = models.CharField(max_length=255, blank=True)
+    valor_nuevo = models.CharField(max_length=255, blank=True)
+    mensaje = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-fecha'], name='auditoria_fecha_idx'),
+            models.Index(fields=['tipo', '-fecha'], name='auditoria_tipo_fecha_idx'),
+            models.Index(fields=['actor_nombre', '-fecha'], name='auditoria_actor_fecha_idx'),
+            models.Index(fields=['ticket', '-fecha'], name='auditoria_ticket_fecha_idx', condition=models.Q(ticket__isnull=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}: {self.mensaje}"
+
+class Trabajo(models.Model):
+    """ Cola de trabajos en segundo plano (ver gestion/trabajos.py y `manage.py procesar_trabajos`). """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    HECHO = 'hecho'
+    FALLIDO = 'fallido'
+    ESTADOS = [(PENDIENTE, 'Pendiente'), (EN_CURSO, 'En curso'), (HECHO, 'Hecho'), (FALLIDO, 'Fallido')]
+
+    tipo = models.CharField(max_length=50)
+    datos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    reservado_por = models.CharField(max_length=64, blank=True)
+    reservado_hasta = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Solo se indexa lo que el worker consulta: pendientes por fecha y reservas vencidas o propias
+            models.Index(fields=['disponible_desde'], name='trabajo_pendiente_idx', condition=models.Q(estado='pendiente')),
+            models.Index(fields=['reservado_hasta'], name='trabajo_en_curso_idx', condition=models.Q(estado='en_curso')),
+            models.Index(fields=['reservado_por'], name='trabajo_reservado_idx', condition=models.Q(estado='en_curso')),
+            models.Index(fields=['terminado'], name='trabajo_hecho_idx', condition=models.Q(estado='hecho')),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.estado})"
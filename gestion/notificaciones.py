@@ -0,0 +1,118 @@
+# /var/www/tickets/gestion/notificaciones.py
+"""
+Notificaciones push de eventos de tickets, enviadas por la cola de trabajos.
+
+El request solo encola 'notificar_ticket'. El worker calcula los destinatarios y
+reparte sus suscripciones en trabajos 'enviar_push' de hasta PUSH_LOTE
+suscripciones cada uno. Las suscripciones que el servicio de push da por
+inexistentes (404/410) se borran. Las que fallan por otro motivo se reintentan
+solas, sin repetir el envío a las que ya lo recibieron.
+"""
+
+import json
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from pywebpush import WebPushException
+from webpush.models import PushInformation, SubscriptionInfo
+from webpush.utils import send_to_subscription
+
+from . import trabajos
+from .models import Perfil, Ticket
+
+COMENTARIO = 'comentario'
+CAMBIO_ESTADO = 'cambio_estado'
+ASIGNACION = 'asignacion'
+CAMBIO_AREA = 'cambio_area'
+
+
+def encolar_evento_ticket(ticket, evento, actor, detalle=''):
+    """ Llamar dentro de la transacción del cambio. """
+    trabajos.encolar('notificar_ticket', {
+        'ticket_id': ticket.pk, 'evento': evento, 'actor_id': actor.pk, 'detalle': detalle,
+    })
+
+
+def encolar_eventos_ticket(ticket, eventos, actor):
+    """ Varios eventos del mismo cambio, como pares (evento, detalle), en un solo INSERT. """
+    trabajos.encolar_varios('notificar_ticket', [
+        {'ticket_id': ticket.pk, 'evento': evento, 'actor_id': actor.pk, 'detalle': detalle}
+        for evento, detalle in eventos
+    ])
+
+
+def encolar_eventos_tickets(eventos, actor):
+    """ Un evento por ticket, como triples (ticket_id, evento, detalle), en un solo INSERT. """
+    trabajos.encolar_varios('notificar_ticket', [
+        {'ticket_id': ticket_id, 'evento': evento, 'actor_id': actor.pk, 'detalle': detalle}
+        for ticket_id, evento, detalle in eventos
+    ])
+
+
+def destinatarios(ticket, evento, actor_id):
+    """ Creador, asignado y, salvo en la auto-asignación, los usuarios del área del ticket; nunca el autor del evento. """
+    ids = {ticket.usuario_creador_id, ticket.usuario_asignado_id}
+    if evento != ASIGNACION and ticket.area_asignada_id:
+        ids.update(Perfil.objects.filter(area_id=ticket.area_asignada_id, user__is_active=True).values_list('user_id', flat=True))
+    ids.discard(None)
+    ids.discard(actor_id)
+    return ids
+
+
+def _contenido(ticket, evento, detalle):
+    if evento == COMENTARIO:
+        cuerpo = f"Nuevo comentario en #{ticket.pk} {ticket.titulo}"
+    elif evento == CAMBIO_ESTADO:
+        cuerpo = f"#{ticket.pk} {ticket.titulo} pasó a {detalle}"
+    elif evento == CAMBIO_AREA:
+        cuerpo = f"#{ticket.pk} {ticket.titulo} pasó al área {detalle}"
+    else:
+        cuerpo = f"#{ticket.pk} {ticket.titulo} fue asignado a {detalle}"
+    return {'head': 'Sistema de Tickets', 'body': cuerpo, 'url': f'/tickets/{ticket.pk}/'}
+
+
+@trabajos.tipo('notificar_ticket')
+def notificar_ticket(ticket_id, evento, actor_id=None, detalle=''):
+    ticket = Ticket.objects.filter(pk=ticket_id).only(
+        'id', 'titulo', 'usuario_creador_id', 'usuario_asignado_id', 'area_asignada_id'
+    ).first()
+    if ticket is None:
+        return
+    suscripciones = sorted(set(
+        PushInformation.objects.filter(user_id__in=destinatarios(ticket, evento, actor_id))
+        .values_list('subscription_id', flat=True)
+    ))
+    contenido = _contenido(ticket, evento, detalle)
+    lote = getattr(settings, 'PUSH_LOTE', 100)
+    with transaction.atomic():
+        trabajos.encolar_varios('enviar_push', [
+            {'suscripciones': suscripciones[i:i + lote], 'contenido': contenido}
+            for i in range(0, len(suscripciones), lote)
+        ])
+
+
+@trabajos.tipo('enviar_push')
+def enviar_push(suscripciones, contenido):
+    payload = json.dumps(contenido)
+    ttl = getattr(settings, 'PUSH_TTL', 3600)
+    muertas, fallidas = [], []
+    for suscripcion in SubscriptionInfo.objects.filter(id__in=suscripciones):
+        try:
+            # webpush ya borra por su cuenta las que responden 410
+            send_to_subscription(suscripcion, payload, ttl)
+        except WebPushException as error:
+            if getattr(error.response, 'status_code', None) in (404, 410):
+                muertas.append(suscripcion.id)
+            else:
+                fallidas.append(suscripcion.id)
+        except requests.RequestException:
+            fallidas.append(suscripcion.id)
+
+    if muertas:
+        SubscriptionInfo.objects.filter(id__in=muertas).delete()
+    if fallidas:
+        raise trabajos.Reintentar(
+            f"{len(fallidas)} de {len(suscripciones)} envíos fallaron",
+            {'suscripciones': fallidas, 'contenido': contenido},
+        )
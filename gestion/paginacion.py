@@ -0,0 +1,96 @@
+# /var/www/tickets/gestion/paginacion.py
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.http import urlencode
+
+
+def codificar_cursor(fecha: datetime, pk: int) -> str:
+    """ Codifica la posición (fecha, id) de una fila como un token apto para URLs. """
+    crudo = f"{fecha.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(token: str):
+    """ Devuelve (fecha, id) o None si el token no es válido. """
+    if not token:
+        return None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        crudo = base64.urlsafe_b64decode(token + relleno).decode()
+        fecha_txt, pk_txt = crudo.rsplit('|', 1)
+        return datetime.fromisoformat(fecha_txt), int(pk_txt)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class PaginaKeyset:
+    """
+    Página obtenida por cursor sobre el orden (-campo_fecha, -id).
+    Iterable desde la plantilla igual que un queryset.
+    """
+
+    def __init__(self, objetos, cursor_siguiente, cursor_anterior):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.url_siguiente = ''
+        self.url_anterior = ''
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def ids(self):
+        return [obj.pk for obj in self.objetos]
+
+    def construir_urls(self, params, base_url: str = ''):
+        """ Genera los enlaces conservando los filtros recibidos en `params`. """
+        conservados = {k: v for k, v in params.items() if v and k not in ('despues', 'antes')}
+        if self.cursor_siguiente:
+            self.url_siguiente = f"{base_url}?{urlencode({**conservados, 'despues': self.cursor_siguiente})}"
+        if self.cursor_anterior:
+            self.url_anterior = f"{base_url}?{urlencode({**conservados, 'antes': self.cursor_anterior})}"
+        return self
+
+
+def paginar_por_cursor(queryset, campo_fecha: str, tamano: int, despues: str = '', antes: str = '') -> PaginaKeyset:
+    """
+    Pagina `queryset` por (campo_fecha, id) descendente sin usar OFFSET.
+    `despues` avanza hacia registros más antiguos y `antes` retrocede hacia los más recientes.
+    """
+    posicion_despues = decodificar_cursor(despues)
+    posicion_antes = None if posicion_despues else decodificar_cursor(antes)
+
+    if posicion_antes:
+        fecha, pk = posicion_antes
+        filas = list(
+            queryset.filter(Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'pk__gt': pk}))
+            .order_by(campo_fecha, 'pk')[:tamano + 1]
+        )
+        hay_mas_recientes = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        hay_mas_antiguos = True
+    else:
+        qs = queryset
+        if posicion_despues:
+            fecha, pk = posicion_despues
+            qs = qs.filter(Q(**{f'{campo_fecha}__lt': fecha}) | Q(**{campo_fecha: fecha, 'pk__lt': pk}))
+        filas = list(qs.order_by(f'-{campo_fecha}', '-pk')[:tamano + 1])
+        hay_mas_antiguos = len(filas) > tamano
+        filas = filas[:tamano]
+        hay_mas_recientes = posicion_despues is not None
+
+    cursor_siguiente = cursor_anterior = None
+    if filas:
+        if hay_mas_antiguos:
+            cursor_siguiente = codificar_cursor(getattr(filas[-1], campo_fecha), filas[-1].pk)
+        if hay_mas_recientes:
+            cursor_anterior = codificar_cursor(getattr(filas[0], campo_fecha), filas[0].pk)
+    return PaginaKeyset(filas, cursor_siguiente, cursor_anterior)
@@ -0,0 +1,33 @@
+# /var/www/tickets/gestion/palabras.py
+"""
+Tokenización de títulos para el informe de "palabras más frecuentes".
+
+Mismas reglas que el conteo original sobre todos los títulos: minúsculas,
+`\\b\\w+\\b`, solo letras, más de dos caracteres y sin stopwords.
+"""
+
+import re
+from collections import Counter
+
+from django.utils import timezone
+
+STOPWORDS = frozenset([
+    'de', 'la', 'el', 'en', 'y', 'a', 'los', 'del', 'con', 'por', 'para',
+    'un', 'una', 'se', 'no', 'que', 'es', 'este', 'esta',
+])
+
+_RE_PALABRA = re.compile(r'\b\w+\b')
+
+
+def contar_palabras(titulo: str) -> Counter:
+    palabras = _RE_PALABRA.findall((titulo or '').lower())
+    return Counter(p for p in palabras if p.isalpha() and p not in STOPWORDS and len(p) > 2)
+
+
+def mes_de(fecha):
+    """ Primer día del mes (hora local) en que se creó el ticket. """
+    if fecha is None:
+        return None
+    if timezone.is_aware(fecha):
+        fecha = timezone.localtime(fecha)
+    return fecha.date().replace(day=1)
@@ -0,0 +1,208 @@
+# /var/www/tickets/gestion/perfilador.py
+"""
+Perfilado con cProfile de requests puntuales.
+
+`PerfiladorMiddleware` (en MIDDLEWARE después de AuthenticationMiddleware)
+perfila desde que se resuelve la vista hasta que sale la respuesta, junto con
+cada consulta SQL y su tiempo, en estos casos:
+
+- Un usuario staff agrega `?__profile=1` a una URL de gestion: la respuesta se
+  reemplaza por el informe (tabla de funciones ordenable y lista de SQL).
+  Con `?__profile=prof` se descarga el .prof para abrirlo con pstats o snakeviz.
+  El informe también queda en el buffer.
+- Un usuario staff tiene la cookie `__profile=1`: las páginas se ven normales y
+  cada request se guarda en el buffer; la cabecera X-Perfil trae la URL del informe.
+- Uno de cada PERFILADOR_MUESTREO_CADA requests por nombre de URL (contado por
+  proceso; 0 lo desactiva) se perfila y se guarda en el buffer, para ver después
+  los caminos calientes reales de producción.
+
+El buffer es circular y vive en el cache (compartido entre workers): guarda las
+últimas PERFILADOR_MUESTRAS muestras durante PERFILADOR_TTL segundos. De cada
+consulta se guarda el SQL con sus marcadores, nunca los parámetros (hashes de
+contraseñas, claves de sesión), y las vistas de SENSIBLES no se perfilan nunca.
+"""
+
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import time
+import uuid
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+PARAMETRO = '__profile'
+_CLAVE_INDICE = 'perfilador:indice'
+# Reciben contraseñas o credenciales de CP: no se perfilan de ninguna forma
+SENSIBLES = {
+    'index', 'show_login', 'process_login', 'logout', 'cambiar_contrasena',
+    'verificar_acceso_cp_api', 'verificar_acceso_cp_lote',
+}
+# Las páginas del propio perfilador y las métricas no se muestrean ni se perfilan con la cookie
+NO_MUESTREAR = {'perfilador', 'perfil_muestra', 'metricas'} | SENSIBLES
+_contadores = {}
+_PREFIJOS = sorted({os.path.dirname(os.path.dirname(__file__)) + os.sep} | {p + os.sep for p in sys.path if p}, key=len, reverse=True)
+
+
+class _SQL:
+    """ execute_wrapper que guarda cada consulta (sin sus parámetros) con su duración. """
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.consultas = []
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total += 1
+            if len(self.consultas) < self.maximo:
+                self.consultas.append({'sql': sql, 'ms': (time.perf_counter() - inicio) * 1000})
+
+
+def _nombre_archivo(ruta):
+    for prefijo in _PREFIJOS:
+        if ruta.startswith(prefijo):
+            return ruta[len(prefijo):]
+    return ruta
+
+
+def filas(stats, limite):
+    """ Las `limite` funciones con más tiempo acumulado, como dicts para la plantilla. """
+    resultado = []
+    for (archivo, linea, funcion), (primitivas, llamadas, propio, acumulado, _) in stats.stats.items():
+        resultado.append({
+            'funcion': f'{_nombre_archivo(archivo)}:{linea}({funcion})' if linea else funcion,
+            'llamadas': llamadas if llamadas == primitivas else f'{llamadas}/{primitivas}',
+            'llamadas_orden': llamadas,
+            'propio_ms': propio * 1000,
+            'acumulado_ms': acumulado * 1000,
+            'por_llamada_ms': acumulado * 1000 / llamadas if llamadas else 0,
+        })
+    resultado.sort(key=lambda fila: fila['acumulado_ms'], reverse=True)
+    return resultado[:limite]
+
+
+def guardar_muestra(muestra):
+    ttl = getattr(settings, 'PERFILADOR_TTL', 86400)
+    cache.set(f"perfilador:muestra:{muestra['id']}", muestra, ttl)
+    # Si dos workers se pisan el índice se pierde una entrada del listado, no la muestra
+    indice = [i for i in (cache.get(_CLAVE_INDICE) or []) if i != muestra['id']]
+    indice.insert(0, muestra['id'])
+    cache.set(_CLAVE_INDICE, indice[:getattr(settings, 'PERFILADOR_MUESTRAS', 50)], ttl)
+
+
+def muestras():
+    indice = cache.get(_CLAVE_INDICE) or []
+    encontradas = cache.get_many([f'perfilador:muestra:{i}' for i in indice])
+    return [encontradas[f'perfilador:muestra:{i}'] for i in indice if f'perfilador:muestra:{i}' in encontradas]
+
+
+def muestra(muestra_id):
+    return cache.get(f'perfilador:muestra:{muestra_id}')
+
+
+def respuesta_prof(datos_prof, nombre):
+    """ Descarga del .prof (el formato de pstats.Stats.dump_stats). """
+    respuesta = HttpResponse(zlib.decompress(datos_prof), content_type='application/octet-stream')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.prof"'
+    return respuesta
+
+
+class PerfiladorMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._perfil = None
+        try:
+            response = self.get_response(request)
+        finally:
+            perfil = request._perfil
+            if perfil is not None:
+                perfil['perfilador'].disable()
+                connections['default'].execute_wrappers.remove(perfil['sql'])
+        if perfil is None:
+            return response
+        return self._terminar(request, response, perfil)
+
+    def _modo(self, request, nombre_url):
+        if nombre_url in SENSIBLES:
+            return None
+        if request.GET.get(PARAMETRO) and request.user.is_staff:
+            return 'prof' if request.GET[PARAMETRO] == 'prof' else 'informe'
+        if nombre_url in NO_MUESTREAR:
+            return None
+        if request.COOKIES.get(PARAMETRO) and request.user.is_staff:
+            return 'cookie'
+        cada = getattr(settings, 'PERFILADOR_MUESTREO_CADA', 1000)
+        if cada:
+            _contadores[nombre_url] = _contadores.get(nombre_url, 0) + 1
+            if _contadores[nombre_url] % cada == 0:
+                return 'muestreo'
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(view_func, '__module__', '').startswith('gestion.'):
+            return None
+        nombre_url = request.resolver_match.url_name or request.resolver_match.view_name
+        modo = self._modo(request, nombre_url)
+        if modo is None:
+            return None
+        perfilador = cProfile.Profile()
+        try:
+            perfilador.enable()
+        except ValueError:
+            # Desde Python 3.12 hay un solo perfilador por proceso: si otro thread ya perfila, este request no
+            return None
+        sql = _SQL(getattr(settings, 'PERFILADOR_MAX_CONSULTAS', 1000))
+        connections['default'].execute_wrappers.append(sql)
+        request._perfil = {
+            'modo': modo, 'nombre_url': nombre_url, 'sql': sql, 'perfilador': perfilador, 'inicio': time.perf_counter(),
+        }
+        return None
+
+    def _terminar(self, request, response, perfil):
+        duracion_ms = (time.perf_counter() - perfil['inicio']) * 1000
+        perfil['perfilador'].create_stats()
+        prof = zlib.compress(marshal.dumps(perfil['perfilador'].stats))
+        nombre = f"perfil-{perfil['nombre_url']}-{timezone.now():%Y%m%d-%H%M%S}"
+        if perfil['modo'] == 'prof':
+            return respuesta_prof(prof, nombre)
+
+        stats = pstats.Stats(perfil['perfilador'])
+        sql = perfil['sql']
+        datos = {
+            'id': uuid.uuid4().hex[:12],
+            'fecha': timezone.now(),
+            'url': perfil['nombre_url'],
+            'ruta': request.get_full_path()[:500],
+            'usuario': request.user.get_username() if request.user.is_authenticated else '',
+            'motivo': perfil['modo'],
+            'status': response.status_code,
+            'duracion_ms': duracion_ms,
+            'sql_total': sql.total,
+            'sql_ms': sum(c['ms'] for c in sql.consultas),
+            'sql': sql.consultas,
+            'filas': filas(stats, getattr(settings, 'PERFILADOR_FILAS', 300)),
+            'nombre_archivo': nombre,
+            'prof': prof if len(prof) <= getattr(settings, 'PERFILADOR_MAX_BYTES', 2 * 1024 * 1024) else None,
+        }
+        # También se guarda el informe pedido, para poder volver a verlo o descargar su .prof
+        guardar_muestra(datos)
+        if perfil['modo'] == 'informe':
+            return HttpResponse(render_to_string('gestion/perfil_request.html', {'muestra': datos}, request))
+        if perfil['modo'] == 'cookie':
+            response['X-Perfil'] = reverse('perfil_muestra', args=[datos['id']])
+        return response
@@ -0,0 +1,267 @@
+# /var/www/tickets/gestion/rendimiento.py
+"""
+Medición de cada request: SQL, plantillas y vista.
+
+`MedicionRendimientoMiddleware` (agregar a MIDDLEWARE después de
+AuthenticationMiddleware) cuenta las consultas y su tiempo con un
+`execute_wrapper` de la conexión, mide el render de plantillas y el tiempo de la
+vista, y lo devuelve en la cabecera Server-Timing, que los navegadores muestran
+en la pestaña de red. Por defecto la cabecera solo va a usuarios staff
+(RENDIMIENTO_SERVER_TIMING_PUBLICO la habilita para todos).
+
+Una consulta es "duplicada" si se repite con los mismos parámetros en el mismo
+request, y su huella (el SQL sin parámetros, con las listas de IN colapsadas) es
+"repetida" si aparece RENDIMIENTO_REPETICION_MINIMA veces o más: el patrón de N+1.
+
+Cada proceso acumula por minuto, en memoria, los tiempos por nombre de URL y las
+huellas repetidas, y cada RENDIMIENTO_INTERVALO_GUARDADO segundos copia su minuto
+al cache bajo una clave propia. `resumen()` junta las claves de todos los procesos
+de los últimos RENDIMIENTO_VENTANA_MINUTOS. Las mismas mediciones alimentan los
+histogramas de gestion.metricas. Lo que cuesta por request es un par
+de perf_counter por consulta y un dict con el SQL de cada una.
+"""
+
+import bisect
+import hashlib
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template.backends.django import Template as PlantillaDjango
+
+from . import metricas
+from .trabajos import identificador_worker
+
+# Límites superiores (ms) de los tramos del histograma de duración por URL
+TRAMOS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+MAX_HUELLAS_POR_MINUTO = 500
+_RE_LISTA_IN = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+
+_medicion_actual = ContextVar('medicion_rendimiento', default=None)
+_candado = threading.Lock()
+_minuto_local = None
+_datos_local = None
+_ultimo_guardado = 0.0
+
+
+def huella(sql: str) -> str:
+    return _RE_LISTA_IN.sub('(%s, …)', sql)
+
+
+class Medicion:
+    """ Lo que se mide de un request; vive en un ContextVar mientras dura. """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.inicio_vista = None
+        self.fin_vista = None
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.segundos_plantillas = 0.0
+        self.profundidad_plantilla = 0
+        self.por_sql = {}
+        self.duplicadas = 0
+        self._vistas = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """ execute_wrapper de django.db. """
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos_sql += time.perf_counter() - inicio
+            self.consultas += 1
+            self.por_sql[sql] = self.por_sql.get(sql, 0) + 1
+            if not many:
+                try:
+                    clave = (sql, tuple(params or ()))
+                    if clave in self._vistas:
+                        self.duplicadas += 1
+                    else:
+                        self._vistas.add(clave)
+                except TypeError:
+                    pass
+
+    def repetidas(self):
+        """ {huella: ejecuciones} de las huellas que llegan a RENDIMIENTO_REPETICION_MINIMA. """
+        minimo = getattr(settings, 'RENDIMIENTO_REPETICION_MINIMA', 3)
+        conteo = {}
+        for sql, cantidad in self.por_sql.items():
+            clave = huella(sql)
+            conteo[clave] = conteo.get(clave, 0) + cantidad
+        return {clave: cantidad for clave, cantidad in conteo.items() if cantidad >= minimo}
+
+
+def _render_medido(render):
+    def envoltura(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return render(self, context, request)
+        # Un render_to_string dentro de otra plantilla no se cuenta dos veces
+        medicion.profundidad_plantilla += 1
+        inicio = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            medicion.profundidad_plantilla -= 1
+            if not medicion.profundidad_plantilla:
+                medicion.segundos_plantillas += time.perf_counter() - inicio
+    envoltura.medido = True
+    return envoltura
+
+
+def instalar_medicion_plantillas():
+    if not getattr(PlantillaDjango.render, 'medido', False):
+        PlantillaDjango.render = _render_medido(PlantillaDjango.render)
+
+
+def _clave_cache(minuto, worker):
+    return f'rendimiento:{minuto}:{worker}'
+
+
+def _acumular(nombre_url, milisegundos, medicion):
+    global _minuto_local, _datos_local, _ultimo_guardado
+    minuto = int(time.time() // 60)
+    with _candado:
+        if minuto != _minuto_local:
+            if _datos_local is not None:
+                _guardar(_minuto_local, _datos_local)
+            _minuto_local, _datos_local = minuto, {'vistas': {}, 'huellas': {}}
+        # [cantidad, ms totales, ms máximo, consultas totales, duplicadas totales, *tramos]
+        vista = _datos_local['vistas'].setdefault(nombre_url, [0, 0.0, 0.0, 0, 0] + [0] * len(TRAMOS_MS))
+        vista[0] += 1
+        vista[1] += milisegundos
+        vista[2] = max(vista[2], milisegundos)
+        vista[3] += medicion.consultas
+        vista[4] += medicion.duplicadas
+        vista[5 + bisect.bisect_left(TRAMOS_MS, milisegundos)] += 1
+
+        huellas = _datos_local['huellas']
+        for texto, cantidad in medicion.repetidas().items():
+            clave = hashlib.sha1(texto.encode()).hexdigest()[:16]
+            if clave not in huellas:
+                if len(huellas) >= MAX_HUELLAS_POR_MINUTO:
+                    continue
+                # [texto, requests con la repetición, ejecuciones, ejemplo de URL]
+                huellas[clave] = [texto[:2000], 0, 0, nombre_url]
+            huellas[clave][1] += 1
+            huellas[clave][2] += cantidad
+
+        ahora = time.monotonic()
+        if ahora - _ultimo_guardado >= getattr(settings, 'RENDIMIENTO_INTERVALO_GUARDADO', 10):
+            _ultimo_guardado = ahora
+            _guardar(_minuto_local, _datos_local)
+
+
+def _guardar(minuto, datos):
+    ventana = getattr(settings, 'RENDIMIENTO_VENTANA_MINUTOS', 15)
+    worker = identificador_worker()
+    cache.set(_clave_cache(minuto, worker), datos, (ventana + 1) * 60)
+    # Índice de procesos: si dos se pisan, el que se perdió se vuelve a anotar en el próximo guardado
+    procesos = cache.get('rendimiento:procesos') or {}
+    if procesos.get(worker) != minuto:
+        procesos = {w: m for w, m in procesos.items() if m > minuto - ventana}
+        procesos[worker] = minuto
+        cache.set('rendimiento:procesos', procesos, None)
+
+
+def resumen():
+    """ (vistas, huellas) de la ventana, juntando todos los procesos; ya ordenadas para mostrar. """
+    ventana = getattr(settings, 'RENDIMIENTO_VENTANA_MINUTOS', 15)
+    actual = int(time.time() // 60)
+    with _candado:
+        if _datos_local is not None:
+            _guardar(_minuto_local, _datos_local)
+    procesos = cache.get('rendimiento:procesos') or {}
+    claves = [_clave_cache(minuto, worker) for worker in procesos for minuto in range(actual - ventana + 1, actual + 1)]
+
+    vistas, huellas = {}, {}
+    for datos in cache.get_many(claves).values():
+        for nombre, valores in datos['vistas'].items():
+            acumulado = vistas.setdefault(nombre, [0, 0.0, 0.0, 0, 0] + [0] * len(TRAMOS_MS))
+            for i, valor in enumerate(valores):
+                acumulado[i] = max(acumulado[i], valor) if i == 2 else acumulado[i] + valor
+        for clave, (texto, requests, ejecuciones, url) in datos['huellas'].items():
+            acumulado = huellas.setdefault(clave, [texto, 0, 0, url])
+            acumulado[1] += requests
+            acumulado[2] += ejecuciones
+
+    filas_vistas = [
+        {
+            'nombre': nombre, 'cantidad': v[0], 'promedio_ms': v[1] / v[0], 'maximo_ms': v[2],
+            'p95_ms': _percentil_tramos(v[5:], 0.95), 'consultas': v[3] / v[0], 'duplicadas': v[4] / v[0],
+        }
+        for nombre, v in vistas.items() if v[0]
+    ]
+    filas_vistas.sort(key=lambda fila: fila['p95_ms'], reverse=True)
+    filas_huellas = [
+        {'sql': texto, 'requests': requests, 'ejecuciones': ejecuciones, 'por_request': ejecuciones / requests, 'url': url}
+        for texto, requests, ejecuciones, url in huellas.values()
+    ]
+    filas_huellas.sort(key=lambda fila: fila['ejecuciones'], reverse=True)
+    return filas_vistas, filas_huellas
+
+
+def _percentil_tramos(tramos, fraccion):
+    """ Límite superior del tramo donde cae el percentil (el último tramo se informa con su límite inferior). """
+    objetivo = sum(tramos) * fraccion
+    acumulado = 0
+    for i, cantidad in enumerate(tramos):
+        acumulado += cantidad
+        if acumulado >= objetivo:
+            return TRAMOS_MS[i] if TRAMOS_MS[i] != float('inf') else TRAMOS_MS[i - 1]
+    return 0
+
+
+def _cabecera(medicion, milisegundos):
+    vista_ms = (medicion.fin_vista - medicion.inicio_vista) * 1000 if medicion.inicio_vista else 0
+    partes = [
+        f'sql;dur={medicion.segundos_sql * 1000:.1f};desc="{medicion.consultas} consultas"',
+        f'plantillas;dur={medicion.segundos_plantillas * 1000:.1f}',
+        f'vista;dur={vista_ms:.1f}',
+        f'total;dur={milisegundos:.1f}',
+    ]
+    if medicion.duplicadas:
+        partes.append(f'sql-duplicadas;desc="{medicion.duplicadas} duplicadas"')
+    repetidas = medicion.repetidas()
+    if repetidas:
+        partes.append(f'sql-repetidas;desc="{len(repetidas)} huellas, máx. {max(repetidas.values())} veces"')
+    return ', '.join(partes)
+
+
+class MedicionRendimientoMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instalar_medicion_plantillas()
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        try:
+            with connections['default'].execute_wrapper(medicion):
+                response = self.get_response(request)
+            medicion.fin_vista = time.perf_counter()
+        finally:
+            _medicion_actual.reset(token)
+        milisegundos = (time.perf_counter() - medicion.inicio) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        nombre_url = (match.url_name or match.view_name) if match else '<sin ruta>'
+        _acumular(nombre_url, milisegundos, medicion)
+        metricas.registrar_request(nombre_url, request.method, response.status_code, milisegundos / 1000, medicion.consultas)
+
+        user = getattr(request, 'user', None)
+        if getattr(settings, 'RENDIMIENTO_SERVER_TIMING_PUBLICO', False) or (user is not None and user.is_staff):
+            response['Server-Timing'] = _cabecera(medicion, milisegundos)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.inicio_vista = time.perf_counter()
+        return None
@@ -1,3 +1,1098 @@
-from django.test import TestCase
+from datetime import timedelta
+import io
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from pywebpush import WebPushException
+from webpush.models import SubscriptionInfo
+
+from . import acceso_cp, adjuntos, autorizacion, benchmark, busqueda, comentarios, notificaciones, paginacion, perfilador, rendimiento, trabajos, urls, visor_logs
+from .management.commands.bench_marcado import renderizar_anterior
+from .marcado import renderizar
+from .paginacion import codificar_cursor
+from .acciones_masivas import CAMPOS
+from .models import (
+    ArchivoAdjunto, Area, Aviso, AvisoNoLeido, ContenidoAdjunto, EstadoTicket, FrecuenciaPalabra, LecturaAvisos, LecturaTicket,
+    ResumenTicket, Tarea, Ticket, Trabajo,
+)
+
+
+class PlanesDeConsultaTests(TestCase):
+    """
+    Ejecuta EXPLAIN sobre las consultas calientes de Ticket y falla si alguna
+    recorre la tabla completa en lugar de usar un índice.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pendiente = EstadoTicket.objects.create(nombre_estado='Pendiente')
+        EstadoTicket.objects.create(nombre_estado='Aceptado')
+        finalizado = EstadoTicket.objects.create(nombre_estado='Finalizado')
+        areas = [Area.objects.create(nombre=f'Area {i}') for i in range(4)]
+
+        cls.usuario = User.objects.create_user('planes', password='x')
+        cls.usuario.perfil.area = areas[0]
+        cls.usuario.perfil.save()
+        cls.usuario.groups.add(Group.objects.create(name='Ver todos los tickets'))
+        otro = User.objects.create_user('otro', password='x')
+        tarea = Tarea.objects.create(titulo='T', descripcion='d', usuario_creador=otro)
+
+        ahora = timezone.now()
+        Ticket.objects.bulk_create([
+            Ticket(
+                titulo=f'Ticket {i}', descripcion='d',
+                usuario_creador=cls.usuario if i % 5 == 0 else otro,
+                estado=finalizado if i % 3 == 0 else cls.pendiente,
+                area_asignada=areas[i % 4],
+                tarea=tarea if i % 7 == 0 else None,
+                fecha_ultima_modificacion=ahora - timedelta(hours=i),
+            )
+            for i in range(400)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [str(fila[-1]) for fila in cursor.fetchall()]
+
+    def assertSinRecorridoCompleto(self, sql, tabla):
+        plan = self.plan(sql)
+        if connection.vendor == 'postgresql':
+            completo = [linea for linea in plan if f'Seq Scan on {tabla}' in linea]
+        else:
+            completo = [linea for linea in plan if re.fullmatch(rf'SCAN {tabla}( AS \w+)?', linea.strip())]
+        self.assertFalse(completo, f"Recorrido completo de {tabla}:\n{sql}\n" + "\n".join(plan))
+
+    def consultas_de(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        tablas = ('gestion_ticket', 'gestion_lecturaticket')
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and any(t in q['sql'] for t in tablas)]
+
+    def test_dashboard(self):
+        urls = [
+            '/dashboard/',
+            '/dashboard/?estado=',
+            f'/dashboard/?estado={self.pendiente.id}',
+            '/dashboard/?vista=todos',
+            f'/dashboard/?vista=todos&estado={self.pendiente.id}',
+            f'/dashboard/?vista=todos&creador={self.usuario.id}',
+        ]
+        for url in urls:
+            pagina = self.client.get(url).context['pagina']
+            if pagina.url_siguiente:
+                urls.append('/dashboard/' + pagina.url_siguiente)
+        desde = codificar_cursor(timezone.now() - timedelta(minutes=5), 0)
+        urls += [f'/dashboard/cambios/?desde={desde}', f'/dashboard/cambios/?desde={desde}&vista=todos']
+        for url in urls:
+            with self.subTest(url=url):
+                consultas = self.consultas_de(url)
+                self.assertTrue(consultas)
+                for sql in consultas:
+                    self.assertSinRecorridoCompleto(sql, 'gestion_ticket')
+                    self.assertSinRecorridoCompleto(sql, 'gestion_lecturaticket')
+
+    def test_lista_tareas(self):
+        tarea = self.client.get('/tareas/').context['pagina'].objetos[0]
+        tickets = Ticket.objects.filter(tarea=tarea)
+        finalizados = tickets.filter(estado__nombre_estado='Finalizado').count()
+        self.assertEqual((tarea.total_tickets, tarea.finalizados), (tickets.count(), finalizados))
+        self.assertEqual(tarea.porcentaje, finalizados * 100 // tickets.count())
+        for sql in self.consultas_de('/tareas/'):
+            self.assertSinRecorridoCompleto(sql, 'gestion_ticket')
+
+    def test_informes_y_tareas(self):
+        limite = timezone.now() - timedelta(days=5)
+        consultas = [
+            Ticket.objects.exclude(estado__nombre_estado='Finalizado')
+                .filter(fecha_ultima_modificacion__lte=limite)
+                .order_by('fecha_ultima_modificacion'),
+            Ticket.objects.filter(estado__nombre_estado='Pendiente', fecha_ultima_modificacion__gte=limite),
+            Ticket.objects.filter(tarea__isnull=False).order_by('tarea', '-fecha_ultima_modificacion'),
+            LecturaTicket.objects.filter(usuario=self.usuario, ticket_id__in=[1, 2, 3]),
+        ]
+        for qs in consultas:
+            with CaptureQueriesContext(connection) as ctx:
+                list(qs)
+            sql = ctx.captured_queries[-1]['sql']
+            with self.subTest(sql=sql):
+                self.assertSinRecorridoCompleto(sql, qs.model._meta.db_table)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkTests(TestCase):
+    """ seed_benchmark a escala mínima y una corrida del benchmark de vistas sobre esos datos. """
+
+    @classmethod
+    def setUpClass(cls):
+        raiz = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, raiz, ignore_errors=True)
+        cls.enterClassContext(override_settings(ADJUNTOS_ROOT=raiz))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_benchmark', escala=0.0005, semilla=7, stdout=io.StringIO())
+
+    def test_seed(self):
+        self.assertEqual(Ticket.objects.count(), 500)
+        self.assertEqual(
+            ContenidoAdjunto.objects.aggregate(total=Sum('referencias'))['total'], ArchivoAdjunto.objects.count()
+        )
+        self.assertEqual(ResumenTicket.objects.aggregate(total=Sum('total'))['total'], 500)
+        self.assertIsNotNone(benchmark.ids_de_ejemplo({u.username: u for u in User.objects.filter(username__in=benchmark.ROLES.values())}))
+
+    def test_seed_no_pisa_una_base_con_datos(self):
+        with self.assertRaisesMessage(CommandError, '--forzar'):
+            call_command('seed_benchmark', escala=0.0005, stdout=io.StringIO())
+        # Ni con --forzar se repiten los usuarios de benchmark
+        with self.assertRaisesMessage(CommandError, 'datos de benchmark'):
+            call_command('seed_benchmark', escala=0.0005, forzar=True, stdout=io.StringIO())
+
+    def test_todas_las_urls(self):
+        resultados = benchmark.ejecutar(repeticiones=1, calentamiento=0)
+        nombres = {p.name for p in urls.urlpatterns if getattr(p, 'name', None)} - benchmark.OMITIDAS
+        for rol in benchmark.ROLES:
+            medidos = {clave.split(' ')[2].split('?')[0] for clave in resultados if clave.startswith(rol + ' ')}
+            self.assertEqual(medidos, nombres, rol)
+        errores = {clave: m['status'] for clave, m in resultados.items() if m['status'] >= 500}
+        self.assertFalse(errores)
+
+    def test_comparar(self):
+        base = {'staff GET dashboard': {'status': 200, 'p50': 10, 'p95': 20, 'p99': 30, 'consultas': 6}}
+        igual = dict(base)
+        self.assertEqual(benchmark.comparar(igual, base), [])
+        ruido = {'staff GET dashboard': dict(base['staff GET dashboard'], p95=24)}
+        self.assertEqual(benchmark.comparar(ruido, base, umbral=0.1, margen_ms=5), [])
+        peor = {'staff GET dashboard': dict(base['staff GET dashboard'], p95=40, consultas=7, status=500)}
+        self.assertEqual(len(benchmark.comparar(peor, base)), 3)
+        self.assertEqual(benchmark.comparar({'staff GET nueva': base['staff GET dashboard']}, base), [])
+
+
+class AccionesMasivasTests(TestCase):
+    """ acciones_tickets_view: sentencias fijas por acción, permisos del detalle y rollups al día. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pendiente = EstadoTicket.objects.create(nombre_estado='Pendiente')
+        cls.finalizado = EstadoTicket.objects.create(nombre_estado='Finalizado')
+        cls.areas = [Area.objects.create(nombre=f'Area {i}') for i in range(2)]
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.usuario = User.objects.create_user('usuario', password='x')
+        Ticket.objects.bulk_create([
+            Ticket(
+                titulo=f'Impresora sin toner {i}', descripcion='d', usuario_creador=cls.usuario if i < 5 else cls.staff,
+                estado=cls.pendiente, area_asignada=cls.areas[0],
+            )
+            for i in range(40)
+        ])
+        ResumenTicket.reconstruir()
+        FrecuenciaPalabra.reconstruir()
+        cls.ids = list(Ticket.objects.order_by('id').values_list('id', flat=True))
+
+    def aplicar(self, ids, **datos):
+        return self.client.post('/tickets/acciones/', {'tickets': ids, 'siguiente': '/dashboard/', **datos})
+
+    def assertRollupsAlDia(self):
+        resumen = {
+            (f.estado_id, f.area_id_clave, f.usuario_asignado_id_clave): f.total
+            for f in ResumenTicket.objects.filter(total__gt=0)
+        }
+        self.assertEqual(resumen, {clave: total for clave, (total, _) in ResumenTicket.calcular_desde_tickets().items()})
+        palabras = {(f.mes, f.area_id_clave, f.palabra): f.total for f in FrecuenciaPalabra.objects.all()}
+        self.assertEqual(palabras, dict(FrecuenciaPalabra.calcular_desde_tickets()))
+
+    def test_consultas_fijas(self):
+        self.client.force_login(self.staff)
+        for accion, datos in (
+            ('estado', {'estado': self.finalizado.id}),
+            ('area', {'area': self.areas[1].id}),
+            ('usuario', {'usuario': self.staff.id}),
+        ):
+            with self.subTest(accion=accion):
+                with self.assertLogs('audit') as auditoria, CaptureQueriesContext(connection) as pocos:
+                    self.assertEqual(self.aplicar(self.ids[:3], accion=accion, **datos).status_code, 302)
+                # La primera vez se crean celdas de los rollups; después la cantidad no crece con los tickets
+                with self.assertLogs('audit') as auditoria_muchos, CaptureQueriesContext(connection) as muchos:
+                    self.aplicar(self.ids[3:], accion=accion, **datos)
+                self.assertLessEqual(len(muchos), len(pocos))
+                self.assertEqual((len(auditoria.records), len(auditoria_muchos.records)), (3, 37))
+                self.assertEqual(Ticket.objects.filter(**{CAMPOS[accion] + '_id': list(datos.values())[0]}).count(), 40)
+        self.assertRollupsAlDia()
+        self.assertEqual(Trabajo.objects.filter(tipo='notificar_ticket').count(), 120)
+
+    def test_no_marca_comentarios_nuevos(self):
+        ids = self.ids[:5]
+        LecturaTicket.marcar_leidos(self.usuario.id, ids, timezone.now())
+        cursor = codificar_cursor(timezone.now(), 0)
+        antes = dict(Ticket.objects.filter(id__in=ids).values_list('id', 'fecha_ultima_modificacion'))
+        self.client.force_login(self.staff)
+        with self.assertLogs('audit'):
+            self.aplicar(ids, accion='estado', estado=self.finalizado.id)
+        self.assertEqual(dict(Ticket.objects.filter(id__in=ids).values_list('id', 'fecha_ultima_modificacion')), antes)
+
+        # El creador ve el cambio en vivo, en su lugar y sin el aviso de comentarios nuevos
+        self.client.force_login(self.usuario)
+        self.assertEqual(LecturaTicket.ids_no_leidos(self.usuario, Ticket.objects.filter(id__in=ids)), [])
+        filas = self.client.get('/dashboard/cambios/', {'desde': cursor, 'estado': ''}).json()['filas']
+        self.assertEqual({f['id'] for f in filas}, set(ids))
+        self.assertFalse(any(f['subir'] for f in filas))
+
+    def test_script_de_seleccion_tambien_al_buscar(self):
+        self.client.force_login(self.staff)
+        for params in ({}, {'q': 'impresora'}):
+            with self.subTest(params=params):
+                self.assertContains(self.client.get('/dashboard/', params), '¿Aplicar la acción a')
+
+    def test_permisos(self):
+        # Un creador sin staff ni "ver todos" no puede cambiar en lote ni siquiera sus propios tickets
+        self.client.force_login(self.usuario)
+        for datos in ({'accion': 'estado', 'estado': self.finalizado.id}, {'accion': 'area', 'area': ''}, {'accion': 'usuario', 'usuario': self.usuario.id}):
+            with self.subTest(accion=datos['accion']):
+                self.assertEqual(self.aplicar(self.ids[:5], **datos).status_code, 403)
+        self.assertFalse(Ticket.objects.exclude(estado=self.pendiente, area_asignada=self.areas[0], usuario_asignado=None).exists())
+        self.assertRollupsAlDia()
+
+class ResumenTicketTests(TestCase):
+    """ El rollup mantenido por señales coincide con reconstruir() después de cada cambio. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pendiente = EstadoTicket.objects.create(nombre_estado='Pendiente')
+        cls.finalizado = EstadoTicket.objects.create(nombre_estado='Finalizado')
+        cls.areas = [Area.objects.create(nombre=f'Area {i}') for i in range(2)]
+        cls.usuario = User.objects.create_user('usuario', password='x')
+
+    def crear(self, **campos):
+        return Ticket.objects.create(
+            titulo='Monitor sin imagen', descripcion='d', usuario_creador=self.usuario,
+            estado=self.pendiente, area_asignada=self.areas[0], **campos,
+        )
+
+    def assertIgualAReconstruido(self):
+        def celdas():
+            return {
+                (f.estado_id, f.area_id_clave, f.usuario_asignado_id_clave): (f.total, round(f.segundos_resolucion, 3))
+                for f in ResumenTicket.objects.filter(total__gt=0)
+            }
+        incremental = celdas()
+        ResumenTicket.reconstruir()
+        self.assertEqual(incremental, celdas())
+
+    def test_alta_cambios_y_baja(self):
+        ticket = self.crear()
+        otro = self.crear(usuario_asignado=self.usuario)
+        self.assertIgualAReconstruido()
+
+        ticket.estado = self.finalizado
+        ticket.save()
+        self.assertIgualAReconstruido()
+
+        otro.area_asignada = self.areas[1]
+        otro.save(update_fields=['area_asignada'])
+        self.assertIgualAReconstruido()
+
+        # Instancia vieja: el descuento sale de la fila guardada, no de lo que recuerda la instancia
+        vieja = Ticket.objects.get(pk=ticket.pk)
+        ticket.area_asignada = self.areas[1]
+        ticket.save()
+        vieja.titulo = 'Monitor con rayas'
+        vieja.save()
+        self.assertIgualAReconstruido()
+
+        Ticket.objects.get(pk=otro.pk).delete()
+        self.assertIgualAReconstruido()
+        Ticket.objects.all().delete()
+        self.assertFalse(ResumenTicket.objects.filter(total__gt=0).exists())
+
+    def test_comentar(self):
+        ticket = self.crear()
+        comentarios.comentar(ticket, self.usuario, 'Reinicié el equipo', auto_asignar=True)
+        self.assertIgualAReconstruido()
+        ticket.estado = self.finalizado
+        ticket.save()
+        comentarios.comentar(Ticket.objects.get(pk=ticket.pk), self.usuario, 'Cerrado')
+        self.assertIgualAReconstruido()
+
+    def test_guardar_abierto_no_toca_el_rollup(self):
+        ticket = self.crear()
+        with CaptureQueriesContext(connection) as consultas:
+            ticket.descripcion = 'otra'
+            ticket.save()
+        self.assertFalse([c['sql'] for c in consultas if 'resumenticket' in c['sql'].lower()])
+
+
+class ImportarComentariosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        estado = EstadoTicket.objects.create(nombre_estado='Pendiente')
+        cls.ticket = Ticket.objects.create(titulo='Sin red', descripcion='d', usuario_creador=cls.staff, estado=estado)
+
+    def importar(self, fecha):
+        hilos = [{'ticket_id': self.ticket.id, 'comentarios': [{'autor': 'staff', 'cuerpo': 'Revisado.', 'fecha': fecha}]}]
+        return self.client.post('/api/comentarios/importar/', {'hilos': hilos}, content_type='application/json')
+
+    def test_fechas_invalidas(self):
+        self.client.force_login(self.staff)
+        for fecha in ('ayer', '2024-02-30T10:00', '2024-01-10T25:00:00'):
+            with self.subTest(fecha=fecha):
+                self.assertEqual(self.importar(fecha).status_code, 400)
+        self.assertFalse(self.ticket.comentarios.exists())
+        with self.assertLogs('audit'):
+            self.assertEqual(self.importar('2024-01-10T09:30:00').json(), {'importados': 1})
+
+
+class BusquedaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('usuario', password='x')
+        estado = EstadoTicket.objects.create(nombre_estado='Pendiente')
+        cls.monitor = Ticket.objects.create(titulo='Cambio de monitor', descripcion='d', usuario_creador=cls.usuario, estado=estado)
+        cls.mencion = Ticket.objects.create(
+            titulo='Sigue igual', descripcion=f'Ver el ticket {cls.monitor.id}', usuario_creador=cls.usuario, estado=estado,
+        )
+        cls.impresoras = [
+            Ticket.objects.create(titulo=f'Impresora sin toner {piso}', descripcion='d', usuario_creador=cls.usuario, estado=estado)
+            for piso in ('PB', 'primer piso', 'segundo piso')
+        ]
+
+    def test_numero_suelto_busca_id_y_texto(self):
+        numero = str(self.monitor.id)
+        self.assertEqual(list(busqueda.filtrar(Ticket.objects.all(), numero)), [self.monitor, self.mencion])
+        self.assertEqual(list(busqueda.filtrar(Ticket.objects.all(), '#' + numero)), [self.monitor])
+        self.assertEqual(set(busqueda.filtrar(Ticket.objects.all(), 'toner')), set(self.impresoras))
+
+    def test_avisa_si_se_cortan_los_resultados(self):
+        self.client.force_login(self.usuario)
+        with override_settings(BUSQUEDA_MAX_RESULTADOS=2):
+            respuesta = self.client.get('/dashboard/', {'q': 'impresora'})
+        self.assertEqual(len(respuesta.context['tickets']), 2)
+        self.assertTrue(respuesta.context['busqueda_truncada'])
+        self.assertContains(respuesta, 'resultados más relevantes')
+        respuesta = self.client.get('/dashboard/', {'q': 'impresora'})
+        self.assertEqual(len(respuesta.context['tickets']), 3)
+        self.assertFalse(respuesta.context['busqueda_truncada'])
+
+
+class MarcadoTests(SimpleTestCase):
+    """ gestion.marcado contra el renderizador anterior, que se conserva en bench_marcado. """
+
+    def test_igual_al_anterior(self):
+        textos = [
+            'C(red, N(importante))',
+            'M(yellow, S(x))',
+            'N(a) y C(#fff, b) url(https://intranet/soporte)',
+            'N(hola (mundo))',
+            '* C(#E63946, I(texto)) final\n1. M(#FFF3B0, N(uno)) y T(dos)',
+        ]
+        for texto in textos:
+            with self.subTest(texto=texto):
+                self.assertEqual(renderizar(texto), renderizar_anterior(texto))
+
+    def test_anidado_de_adentro_hacia_afuera(self):
+        # El renderizador anterior cerraba mal estos casos
+        self.assertEqual(renderizar('T(C(red, x))'), '<p><s><span style="color:red;">x</span></s></p>')
+        self.assertEqual(renderizar('N(I(S(x)))'), '<p><strong><em><u>x</u></em></strong></p>')
+
+    def test_escapa_el_texto(self):
+        self.assertEqual(renderizar('<script>alert(1)</script>'), '<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>')
+        self.assertEqual(renderizar('C(red" onclick="x, y)'), '<p>C&#40;red&quot; onclick=&quot;x, y&#41;</p>')
+        self.assertEqual(renderizar('url(javascript:alert`1`)'), '<p>javascript:alert`1`</p>')
+
+    def test_color_solo_nombre_o_hex(self):
+        self.assertEqual(renderizar('M(#FFF3B0, alta) C( red , x)'), '<p><mark style="background-color:#FFF3B0;">alta</mark> <span style="color:red;">x</span></p>')
+        self.assertEqual(renderizar('M(red;position:fixed, x)'), '<p>M&#40;red;position:fixed, x&#41;</p>')
+        # El enlace que deja url() no puede terminar dentro del atributo style
+        html = renderizar('C(url(https://e/ onmouseover=alert`1` ), hola)')
+        self.assertNotIn('style', html)
+        self.assertEqual(re.findall(r'\s([\w-]+)="', html), ['href', 'target', 'class'])
+        self.assertEqual(renderizar('url(javascript:alert`1`)'), '<p>javascript:alert`1`</p>')
+
+
+@override_settings(CACHE_COMPARTIDA=True)
+class AutorizacionTests(TestCase):
+    """ Contexto de autorización en caché con claves versionadas por usuario y global. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.area = Area.objects.create(nombre='Sistemas')
+        cls.grupo = Group.objects.create(name=autorizacion.GRUPO_INFORME)
+        cls.usuario, cls.otro = [User.objects.create_user(nombre, password='x') for nombre in ('usuario', 'otro')]
+
+    def setUp(self):
+        cache.clear()
+
+    def versiones(self):
+        return autorizacion.version_usuario(self.usuario.pk), autorizacion.version_usuario(self.otro.pk)
+
+    def assertInvalida(self, cambio, usuario=True, otro=False):
+        antes = self.versiones()
+        cambio()
+        despues = self.versiones()
+        self.assertEqual((antes[0] != despues[0], antes[1] != despues[1]), (usuario, otro))
+
+    def test_contexto_en_cache_hasta_invalidar(self):
+        self.assertFalse(autorizacion.contexto_de_usuario(self.usuario.pk).puede_ver_informes)
+        with self.assertNumQueries(0):
+            autorizacion.contexto_de_usuario(self.usuario.pk)
+        self.usuario.groups.add(self.grupo)
+        with self.assertNumQueries(1):
+            self.assertTrue(autorizacion.contexto_de_usuario(self.usuario.pk).puede_ver_informes)
+
+    def test_guardar_usuario_y_perfil(self):
+        self.assertInvalida(self.usuario.save)
+        perfil = self.usuario.perfil
+        perfil.area = self.area
+        self.assertInvalida(perfil.save)
+        self.assertEqual(autorizacion.contexto_de_usuario(self.usuario.pk).area_nombre, 'Sistemas')
+
+    def test_grupos(self):
+        self.assertInvalida(lambda: self.usuario.groups.add(self.grupo))
+        self.assertInvalida(lambda: self.usuario.groups.remove(self.grupo))
+        # Desde el grupo pueden ser muchos usuarios: se sube la versión global
+        self.assertInvalida(lambda: self.grupo.user_set.add(self.otro), otro=True)
+        self.grupo.name = 'Informes'
+        self.assertInvalida(self.grupo.save, otro=True)
+        self.assertInvalida(lambda: Group.objects.create(name='Nuevo'), usuario=False)
+        self.area.nombre = 'Soporte'
+        self.assertInvalida(self.area.save, otro=True)
+
+
+@override_settings(CACHE_COMPARTIDA=True, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AccesoCPTests(TestCase):
+    """ Caché de verificaciones exitosas, su invalidación y los límites de intentos. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grupo = Group.objects.create(name=autorizacion.GRUPO_CP)
+        cls.usuario = User.objects.create_user('Terminal', password='clave')
+        cls.usuario.groups.add(cls.grupo)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidacion(self):
+        self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.OK)
+
+        self.usuario.set_password('nueva')
+        self.usuario.save()
+        self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.CREDENCIALES_INVALIDAS)
+        self.assertEqual(acceso_cp.verificar('terminal', 'nueva'), acceso_cp.OK)
+
+        self.usuario.groups.remove(self.grupo)
+        self.assertEqual(acceso_cp.verificar('terminal', 'nueva'), acceso_cp.SIN_PERMISO)
+        self.grupo.user_set.add(self.usuario)
+        self.assertEqual(acceso_cp.verificar('terminal', 'nueva'), acceso_cp.OK)
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(acceso_cp.verificar('terminal', 'nueva'), acceso_cp.INACTIVO)
+
+    @override_settings(CACHE_COMPARTIDA=False)
+    def test_sin_cache_compartida(self):
+        self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.OK)
+        with self.assertNumQueries(2):
+            self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.OK)
+        self.assertEqual(len(autorizacion.revisar_cache(None)), 1)
+
+    @override_settings(CP_USUARIO_CAPACIDAD=2, CP_USUARIO_POR_SEGUNDO=0.01)
+    def test_limite_por_usuario(self):
+        for _ in range(2):
+            self.assertEqual(acceso_cp.verificar('terminal', 'mala'), acceso_cp.CREDENCIALES_INVALIDAS)
+        self.assertEqual(acceso_cp.verificar('Terminal', 'mala'), acceso_cp.DEMASIADOS_INTENTOS)
+        # Un acceso ya verificado no gasta la cubeta del usuario
+        cache.clear()
+        self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.OK)
+        for _ in range(2):
+            acceso_cp.verificar('terminal', 'mala')
+        self.assertEqual(acceso_cp.verificar('terminal', 'clave'), acceso_cp.OK)
+
+    @override_settings(CP_IP_CAPACIDAD=3, CP_IP_POR_SEGUNDO=0.01, CABECERA_IP_CLIENTE='HTTP_X_REAL_IP')
+    def test_limite_por_ip(self):
+        def verificar(ip, **datos):
+            return self.client.post(
+                '/api/verificar_acceso_cp/', datos, content_type='application/json', HTTP_X_REAL_IP=ip,
+            )
+
+        self.assertEqual(verificar('10.0.0.1', username='terminal', password='clave').status_code, 200)
+        # Un lote gasta un token por credencial
+        lote = [{'username': 'terminal', 'password': 'clave'}] * 2
+        respuesta = self.client.post(
+            '/api/verificar_acceso_cp/lote/', {'credenciales': lote}, content_type='application/json', HTTP_X_REAL_IP='10.0.0.1',
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        respuesta = verificar('10.0.0.1', username='terminal', password='clave')
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertTrue(respuesta.has_header('Retry-After'))
+        self.assertEqual(verificar('10.0.0.2', username='terminal', password='clave').status_code, 200)
+
+
+class MetricasTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        raiz = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, raiz, ignore_errors=True)
+        cls.enterClassContext(override_settings(METRICAS_DIR=raiz))
+        super().setUpClass()
+
+    def test_sin_lista_nadie_entra(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICAS_IPS_PERMITIDAS=['10.0.5.0/24'])
+    def test_lista_de_redes(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.5.20').status_code, 200)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        # Sin CABECERA_IP_CLIENTE las cabeceras que manda el cliente no cuentan
+        self.assertEqual(self.client.get('/metrics', HTTP_X_REAL_IP='10.0.5.20').status_code, 403)
+
+    @override_settings(METRICAS_IPS_PERMITIDAS=['10.0.5.0/24'], CABECERA_IP_CLIENTE='HTTP_X_REAL_IP')
+    def test_detras_del_proxy(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_X_REAL_IP='10.0.5.20').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.5.20').status_code, 403)
+
+
+@modify_settings(MIDDLEWARE={'append': 'gestion.rendimiento.MedicionRendimientoMiddleware'})
+@override_settings(RENDIMIENTO_REPETICION_MINIMA=3)
+class RendimientoTests(TestCase):
+    """ Medición por request de gestion/rendimiento.py y su resumen entre procesos. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.usuario = User.objects.create_user('usuario', password='x')
+
+    def setUp(self):
+        cache.clear()
+        # El minuto en curso de este proceso se acumula en variables del módulo
+        for nombre in ('_minuto_local', '_datos_local'):
+            self.enterContext(mock.patch.object(rendimiento, nombre, None))
+
+    def test_duplicadas_y_repetidas(self):
+        medicion = rendimiento.Medicion()
+        with connection.execute_wrapper(medicion):
+            for ids in ([1, 2], [1, 2, 3], [1, 2]):
+                list(User.objects.filter(pk__in=ids))
+            User.objects.filter(pk=1).exists()
+        self.assertEqual((medicion.consultas, medicion.duplicadas), (4, 1))
+        # Las listas de IN de distinto largo comparten huella
+        [(texto, cantidad)] = medicion.repetidas().items()
+        self.assertEqual(cantidad, 3)
+        self.assertIn('IN (%s, …)', texto)
+
+    def test_server_timing_solo_para_staff(self):
+        self.client.force_login(self.usuario)
+        self.assertNotIn('Server-Timing', self.client.get('/dashboard/'))
+        with override_settings(RENDIMIENTO_SERVER_TIMING_PUBLICO=True):
+            self.assertIn('Server-Timing', self.client.get('/dashboard/'))
+
+        self.client.force_login(self.staff)
+        cabecera = self.client.get('/dashboard/')['Server-Timing']
+        self.assertRegex(cabecera, r'^sql;dur=[\d.]+;desc="\d+ consultas", plantillas;dur=[\d.]+, vista;dur=[\d.]+, total;dur=[\d.]+')
+
+    def test_resumen_junta_procesos(self):
+        def medicion(consultas, duplicadas=0, por_sql=None):
+            resultado = rendimiento.Medicion()
+            resultado.consultas, resultado.duplicadas, resultado.por_sql = consultas, duplicadas, por_sql or {}
+            return resultado
+
+        repetida = {'SELECT 1 FROM t WHERE id = %s': 4}
+        with mock.patch.object(rendimiento, 'identificador_worker', return_value='otro:1'):
+            rendimiento._acumular('dashboard', 40, medicion(6, 2, repetida))
+            rendimiento._guardar(rendimiento._minuto_local, rendimiento._datos_local)
+        rendimiento._minuto_local = rendimiento._datos_local = None
+        rendimiento._acumular('dashboard', 7, medicion(4))
+        rendimiento._acumular('dashboard', 3, medicion(2, 0, repetida))
+        rendimiento._acumular('avisos', 800, medicion(1))
+
+        vistas, huellas = rendimiento.resumen()
+        self.assertEqual([fila['nombre'] for fila in vistas], ['avisos', 'dashboard'])
+        dashboard = vistas[1]
+        self.assertEqual((dashboard['cantidad'], dashboard['maximo_ms'], dashboard['p95_ms']), (3, 40, 50))
+        self.assertAlmostEqual(dashboard['promedio_ms'], 50 / 3)
+        self.assertEqual((dashboard['consultas'], dashboard['duplicadas']), (4, 2 / 3))
+        self.assertEqual(
+            [(fila['sql'], fila['requests'], fila['ejecuciones']) for fila in huellas],
+            [('SELECT 1 FROM t WHERE id = %s', 2, 8)],
+        )
+
+
+@modify_settings(MIDDLEWARE={'append': 'gestion.perfilador.PerfiladorMiddleware'})
+@override_settings(PERFILADOR_MUESTREO_CADA=1, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PerfiladorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_no_guarda_credenciales(self):
+        User.objects.create_user('perfilado', password='secreta-123')
+        with self.assertLogs('audit'):
+            respuesta = self.client.post(
+                '/api/login/', {'nombre_usuario': 'perfilado', 'password': 'secreta-123'}, content_type='application/json',
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(perfilador.muestras(), [])
+
+        self.client.get('/dashboard/')
+        muestra, = perfilador.muestras()
+        self.assertEqual(muestra['url'], 'dashboard')
+        self.assertTrue(muestra['sql'])
+        for consulta in muestra['sql']:
+            self.assertEqual(set(consulta), {'sql', 'ms'})
+
+
+class VisorLogsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta, ignore_errors=True)
+        self.enterContext(override_settings(AUDIT_LOG_PATH=os.path.join(self.carpeta, 'audit.log')))
+
+    def escribir(self, nombre, texto):
+        with open(os.path.join(self.carpeta, nombre), 'w', encoding='utf-8') as f:
+            f.write(texto)
+
+    def test_indices_fuera_de_la_rotacion(self):
+        self.escribir('audit.log.1', "2024-01-01 10:00:00 INFO LOGIN: 'a'\n")
+        self.escribir('audit.log', "2024-01-02 10:00:00 INFO LOGIN: 'a'\n2024-01-03 09:00:00 INFO LOGIN: 'b'\n")
+        # Restos de cuando el índice se escribía al lado del log
+        self.escribir('audit.log.idx', '{}')
+        self.escribir('audit.log.1.idx.4242', '{')
+        os.utime(os.path.join(self.carpeta, 'audit.log.1'), (0, 0))
+        self.assertEqual(visor_logs.segmentos(), ['audit.log', 'audit.log.1'])
+
+        indice = visor_logs.indice_de('audit.log')
+        self.assertEqual([dia for dia, _ in indice['dias']], ['2024-01-02', '2024-01-03'])
+        self.assertEqual(visor_logs.indice_de('audit.log'), indice)
+        self.assertEqual(sorted(n for n in os.listdir(self.carpeta) if n.startswith('audit.log.')), ['audit.log.1', 'audit.log.1.idx.4242', 'audit.log.idx'])
+        self.assertEqual(os.listdir(visor_logs.carpeta_indices()), ['audit.log.idx'])
+
+
+@trabajos.tipo('prueba_falla')
+def _trabajo_que_falla(parcial=None):
+    if parcial:
+        raise trabajos.Reintentar('parcial', {'parcial': parcial[1:]})
+    raise RuntimeError('sin conexión')
+
+
+class TrabajosTests(TestCase):
+    """ Cola de gestion/trabajos.py: reservas, reintentos con espera y envíos push. """
+
+    def reservar(self):
+        return trabajos.reservar('worker', 10)
+
+    def vencer(self, trabajo):
+        Trabajo.objects.filter(pk=trabajo.pk).update(reservado_hasta=timezone.now() - timedelta(seconds=1))
+
+    def test_reserva_y_reintento(self):
+        trabajo = trabajos.encolar('prueba_falla', max_intentos=2)
+        [reservado] = self.reservar()
+        self.assertEqual((reservado.pk, reservado.intentos), (trabajo.pk, 1))
+        self.assertEqual(self.reservar(), [])
+
+        trabajos.ejecutar(reservado)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, Trabajo.PENDIENTE)
+        self.assertIn('sin conexión', trabajo.ultimo_error)
+        self.assertGreater(trabajo.disponible_desde, timezone.now())
+        self.assertEqual(self.reservar(), [])
+
+        Trabajo.objects.filter(pk=trabajo.pk).update(disponible_desde=timezone.now())
+        with self.assertLogs('gestion.trabajos', 'ERROR'):
+            trabajos.ejecutar(self.reservar()[0])
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (Trabajo.FALLIDO, 2))
+
+    def test_reintentar_guarda_los_datos_pendientes(self):
+        trabajo = trabajos.encolar('prueba_falla', {'parcial': [1, 2, 3]})
+        trabajos.ejecutar(self.reservar()[0])
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.datos), (Trabajo.PENDIENTE, {'parcial': [2, 3]}))
+
+    @override_settings(TRABAJOS_ESPERA_BASE=10, TRABAJOS_ESPERA_MAXIMA=60)
+    def test_espera_exponencial_con_tope(self):
+        for intentos, segundos in ((1, 10), (2, 20), (3, 40), (4, 60), (20, 60)):
+            with self.subTest(intentos=intentos):
+                espera = trabajos.espera_reintento(intentos).total_seconds()
+                self.assertTrue(segundos <= espera <= segundos * 1.1, espera)
+
+    def test_reserva_vencida(self):
+        trabajo = trabajos.encolar('prueba_falla', max_intentos=2)
+        self.vencer(self.reservar()[0])
+        # Worker caído con intentos restantes: otro worker la retoma
+        [retomado] = self.reservar()
+        self.assertEqual((retomado.pk, retomado.intentos), (trabajo.pk, 2))
+
+        # Vencida en el último intento: falla en lugar de reintentarse sin límite
+        self.vencer(retomado)
+        with self.assertLogs('gestion.trabajos', 'ERROR'):
+            self.assertEqual(self.reservar(), [])
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos, trabajo.reservado_hasta), (Trabajo.FALLIDO, 2, None))
+        self.assertIn('venció', trabajo.ultimo_error)
+
+    def test_push_borra_suscripciones_muertas(self):
+        viva, muerta, caida = [
+            SubscriptionInfo.objects.create(browser='firefox', endpoint=f'https://push.example/{nombre}', auth='a', p256dh='p')
+            for nombre in ('viva', 'muerta', 'caida')
+        ]
+
+        def enviar(suscripcion, payload, ttl):
+            if suscripcion.pk == muerta.pk:
+                raise WebPushException('Gone', response=mock.Mock(status_code=410))
+            if suscripcion.pk == caida.pk:
+                raise WebPushException('Server error', response=mock.Mock(status_code=503))
+
+        trabajo = trabajos.encolar('enviar_push', {'suscripciones': [viva.pk, muerta.pk, caida.pk], 'contenido': {'body': 'x'}})
+        with mock.patch.object(notificaciones, 'send_to_subscription', side_effect=enviar) as envio:
+            trabajos.ejecutar(self.reservar()[0])
+        self.assertEqual(envio.call_count, 3)
+        self.assertEqual(set(SubscriptionInfo.objects.values_list('pk', flat=True)), {viva.pk, caida.pk})
+        trabajo.refresh_from_db()
+        # El reintento solo repite el envío que falló
+        self.assertEqual(trabajo.estado, Trabajo.PENDIENTE)
+        self.assertEqual(trabajo.datos['suscripciones'], [caida.pk])
+
+
+class DirectorioTelefonosTests(TestCase):
+    """ La página independiente usa la variante pública: solo lectura, sin sesión y sin los internos de perfiles. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('jgomez', password='x', first_name='Juana', last_name='Gómez')
+        cls.usuario.perfil.numero_interno = '455'
+        cls.usuario.perfil.save()
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ruta = os.path.join(carpeta, 'directorio.csv')
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write('"Mesa de ayuda",329\n"Compras",210\n')
+        self.enterContext(override_settings(DIRECTORIO_CSV_PATH=ruta))
+
+    def test_publico_sin_sesion(self):
+        respuesta = self.client.get('/telefonos/publico.json')
+        self.assertEqual(respuesta.json(), {'contactos': [['Compras', '210'], ['Mesa de ayuda', '329']]})
+        self.assertEqual(self.client.get('/telefonos/publico.json', {'q': 'ayu'}).json(), {'contactos': [['Mesa de ayuda', '329']]})
+        self.assertEqual(self.client.get('/telefonos/publico.json', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self.client.post('/telefonos/publico.json').status_code, 405)
+
+    def test_completo_con_sesion(self):
+        self.assertEqual(self.client.get('/telefonos/directorio.json').status_code, 302)
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get('/telefonos/directorio.json', {'q': 'gomez'}).json(), {'contactos': [['Juana Gómez', '455']]})
+
+
+class AdjuntosTests(TestCase):
+    """ Almacenamiento por contenido: deduplicación, referencias y descarga con el permiso del ticket. """
+
+    @classmethod
+    def setUpClass(cls):
+        raiz = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, raiz, ignore_errors=True)
+        cls.enterClassContext(override_settings(ADJUNTOS_ROOT=raiz))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creador = User.objects.create_user('creador', password='x')
+        cls.ajeno = User.objects.create_user('ajeno', password='x')
+        cls.ticket = Ticket.objects.create(
+            titulo='Planilla rota', descripcion='d', usuario_creador=cls.creador,
+            estado=EstadoTicket.objects.create(nombre_estado='Pendiente'),
+        )
+
+    def adjuntar(self, *archivos):
+        return adjuntos.adjuntar(self.ticket, [SimpleUploadedFile(nombre, datos) for nombre, datos in archivos])
+
+    def test_deduplica_y_cuenta_referencias(self):
+        primero, segundo, otro = self.adjuntar(('a.txt', b'hola'), ('b.txt', b'hola'), ('c.txt', b'chau'))
+        self.assertEqual(primero.contenido_id, segundo.contenido_id)
+        self.assertEqual(dict(ContenidoAdjunto.objects.values_list('id', 'referencias')), {primero.contenido_id: 2, otro.contenido_id: 1})
+        ruta = adjuntos.ruta_absoluta(primero.contenido.ruta)
+        with open(ruta, 'rb') as f:
+            self.assertEqual(f.read(), b'hola')
+
+        primero.delete()
+        self.assertFalse(Trabajo.objects.filter(tipo='liberar_contenido_adjunto').exists())
+        segundo.delete()
+        trabajo = Trabajo.objects.get(tipo='liberar_contenido_adjunto')
+        adjuntos.liberar_contenido(**trabajo.datos)
+        self.assertFalse(ContenidoAdjunto.objects.filter(pk=primero.contenido_id).exists())
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_adjuntar_todo_o_nada(self):
+        guardar = adjuntos.guardar
+        guardados = []
+
+        def guardar_y_fallar(archivo):
+            if guardados:
+                raise OSError('disco lleno')
+            guardados.append(guardar(archivo))
+            return guardados[-1]
+
+        with mock.patch.object(adjuntos, 'guardar', side_effect=guardar_y_fallar):
+            with self.assertRaises(OSError):
+                self.adjuntar(('a.txt', b'hola'), ('b.txt', b'chau'))
+        # La referencia del primero se revirtió con el resto
+        self.assertEqual(len(guardados), 1)
+        self.assertFalse(ContenidoAdjunto.objects.exists())
+        self.assertFalse(ArchivoAdjunto.objects.exists())
+
+    def test_descarga_con_range_y_etag(self):
+        [adjunto] = self.adjuntar(('notas.txt', b'0123456789'))
+        self.client.force_login(self.creador)
+        url = f'/adjuntos/{adjunto.pk}/'
+
+        respuesta = self.client.get(url)
+        self.assertEqual(b''.join(respuesta.streaming_content), b'0123456789')
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+
+        respuesta = self.client.get(url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual((respuesta.status_code, respuesta['Content-Range']), (206, 'bytes 2-4/10'))
+        self.assertEqual(b''.join(respuesta.streaming_content), b'234')
+        respuesta = self.client.get(url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(respuesta.streaming_content), b'789')
+        respuesta = self.client.get(url, HTTP_RANGE='bytes=20-')
+        self.assertEqual((respuesta.status_code, respuesta['Content-Range']), (416, 'bytes */10'))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=self.client.get(url)['ETag']).status_code, 304)
+
+    def test_descarga_por_el_servidor_web(self):
+        [adjunto] = self.adjuntar(('notas.txt', b'0123456789'))
+        self.client.force_login(self.creador)
+        ruta = adjunto.contenido.ruta
+        with override_settings(ADJUNTOS_SERVIDOR='nginx', ADJUNTOS_ACCEL_PREFIJO='/internos/'):
+            respuesta = self.client.get(f'/adjuntos/{adjunto.pk}/')
+            self.assertEqual(respuesta['X-Accel-Redirect'], '/internos/' + ruta)
+            self.assertEqual(respuesta.content, b'')
+        with override_settings(ADJUNTOS_SERVIDOR='sendfile'):
+            self.assertEqual(self.client.get(f'/adjuntos/{adjunto.pk}/')['X-Sendfile'], adjuntos.ruta_absoluta(ruta))
+
+    def test_permiso_del_ticket(self):
+        [adjunto] = self.adjuntar(('notas.txt', b'secreto'))
+        url = f'/adjuntos/{adjunto.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.ajeno)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.creador)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class LecturaTicketTests(TestCase):
+    """ Marcas de lectura por (usuario, ticket) en lugar del M2M comentarios_leidos_por. """
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = EstadoTicket.objects.create(nombre_estado='Pendiente')
+        cls.lector = User.objects.create_user('lector', password='x')
+        cls.autor = User.objects.create_user('autor', password='x')
+        cls.tickets = [
+            Ticket.objects.create(titulo=f'Ticket {i}', descripcion='d', usuario_creador=cls.autor, estado=estado)
+            for i in range(2)
+        ]
+
+    def test_marcar_leidos_actualiza_la_marca(self):
+        antes = timezone.now()
+        LecturaTicket.marcar_leidos(self.lector.id, [t.id for t in self.tickets], antes)
+        despues = antes + timedelta(minutes=5)
+        LecturaTicket.marcar_leidos(self.lector.id, [self.tickets[0].id], despues)
+        self.assertEqual(
+            dict(LecturaTicket.objects.filter(usuario=self.lector).values_list('ticket_id', 'leido_hasta')),
+            {self.tickets[0].id: despues, self.tickets[1].id: antes},
+        )
+
+    def test_comentario_nuevo_queda_sin_leer(self):
+        ticket = self.tickets[0]
+        self.assertEqual(LecturaTicket.ids_no_leidos(self.lector, self.tickets), [t.id for t in self.tickets])
+        LecturaTicket.marcar_leidos(self.lector.id, [t.id for t in self.tickets], timezone.now())
+        self.assertEqual(LecturaTicket.ids_no_leidos(self.lector, Ticket.objects.all()), [])
+
+        comentarios.comentar(ticket, self.autor, 'Ya lo reviso')
+        self.assertEqual(LecturaTicket.ids_no_leidos(self.lector, Ticket.objects.order_by('id')), [ticket.id])
+        # El autor del comentario no lo ve como nuevo
+        self.assertEqual(LecturaTicket.ids_no_leidos(self.autor, Ticket.objects.filter(pk=ticket.pk)), [])
+
+
+class LecturaAvisosTests(TestCase):
+    """ Marca de agua de avisos leídos con excepciones (AvisoNoLeido). """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.usuario = User.objects.create_user('usuario', password='x')
+        cls.avisos = [Aviso.objects.create(titulo=f'Aviso {i}', cuerpo='c', autor=cls.staff) for i in range(3)]
+
+    def no_leidos(self):
+        return sorted(LecturaAvisos.no_leidos(self.usuario).values_list('id', flat=True))
+
+    def test_marca_de_agua_y_excepciones(self):
+        primero, segundo, tercero = (a.id for a in self.avisos)
+        self.assertEqual(self.no_leidos(), [primero, segundo, tercero])
+        LecturaAvisos.avanzar(self.usuario.id, segundo)
+        self.assertEqual(self.no_leidos(), [tercero])
+        # La marca nunca retrocede
+        LecturaAvisos.avanzar(self.usuario.id, primero)
+        self.assertEqual(self.no_leidos(), [tercero])
+
+        LecturaAvisos.marcar(self.usuario.id, primero, leido=False)
+        self.assertEqual(self.no_leidos(), [primero, tercero])
+        LecturaAvisos.marcar(self.usuario.id, primero, leido=True)
+        self.assertEqual(self.no_leidos(), [tercero])
+
+        LecturaAvisos.marcar(self.usuario.id, segundo, leido=False)
+        LecturaAvisos.marcar_todos_leidos(self.usuario.id, tercero)
+        self.assertEqual(self.no_leidos(), [])
+        self.assertFalse(AvisoNoLeido.objects.exists())
+
+        nuevo = Aviso.objects.create(titulo='Corte de luz', cuerpo='c', autor=self.staff)
+        self.assertEqual(self.no_leidos(), [nuevo.id])
+
+    def test_contador_del_dashboard(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get('/dashboard/').context['unread_avisos_count'], 3)
+        # Entrar a la lista los da por leídos
+        self.client.get('/avisos/')
+        self.assertEqual(self.client.get('/dashboard/').context['unread_avisos_count'], 0)
+
+
+class MigracionesTests(TransactionTestCase):
+    """ Migraciones de datos: se vuelve a la migración anterior, se cargan filas con los modelos históricos y se migra. """
+
+    def migrar(self, nombre):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate([('gestion', nombre)])
+        return ejecutor.loader.project_state([('gestion', nombre)]).apps
+
+    def tearDown(self):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate(ejecutor.loader.graph.leaf_nodes('gestion'))
+
+    def test_0004_comentarios_leidos_a_marcas(self):
+        apps = self.migrar('0003_lecturaticket')
+        Ticket = apps.get_model('gestion', 'Ticket')
+        usuarios = [apps.get_model('auth', 'User').objects.create(username=f'u{i}') for i in range(2)]
+        estado = apps.get_model('gestion', 'EstadoTicket').objects.create(nombre_estado='Pendiente')
+        modificado = timezone.now() - timedelta(days=1)
+        leido = Ticket.objects.create(titulo='a', descripcion='d', usuario_creador=usuarios[0], estado=estado, fecha_ultima_modificacion=modificado)
+        sin_leer = Ticket.objects.create(titulo='b', descripcion='d', usuario_creador=usuarios[0], estado=estado)
+        leido.comentarios_leidos_por.add(*usuarios)
+
+        apps = self.migrar('0004_migrar_comentarios_leidos')
+        marcas = apps.get_model('gestion', 'LecturaTicket').objects.values_list('usuario_id', 'ticket_id', 'leido_hasta')
+        self.assertEqual(sorted(marcas), [(u.id, leido.id, modificado) for u in usuarios])
+
+        # Hacia atrás (con el M2M ya borrado) solo vuelven las marcas que siguen al día
+        apps = self.migrar('0005_remove_ticket_comentarios_leidos_por')
+        apps.get_model('gestion', 'LecturaTicket').objects.filter(usuario_id=usuarios[1].id).update(leido_hasta=modificado - timedelta(hours=1))
+        apps = self.migrar('0003_lecturaticket')
+        Ticket = apps.get_model('gestion', 'Ticket')
+        self.assertEqual(list(Ticket.objects.get(pk=leido.pk).comentarios_leidos_por.values_list('id', flat=True)), [usuarios[0].id])
+        self.assertFalse(Ticket.objects.get(pk=sin_leer.pk).comentarios_leidos_por.exists())
+
+    def test_0014_avisos_leidos_a_marca_de_agua(self):
+        apps = self.migrar('0013_lecturaavisos')
+        Aviso = apps.get_model('gestion', 'Aviso')
+        lector, nuevo = [apps.get_model('auth', 'User').objects.create(username=f'u{i}') for i in range(2)]
+        avisos = [Aviso.objects.create(titulo=f'Aviso {i}', cuerpo='c', autor=lector) for i in range(4)]
+        for aviso in (avisos[0], avisos[2]):
+            aviso.leido_por.add(lector)
+
+        apps = self.migrar('0014_migrar_avisos_leidos')
+        self.assertEqual(
+            list(apps.get_model('gestion', 'LecturaAvisos').objects.values_list('usuario_id', 'ultimo_leido_id')),
+            [(lector.id, avisos[2].id)],
+        )
+        self.assertEqual(
+            list(apps.get_model('gestion', 'AvisoNoLeido').objects.values_list('usuario_id', 'aviso_id')),
+            [(lector.id, avisos[1].id)],
+        )
+
+        # Hacia atrás (con el M2M ya borrado) se vuelve a los mismos avisos leídos
+        self.migrar('0015_remove_aviso_leido_por')
+        apps = self.migrar('0013_lecturaavisos')
+        Relacion = apps.get_model('gestion', 'Aviso').leido_por.through
+        self.assertEqual(
+            sorted(Relacion.objects.values_list('user_id', 'aviso_id')),
+            [(lector.id, avisos[0].id), (lector.id, avisos[2].id)],
+        )
+        apps = self.migrar('0014_migrar_avisos_leidos')
+        self.assertEqual(apps.get_model('gestion', 'LecturaAvisos').objects.count(), 1)
+
+
+class PaginacionTests(TestCase):
+    """ Paginación por cursor (fecha, id) de gestion/paginacion.py. """
+
+    @classmethod
+    def setUpTestData(cls):
+        autor = User.objects.create_user('staff', password='x', is_staff=True)
+        base = timezone.now().replace(microsecond=0)
+        # Tres pares con la misma fecha: el id desempata
+        for i, minutos in enumerate((0, 0, 1, 2, 2, 3, 3)):
+            aviso = Aviso.objects.create(titulo=f'Aviso {i}', cuerpo='c', autor=autor)
+            Aviso.objects.filter(pk=aviso.pk).update(fecha_creacion=base + timedelta(minutes=minutos))
+        cls.orden = list(Aviso.objects.order_by('-fecha_creacion', '-id').values_list('id', flat=True))
+
+    def paginar(self, **cursor):
+        return paginacion.paginar_por_cursor(Aviso.objects.all(), 'fecha_creacion', 3, **cursor)
+
+    def test_cursor_ida_y_vuelta(self):
+        fecha = timezone.now()
+        self.assertEqual(paginacion.decodificar_cursor(codificar_cursor(fecha, 42)), (fecha, 42))
+        self.assertNotIn('=', codificar_cursor(fecha, 42))
+
+    def test_cursor_malformado(self):
+        for token in ('', 'no-es-base64!', codificar_cursor(timezone.now(), 1)[:-3], 'c2luLXNlcGFyYWRvcg', 'eHx5'):
+            with self.subTest(token=token):
+                self.assertIsNone(paginacion.decodificar_cursor(token))
+        # Un cursor inválido muestra la primera página en lugar de fallar
+        self.assertEqual(self.paginar(despues='basura').ids, self.orden[:3])
+        self.assertEqual(self.paginar(antes='basura').ids, self.orden[:3])
+
+    def test_despues_y_antes_recorren_todo_sin_repetir(self):
+        paginas = [self.paginar()]
+        self.assertIsNone(paginas[0].cursor_anterior)
+        while paginas[-1].cursor_siguiente:
+            paginas.append(self.paginar(despues=paginas[-1].cursor_siguiente))
+        self.assertEqual([pk for pagina in paginas for pk in pagina.ids], self.orden)
+        self.assertEqual([len(pagina) for pagina in paginas], [3, 3, 1])
+
+        # Hacia atrás se vuelve a las mismas páginas, con los empates de fecha en el mismo orden
+        pagina = paginas[-1]
+        for esperada in reversed(paginas[:-1]):
+            pagina = self.paginar(antes=pagina.cursor_anterior)
+            self.assertEqual(pagina.ids, esperada.ids)
+        self.assertIsNone(pagina.cursor_anterior)
+
+    def test_urls_conservan_los_filtros(self):
+        pagina = self.paginar(despues=self.paginar().cursor_siguiente)
+        pagina.construir_urls({'q': 'luz', 'despues': 'viejo', 'vacio': ''}, '/avisos/')
+        self.assertEqual(pagina.url_siguiente, f'/avisos/?q=luz&despues={pagina.cursor_siguiente}')
+        self.assertEqual(pagina.url_anterior, f'/avisos/?q=luz&antes={pagina.cursor_anterior}')
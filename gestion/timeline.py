@@ -0,0 +1,46 @@
+# /var/www/tickets/gestion/timeline.py
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .models import ArchivoAdjunto, Comentario
+
+
+class PaginaComentarios:
+    """ Comentarios en orden cronológico y el cursor para pedir los anteriores (None si no hay más). """
+
+    def __init__(self, comentarios, cursor_anteriores):
+        self.comentarios = comentarios
+        self.cursor_anteriores = cursor_anteriores
+
+    def __iter__(self):
+        return iter(self.comentarios)
+
+    def __len__(self):
+        return len(self.comentarios)
+
+
+def comentarios_por_pagina() -> int:
+    return getattr(settings, 'TICKET_COMENTARIOS_POR_PAGINA', 20)
+
+
+def cargar_comentarios(ticket_id, antes=None, limite=None) -> PaginaComentarios:
+    """
+    Carga los `limite` comentarios más recientes del ticket (anteriores al id `antes`
+    si se indica) con autor, perfil, área y adjuntos en dos consultas fijas.
+    """
+    limite = limite or comentarios_por_pagina()
+    comentarios = (
+        Comentario.objects.filter(ticket_id=ticket_id)
+        .select_related('usuario_autor__perfil__area')
+        .prefetch_related(Prefetch('adjuntos', queryset=ArchivoAdjunto.objects.select_related('contenido')))
+        .order_by('-id')
+    )
+    if antes:
+        comentarios = comentarios.filter(id__lt=antes)
+    comentarios = list(comentarios[:limite + 1])
+
+    hay_anteriores = len(comentarios) > limite
+    comentarios = comentarios[:limite][::-1]
+    cursor = comentarios[0].id if hay_anteriores and comentarios else None
+    return PaginaComentarios(comentarios, cursor)
@@ -0,0 +1,143 @@
+# /var/www/tickets/gestion/trabajos.py
+"""
+Cola de trabajos persistida en la base.
+
+`encolar()` crea la fila en la transacción en curso: si el cambio que la originó se
+revierte, el trabajo desaparece con él. `manage.py procesar_trabajos` reserva lotes
+con un UPDATE condicional (sirve igual en SQLite y PostgreSQL), los ejecuta en un
+pool de hilos y reprograma los que fallan con espera exponencial. Una reserva que
+vence (worker caído) vuelve a quedar disponible mientras le queden intentos.
+
+Los tipos se registran con el decorador `@tipo('nombre')`; la función recibe los
+`datos` del trabajo como argumentos con nombre.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import metricas
+from .models import Trabajo
+
+logger = logging.getLogger(__name__)
+
+_TIPOS = {}
+
+
+class Reintentar(Exception):
+    """ Falla parcial: el reintento se hace con `datos` (por ejemplo, solo los envíos que fallaron). """
+
+    def __init__(self, mensaje, datos=None):
+        super().__init__(mensaje)
+        self.datos = datos
+
+
+def tipo(nombre):
+    def registrar(funcion):
+        _TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(tipo, datos=None, max_intentos=None, demora=None) -> Trabajo:
+    return Trabajo.objects.create(
+        tipo=tipo,
+        datos=datos or {},
+        max_intentos=max_intentos or getattr(settings, 'TRABAJOS_MAX_INTENTOS', 5),
+        disponible_desde=timezone.now() + (demora or timedelta(0)),
+    )
+
+
+def encolar_varios(tipo, lista_datos, max_intentos=None):
+    max_intentos = max_intentos or getattr(settings, 'TRABAJOS_MAX_INTENTOS', 5)
+    return Trabajo.objects.bulk_create([Trabajo(tipo=tipo, datos=datos, max_intentos=max_intentos) for datos in lista_datos])
+
+
+def identificador_worker() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reservar(worker: str, cantidad: int):
+    """ Reserva hasta `cantidad` trabajos disponibles para este worker y los devuelve. """
+    ahora = timezone.now()
+    vencidas = Q(estado=Trabajo.EN_CURSO, reservado_hasta__lt=ahora)
+    # Una reserva que venció en el último intento (el worker murió ejecutándolo) no se vuelve a tomar
+    agotadas = Trabajo.objects.filter(vencidas, intentos__gte=F('max_intentos')).update(
+        estado=Trabajo.FALLIDO, terminado=ahora, reservado_hasta=None,
+        ultimo_error=Concat(F('ultimo_error'), Value('\nLa reserva venció en el último intento.')),
+    )
+    if agotadas:
+        logger.error("%s trabajos fallaron definitivamente por reservas vencidas", agotadas)
+
+    disponibles = Q(estado=Trabajo.PENDIENTE, disponible_desde__lte=ahora) | (vencidas & Q(intentos__lt=F('max_intentos')))
+    ids = list(Trabajo.objects.filter(disponibles).order_by('disponible_desde').values_list('id', flat=True)[:cantidad])
+    if not ids:
+        return []
+
+    # El UPDATE repite la condición: si otro worker ganó alguno, ese no se toca
+    token = f'{worker}:{uuid.uuid4().hex[:8]}'[:64]
+    duracion = timedelta(seconds=getattr(settings, 'TRABAJOS_RESERVA_SEGUNDOS', 300))
+    Trabajo.objects.filter(disponibles, id__in=ids).update(
+        estado=Trabajo.EN_CURSO, reservado_por=token, reservado_hasta=ahora + duracion, intentos=F('intentos') + 1,
+    )
+    return list(Trabajo.objects.filter(estado=Trabajo.EN_CURSO, reservado_por=token))
+
+
+def espera_reintento(intentos: int) -> timedelta:
+    base = getattr(settings, 'TRABAJOS_ESPERA_BASE', 10)
+    maxima = getattr(settings, 'TRABAJOS_ESPERA_MAXIMA', 3600)
+    segundos = min(maxima, base * 2 ** max(intentos - 1, 0))
+    return timedelta(seconds=segundos + random.uniform(0, segundos / 10))
+
+
+def _fallar(trabajo: Trabajo, error: Exception, datos=None):
+    cambios = {
+        'ultimo_error': ''.join(traceback.format_exception(error))[-4000:],
+        'reservado_hasta': None,
+    }
+    if datos is not None:
+        cambios['datos'] = datos
+    if trabajo.intentos >= trabajo.max_intentos:
+        cambios.update(estado=Trabajo.FALLIDO, terminado=timezone.now())
+        logger.error("Trabajo %s falló definitivamente: %s", trabajo, error)
+    else:
+        cambios.update(estado=Trabajo.PENDIENTE, disponible_desde=timezone.now() + espera_reintento(trabajo.intentos))
+    Trabajo.objects.filter(pk=trabajo.pk, reservado_por=trabajo.reservado_por).update(**cambios)
+
+
+def ejecutar(trabajo: Trabajo):
+    try:
+        funcion = _TIPOS.get(trabajo.tipo)
+        if funcion is None:
+            raise LookupError(f"Tipo de trabajo no registrado: {trabajo.tipo}")
+        funcion(**trabajo.datos)
+    except Reintentar as error:
+        metricas.TRABAJOS.inc(tipo=trabajo.tipo, resultado='reintento')
+        _fallar(trabajo, error, error.datos)
+    except Exception as error:
+        metricas.TRABAJOS.inc(tipo=trabajo.tipo, resultado='error')
+        _fallar(trabajo, error)
+    else:
+        metricas.TRABAJOS.inc(tipo=trabajo.tipo, resultado='ok')
+        Trabajo.objects.filter(pk=trabajo.pk, reservado_por=trabajo.reservado_por).update(
+            estado=Trabajo.HECHO, terminado=timezone.now(), reservado_hasta=None, ultimo_error='',
+        )
+    finally:
+        close_old_connections()
+
+
+def purgar(dias: int) -> int:
+    """ Borra los trabajos terminados bien hace más de `dias` días. """
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = Trabajo.objects.filter(estado=Trabajo.HECHO, terminado__lt=limite).delete()
+    return borrados
@@ -7,20 +7,33 @@ from .views import (
     show_login_page, 
     login_view, 
     dashboard_view, 
+    cambios_dashboard_view,
+    buscar_tickets_view,
     logout_view,
     crear_usuario_view,
     lista_usuarios_view,
     toggle_usuario_status_view,
     ver_logs_view,
+    rendimiento_view,
+    perfilador_view,
+    perfil_muestra_view,
+    metricas_view,
     crear_ticket_view,
     ticket_detalle_view,
+    comentarios_ticket_view,
+    acciones_tickets_view,
+    importar_comentarios_view,
+    descargar_adjunto_view,
     cambiar_contrasena_view,
     crear_aviso_view,
     lista_avisos_view,
     telefonos_view,
+    directorio_telefonos_view,
+    directorio_telefonos_publico_view,
     perfil_view,
     gestionar_areas_view,
     verificar_acceso_cp,
+    verificar_acceso_cp_lote,
     gestionar_grupos_view,
     informes_view,
     public_perfil_view,
@@ -36,21 +49,35 @@ urlpatterns = [
     path('login/', show_login_page, name='show_login'),
     path('api/login/', login_view, name='process_login'),
     path('dashboard/', dashboard_view, name='dashboard'),
+    path('dashboard/cambios/', cambios_dashboard_view, name='cambios_dashboard'),
+    path('dashboard/buscar/', buscar_tickets_view, name='buscar_tickets'),
     path('logout/', logout_view, name='logout'),
     path('usuarios/crear/', crear_usuario_view, name='crear_usuario'), 
     path('usuarios/', lista_usuarios_view, name='lista_usuarios'), 
     path('usuarios/toggle/<int:user_id>/', toggle_usuario_status_view, name='toggle_usuario'), 
     path('logs/', ver_logs_view, name='ver_logs'),
+    path('rendimiento/', rendimiento_view, name='rendimiento'),
+    path('rendimiento/perfiles/', perfilador_view, name='perfilador'),
+    path('rendimiento/perfiles/<str:muestra_id>/', perfil_muestra_view, name='perfil_muestra'),
+    path('metrics', metricas_view, name='metricas'),
     path('tickets/crear/', crear_ticket_view, name='crear_ticket'),
+    path('tickets/acciones/', acciones_tickets_view, name='acciones_tickets'),
     path('tickets/<int:ticket_id>/', ticket_detalle_view, name='detalle_ticket'),
+    path('tickets/<int:ticket_id>/comentarios/', comentarios_ticket_view, name='comentarios_ticket'),
     path('usuarios/cambiar-contrasena/<int:user_id>/', cambiar_contrasena_view, name='cambiar_contrasena'),
     path('avisos/', lista_avisos_view, name='lista_avisos'),
     path('avisos/crear/', crear_aviso_view, name='crear_aviso'),
     path('telefonos/', telefonos_view, name='telefonos'),
+    path('telefonos/directorio.json', directorio_telefonos_view, name='directorio_telefonos'),
+    path('telefonos/publico.json', directorio_telefonos_publico_view, name='directorio_telefonos_publico'),
     path('perfil/', perfil_view, name='perfil'),
     path('areas/', gestionar_areas_view, name='gestionar_areas'),
     path('usuarios/gestionar-grupos/<int:user_id>/', gestionar_grupos_view, name='gestionar_grupos'),
     path('api/verificar_acceso_cp/', verificar_acceso_cp, name='verificar_acceso_cp_api'),
+    path('api/verificar_acceso_cp/lote/', verificar_acceso_cp_lote, name='verificar_acceso_cp_lote'),
+    path('api/comentarios/importar/', importar_comentarios_view, name='importar_comentarios'),
+    path('adjuntos/<int:adjunto_id>/', descargar_adjunto_view, name='descargar_adjunto'),
+    path('adjuntos/<int:adjunto_id>/miniatura/', descargar_adjunto_view, {'miniatura': True}, name='miniatura_adjunto'),
     path('informes/', informes_view, name='informes'),
     path('usuario/<int:user_id>/', public_perfil_view, name='public_perfil'),
     path('tareas/', lista_tareas_view, name='lista_tareas'),
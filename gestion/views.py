@@ -1,10 +1,11 @@
 # /var/www/tickets/gestion/views.py
 
 import json
-import csv
+import hashlib
+import ipaddress
 import logging
+import mimetypes
 import os
-import re
 from collections import Counter
 from datetime import timedelta
 
@@ -12,26 +13,32 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, get_user_model, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count, Avg, F
-from django.http import HttpResponse, HttpRequest, JsonResponse
+from django.db import transaction
+from django.db.models import Q, Count, Exists, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, HttpRequest, HttpResponseNotModified, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag, url_has_allowed_host_and_scheme
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-
-from webpush import send_user_notification
+from django.views.decorators.http import require_GET, require_POST
 
 from .forms import (
     CustomUserCreationForm, TicketCreationForm, CommentForm,
-    StatusChangeForm, AdminPasswordChangeForm, AvisoForm,
+    StatusChangeForm, AccionesTicketsForm, AdminPasswordChangeForm, AvisoForm,
     UserUpdateForm, PerfilUpdateForm, UserPasswordChangeForm, AreaForm,
     AreaChangeForm, UserGroupsForm, TareaCreationForm 
 )
 
-from .models import Ticket, EstadoTicket, Aviso, Perfil, Area, ArchivoAdjunto, Tarea, CategoriaConocimiento, ArticuloConocimiento
+from .models import Ticket, EstadoTicket, Aviso, Perfil, Area, ArchivoAdjunto, Tarea, CategoriaConocimiento, ArticuloConocimiento, LecturaTicket, LecturaAvisos, ResumenTicket, FrecuenciaPalabra
+from .autorizacion import contexto_autorizacion
+from .paginacion import PaginaKeyset, codificar_cursor, decodificar_cursor, paginar_por_cursor
+from .timeline import cargar_comentarios
+from . import acceso_cp, acciones_masivas, adjuntos, auditoria, busqueda, comentarios, directorio, metricas, notificaciones, perfilador, rendimiento, visor_logs
 
 
-audit_log = logging.getLogger('audit')
 User = get_user_model()
 
 def show_login_page(request: HttpRequest) -> HttpResponse:
@@ -47,21 +54,60 @@ def login_view(request: HttpRequest) -> HttpResponse:
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
-            audit_log.info(f"INICIO DE SESIÓN: Usuario '{user.username}' ha iniciado sesión.")
+            metricas.LOGINS.inc(resultado='exito')
+            auditoria.registrar(auditoria.INICIO_SESION, f"Usuario '{user.username}' ha iniciado sesión.", actor=user)
             return JsonResponse({'success': True, 'redirect_url': '/dashboard/'})
         else:
-            audit_log.warning(f"INTENTO DE LOGIN FALLIDO: Para el usuario '{username}'.")
+            metricas.LOGINS.inc(resultado='fallo')
+            auditoria.registrar(auditoria.LOGIN_FALLIDO, f"Para el usuario '{username}'.", actor=username, nivel=logging.WARNING)
             return HttpResponse('Credenciales inválidas.', status=401)
     except Exception as e:
-        audit_log.error(f"ERROR EN LOGIN: {e}")
+        metricas.LOGINS.inc(resultado='error')
+        auditoria.registrar(auditoria.ERROR_LOGIN, str(e), nivel=logging.ERROR)
         return HttpResponse('Ha ocurrido un error en el servidor.', status=500)
 
 def logout_view(request: HttpRequest) -> HttpResponse:
     user = request.user
-    audit_log.info(f"CIERRE DE SESIÓN: Usuario '{user.username}' ha cerrado sesión.")
+    auditoria.registrar(auditoria.CIERRE_SESION, f"Usuario '{user.username}' ha cerrado sesión.", actor=user)
     logout(request)
     return redirect('show_login')
 
+def _tickets_dashboard(request: HttpRequest, auth, view_mode: str, creator_filter: str):
+    """ Tickets sueltos que el usuario ve en el dashboard según la vista, sin filtrar por estado. """
+    tickets = Ticket.objects.filter(tarea__isnull=True)
+    if auth.puede_ver_todos and view_mode == 'todos':
+        if creator_filter:
+            tickets = tickets.filter(usuario_creador__id=creator_filter)
+    elif auth.area_id:
+        tickets = tickets.filter(Q(usuario_creador=request.user) | Q(area_asignada_id=auth.area_id))
+    else:
+        tickets = tickets.filter(usuario_creador=request.user)
+    return tickets
+
+def _filtrar_estado_dashboard(tickets, status_filter: str):
+    if status_filter == 'no_finalizados':
+        return tickets.exclude(estado__nombre_estado='Finalizado')
+    if status_filter:
+        return tickets.filter(estado__id=status_filter)
+    return tickets
+
+def _coincide_estado_dashboard(ticket, status_filter: str) -> bool:
+    """ Lo mismo que _filtrar_estado_dashboard, para un ticket ya cargado con su estado. """
+    if status_filter == 'no_finalizados':
+        return ticket.estado.nombre_estado != 'Finalizado'
+    if status_filter:
+        return str(ticket.estado_id) == status_filter
+    return True
+
+def _acciones_masivas(request: HttpRequest, auth) -> bool:
+    """ Si el dashboard muestra las casillas para cambiar varios tickets a la vez. """
+    return request.user.is_staff or auth.puede_ver_todos
+
+def _cursor_cambios_inicial():
+    # Margen para los cambios que confirman su transacción un poco después de fijar la fecha
+    margen = timedelta(seconds=getattr(settings, 'DASHBOARD_MARGEN_CAMBIOS', 2))
+    return timezone.now() - margen, 0
+
 @login_required
 def dashboard_view(request: HttpRequest) -> HttpResponse:
     view_mode = request.GET.get('vista', 'personal')
@@ -69,97 +115,189 @@ def dashboard_view(request: HttpRequest) -> HttpResponse:
     status_filter = request.GET.get('estado', 'no_finalizados')
     creator_filter = request.GET.get('creador', '')
 
-    tickets = Ticket.objects.filter(tarea__isnull=True).select_related('estado', 'usuario_creador', 'area_asignada')
-
-    user_can_view_all_tickets = request.user.groups.filter(name='Ver todos los tickets').exists()
+    auth = contexto_autorizacion(request)
+    user_can_view_all_tickets = auth.puede_ver_todos
 
     if user_can_view_all_tickets and view_mode == 'todos':
         current_view_name = "Todos los Tickets"
-        tickets = tickets.all()
     else:
         current_view_name = "Mis Tickets"
-        user_area = request.user.perfil.area
-        
-        if user_area:
-            tickets = tickets.filter(
-                Q(usuario_creador=request.user) | Q(area_asignada=user_area)
-            ).distinct()
-        else:
-            tickets = tickets.filter(usuario_creador=request.user)
-
-    if search_query:
-        tickets = tickets.filter(
-            Q(titulo__icontains=search_query) |
-            Q(id__icontains=search_query) |
-            Q(descripcion__icontains=search_query)
-        )
-    
-    if status_filter:
-        if status_filter == 'no_finalizados':
-            tickets = tickets.exclude(estado__nombre_estado='Finalizado')
-        else:
-            tickets = tickets.filter(estado__id=status_filter)
-
-    if creator_filter and user_can_view_all_tickets and view_mode == 'todos':
-        tickets = tickets.filter(usuario_creador__id=creator_filter)
 
-    unread_comment_tickets_ids = list(tickets.exclude(comentarios_leidos_por=request.user).values_list('id', flat=True))
+    tickets = _tickets_dashboard(request, auth, view_mode, creator_filter)
+    tickets = _filtrar_estado_dashboard(tickets, status_filter).select_related('estado', 'usuario_creador', 'area_asignada', 'usuario_asignado')
 
-    tickets = tickets.order_by('-fecha_ultima_modificacion')
-    
-    user_can_see_informe = request.user.groups.filter(name='Informe').exists()
+    busqueda_truncada = False
+    if search_query:
+        # Resultados del índice de texto completo, ordenados por relevancia; uno de más para saber si se cortaron
+        maximo_resultados = getattr(settings, 'BUSQUEDA_MAX_RESULTADOS', 100)
+        resultados = list(busqueda.filtrar(tickets, search_query)[:maximo_resultados + 1])
+        busqueda_truncada = len(resultados) > maximo_resultados
+        pagina = PaginaKeyset(resultados[:maximo_resultados], None, None)
+    else:
+        # Paginación por cursor sobre (fecha_ultima_modificacion, id): cada página cuesta lo mismo
+        pagina = paginar_por_cursor(
+            tickets,
+            'fecha_ultima_modificacion',
+            getattr(settings, 'DASHBOARD_PAGE_SIZE', 50),
+            despues=request.GET.get('despues', ''),
+            antes=request.GET.get('antes', ''),
+        ).construir_urls(request.GET)
+
+    unread_comment_tickets_ids = LecturaTicket.ids_no_leidos(request.user, pagina)
+
+    user_can_see_informe = auth.puede_ver_informes
     
     # Prepara los datos para las notificaciones push
     webpush_data = {"group": request.user.username} 
 
     context = {
         'user': request.user,
-        'tickets': tickets,
+        'auth': auth,
+        'tickets': pagina,
+        'pagina': pagina,
         'all_statuses': EstadoTicket.objects.all(),
         'search_query': search_query,
+        'busqueda_truncada': busqueda_truncada,
         'status_filter': status_filter,
         'creator_filter': creator_filter,
-        'unread_avisos_count': Aviso.objects.exclude(leido_por=request.user).count(),
+        'unread_avisos_count': LecturaAvisos.no_leidos(request.user).count(),
         'current_view_name': current_view_name,
         'view_mode': view_mode,
         'user_can_view_all_tickets': user_can_view_all_tickets,
         'user_can_see_informe': user_can_see_informe,
         'unread_comment_tickets_ids': unread_comment_tickets_ids,
         'webpush': webpush_data,
-        'VAPID_PUBLIC_KEY': settings.WEBPUSH_SETTINGS.get('VAPID_PUBLIC_KEY')
+        'VAPID_PUBLIC_KEY': settings.WEBPUSH_SETTINGS.get('VAPID_PUBLIC_KEY'),
+        'cursor_cambios': codificar_cursor(*_cursor_cambios_inicial()),
+        'intervalo_cambios_ms': getattr(settings, 'DASHBOARD_INTERVALO_CONSULTA', 5) * 1000,
+        'acciones_masivas': _acciones_masivas(request, auth),
     }
     
-    if user_can_view_all_tickets:
+    if user_can_view_all_tickets or context['acciones_masivas']:
         context['all_users'] = User.objects.filter(is_active=True).order_by('username')
+    if context['acciones_masivas']:
+        context['all_areas'] = Area.objects.order_by('nombre')
     
     return render(request, 'gestion/dashboard.html', context)
 
+@login_required
+def buscar_tickets_view(request: HttpRequest) -> JsonResponse:
+    """
+    Búsqueda para el autocompletado del dashboard: los primeros resultados visibles
+    con los mismos filtros de vista y estado, en JSON compacto y sin renderizar la página.
+    """
+    consulta = request.GET.get('q', '').strip()
+    if len(consulta) < getattr(settings, 'BUSQUEDA_MIN_CARACTERES', 2) and busqueda.id_buscado(consulta) is None:
+        return JsonResponse({'resultados': []})
+
+    auth = contexto_autorizacion(request)
+    tickets = _tickets_dashboard(request, auth, request.GET.get('vista', 'personal'), request.GET.get('creador', ''))
+    tickets = _filtrar_estado_dashboard(tickets, request.GET.get('estado', 'no_finalizados'))
+    limite = getattr(settings, 'BUSQUEDA_MAX_SUGERENCIAS', 10)
+    filas = busqueda.filtrar(tickets, consulta).values_list(
+        'id', 'titulo', 'estado__nombre_estado', 'fecha_creacion', 'fecha_ultima_modificacion'
+    )[:limite]
+    resultados = [
+        {'id': pk, 'titulo': titulo, 'estado': estado, 'creado': creado.isoformat(), 'modificado': modificado.isoformat()}
+        for pk, titulo, estado, creado, modificado in filas
+    ]
+    return JsonResponse({'resultados': resultados}, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+
+@login_required
+def cambios_dashboard_view(request: HttpRequest) -> JsonResponse:
+    """
+    Tickets visibles en el dashboard que cambiaron desde el cursor `desde`, como filas HTML.
+    El cursor va sobre fecha_actualizacion, que cambia con cualquier guardado (estado,
+    área, asignado, comentarios); fecha_ultima_modificacion solo la mueven los
+    comentarios y la creación, y de ella dependen el aviso de comentarios nuevos y el
+    orden. `subir` indica si la fila pasa arriba de todo. Responde enseguida aunque no haya cambios: el dashboard la consulta cada
+    DASHBOARD_INTERVALO_CONSULTA segundos. Esperar acá (long-poll) dejaría un worker
+    síncrono de gunicorn tomado por cada pestaña abierta.
+    """
+    posicion = decodificar_cursor(request.GET.get('desde', ''))
+    if posicion is None:
+        return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+
+    auth = contexto_autorizacion(request)
+    view_mode = request.GET.get('vista', 'personal')
+    status_filter = request.GET.get('estado', 'no_finalizados')
+    fecha, pk = posicion
+
+    # Sin filtrar por estado: un ticket que pasó a Finalizado también es un cambio (la fila se quita)
+    cambiados = _tickets_dashboard(request, auth, view_mode, request.GET.get('creador', '')).filter(
+        Q(fecha_actualizacion__gt=fecha) | Q(fecha_actualizacion=fecha, id__gt=pk)
+    )
+
+    maximo = getattr(settings, 'DASHBOARD_MAX_CAMBIOS', 100)
+    tickets = list(
+        cambiados.select_related('estado', 'usuario_creador', 'usuario_asignado')
+        .order_by('fecha_actualizacion', 'id')[:maximo]
+    )
+    no_leidos = LecturaTicket.ids_no_leidos(request.user, tickets)
+    acciones = _acciones_masivas(request, auth)
+    filas = [
+        {
+            'id': ticket.id,
+            'visible': _coincide_estado_dashboard(ticket, status_filter),
+            'subir': ticket.fecha_ultima_modificacion > fecha,
+            'html': render_to_string('gestion/_fila_ticket.html', {
+                'ticket': ticket, 'unread_comment_tickets_ids': no_leidos, 'acciones_masivas': acciones,
+            }, request),
+        }
+        for ticket in tickets
+    ]
+
+    if len(tickets) == maximo:
+        nuevo = (tickets[-1].fecha_actualizacion, tickets[-1].id)
+    else:
+        # Lo que cae dentro del margen se vuelve a mandar la próxima vez; el cliente lo aplica igual
+        nuevo = max(posicion, _cursor_cambios_inicial())
+    return JsonResponse({'cursor': codificar_cursor(*nuevo), 'filas': filas})
+
+
+def _por_tarea(agregado):
+    """ `agregado` sobre los tickets de cada tarea como subconsulta correlacionada; 0 si no tiene tickets. """
+    filas = Ticket.objects.filter(tarea=OuterRef('pk')).order_by().values('tarea').annotate(valor=agregado).values('valor')
+    return Coalesce(Subquery(filas), 0)
+
 @login_required
 def lista_tareas_view(request: HttpRequest) -> HttpResponse:
     """ Muestra el dashboard de tareas con filtros de permisos correctos. """
     
-    tareas = Tarea.objects.select_related('usuario_creador').prefetch_related('areas_asignadas', 'tickets').order_by('-fecha_creacion')
+    tareas = Tarea.objects.select_related('usuario_creador').prefetch_related('areas_asignadas')
 
     # Los superusuarios ven todo
     if not request.user.is_superuser:
-        user_area = request.user.perfil.area
-        
-        # Filtro para tareas creadas por el usuario o asignadas directamente a su área principal
-        filtro_principal = Q(usuario_creador=request.user)
-        if user_area:
-            filtro_principal |= Q(areas_asignadas=user_area)
-        
-        # Filtro para tareas que contienen tickets asignados al área del usuario
-        # Esto permite que un área como "Gerencia" vea la tarea en la lista
-        filtro_por_ticket = Q()
+        user_area = contexto_autorizacion(request).area_id
+
+        # Tareas creadas por el usuario, asignadas a su área o con algún ticket de su área
+        # (así un área como "Gerencia" ve la tarea). Con EXISTS cada tarea aparece una sola
+        # vez, sin el JOIN que multiplicaba filas y el distinct() que las volvía a juntar.
+        visibles = Q(usuario_creador=request.user)
         if user_area:
-            filtro_por_ticket = Q(tickets__area_asignada=user_area)
+            visibles |= Q(Exists(Tarea.areas_asignadas.through.objects.filter(tarea_id=OuterRef('pk'), area_id=user_area)))
+            visibles |= Q(Exists(Ticket.objects.filter(tarea_id=OuterRef('pk'), area_asignada_id=user_area)))
+        tareas = tareas.filter(visibles)
+
+    # El avance de cada tarea sale en la misma consulta; las subconsultas solo corren para la página
+    tareas = tareas.annotate(
+        total_tickets=_por_tarea(Count('id')),
+        pendientes=_por_tarea(Count('id', filter=Q(estado__nombre_estado='Pendiente'))),
+        aceptados=_por_tarea(Count('id', filter=Q(estado__nombre_estado='Aceptado'))),
+        finalizados=_por_tarea(Count('id', filter=Q(estado__nombre_estado='Finalizado'))),
+        porcentaje=_por_tarea(Count('id', filter=Q(estado__nombre_estado='Finalizado')) * 100 / Count('id')),
+    )
+    pagina = paginar_por_cursor(
+        tareas,
+        'fecha_creacion',
+        getattr(settings, 'TAREAS_PAGE_SIZE', 30),
+        despues=request.GET.get('despues', ''),
+        antes=request.GET.get('antes', ''),
+    ).construir_urls(request.GET)
 
-        # Se aplica el filtro combinado
-        tareas = tareas.filter(filtro_principal | filtro_por_ticket).distinct()
-            
     context = {
-        'tareas': tareas
+        'tareas': pagina,
+        'pagina': pagina,
     }
     return render(request, 'gestion/lista_tareas.html', context)
 
@@ -174,7 +312,7 @@ def crear_tarea_view(request: HttpRequest) -> HttpResponse:
             tarea.usuario_creador = request.user
             tarea.save()
             form.save_m2m()
-            audit_log.info(f"TAREA CREADA: Usuario '{request.user.username}' creó la tarea '{tarea.titulo}'.")
+            auditoria.registrar(auditoria.TAREA_CREADA, f"Usuario '{request.user.username}' creó la tarea '{tarea.titulo}'.", actor=request.user, nuevo=tarea.titulo)
             messages.success(request, 'Tarea creada exitosamente.')
             return redirect('lista_tareas')
     else:
@@ -188,18 +326,18 @@ def tarea_detalle_view(request: HttpRequest, tarea_id: int) -> HttpResponse:
     """ Muestra el detalle de una tarea y filtra sus tickets según los permisos del usuario. """
     tarea = get_object_or_404(Tarea, id=tarea_id)
     user = request.user
-    user_area = user.perfil.area
+    user_area = contexto_autorizacion(request).area_id
 
     # --- 1. Verificación de Permisos para acceder a la TAREA ---
     can_access = user.is_superuser or user == tarea.usuario_creador
 
     is_in_task_area = False
-    if user_area and user_area in tarea.areas_asignadas.all():
+    if user_area and tarea.areas_asignadas.filter(id=user_area).exists():
         is_in_task_area = True
         can_access = True
 
     if not can_access and user_area:
-        if tarea.tickets.filter(area_asignada=user_area).exists():
+        if tarea.tickets.filter(area_asignada_id=user_area).exists():
             can_access = True
 
     if not can_access:
@@ -216,10 +354,13 @@ def tarea_detalle_view(request: HttpRequest, tarea_id: int) -> HttpResponse:
             ticket.estado = EstadoTicket.objects.get(nombre_estado='Pendiente')
             ticket.save()
 
-            for f in request.FILES.getlist('adjuntos'):
-                ArchivoAdjunto.objects.create(ticket=ticket, archivo=f, comentario=None)
+            adjuntos.adjuntar(ticket, request.FILES.getlist('adjuntos'))
 
-            audit_log.info(f"TICKET CREADO (TAREA): Usuario '{request.user.username}' creó el ticket #{ticket.id} en la tarea '{tarea.titulo}'.")
+            auditoria.registrar(
+                auditoria.TICKET_CREADO_TAREA,
+                f"Usuario '{request.user.username}' creó el ticket #{ticket.id} en la tarea '{tarea.titulo}'.",
+                actor=request.user, ticket=ticket, nuevo=tarea.titulo,
+            )
             return redirect('tarea_detalle', tarea_id=tarea.id)
     else:
         form = TicketCreationForm()
@@ -228,7 +369,7 @@ def tarea_detalle_view(request: HttpRequest, tarea_id: int) -> HttpResponse:
     tickets_de_la_tarea = tarea.tickets.all().order_by('-fecha_ultima_modificacion')
 
     if not user.is_superuser and user != tarea.usuario_creador and not is_in_task_area:
-        tickets_de_la_tarea = tickets_de_la_tarea.filter(area_asignada=user_area)
+        tickets_de_la_tarea = tickets_de_la_tarea.filter(area_asignada_id=user_area)
 
     context = {
         'tarea': tarea,
@@ -246,7 +387,7 @@ def gestionar_areas_view(request: HttpRequest) -> HttpResponse:
         form = AreaForm(request.POST)
         if form.is_valid():
             area_nueva = form.save()
-            audit_log.info(f"ÁREA CREADA: Admin '{request.user.username}' creó el área '{area_nueva.nombre}'.")
+            auditoria.registrar(auditoria.AREA_CREADA, f"Admin '{request.user.username}' creó el área '{area_nueva.nombre}'.", actor=request.user, nuevo=area_nueva.nombre)
             messages.success(request, 'Área creada exitosamente.')
             return redirect('gestionar_areas')
     else:
@@ -275,10 +416,13 @@ def crear_ticket_view(request: HttpRequest) -> HttpResponse:
             ticket.fecha_ultima_modificacion = timezone.now()
             ticket.save()
 
-            for f in request.FILES.getlist('adjuntos'):
-                ArchivoAdjunto.objects.create(ticket=ticket, archivo=f, comentario=None)
+            adjuntos.adjuntar(ticket, request.FILES.getlist('adjuntos'))
 
-            audit_log.info(f"TICKET CREADO: Usuario '{request.user.username}' creó el ticket #{ticket.id} '{ticket.titulo}'.")
+            auditoria.registrar(
+                auditoria.TICKET_CREADO,
+                f"Usuario '{request.user.username}' creó el ticket #{ticket.id} '{ticket.titulo}'.",
+                actor=request.user, ticket=ticket, nuevo=ticket.titulo,
+            )
 
             return redirect('dashboard')
     else:
@@ -286,67 +430,89 @@ def crear_ticket_view(request: HttpRequest) -> HttpResponse:
     
     return render(request, 'gestion/crear_ticket.html', {'form': form})
 
+def _permisos_ticket(request: HttpRequest, ticket: Ticket):
+    """ Devuelve (puede_ver, esta_en_area) para el usuario del request sobre el ticket. """
+    user = request.user
+    auth = contexto_autorizacion(request)
+    can_view_all = user.is_staff or auth.puede_ver_todos
+    
+    is_creator = ticket.usuario_creador_id == user.id
+    
+    is_assigned = ticket.usuario_asignado_id == user.id
+    
+    is_in_area = bool(auth.area_id) and auth.area_id == ticket.area_asignada_id
+
+    return (can_view_all or is_creator or is_assigned or is_in_area), is_in_area
+
+def _tickets_permitidos(request: HttpRequest):
+    """ Los tickets para los que _permisos_ticket da puede_ver, como queryset. """
+    user = request.user
+    auth = contexto_autorizacion(request)
+    if user.is_staff or auth.puede_ver_todos:
+        return Ticket.objects.all()
+    condicion = Q(usuario_creador=user) | Q(usuario_asignado=user)
+    if auth.area_id:
+        condicion |= Q(area_asignada_id=auth.area_id)
+    return Ticket.objects.filter(condicion)
+
 @login_required
 def ticket_detalle_view(request: HttpRequest, ticket_id: int) -> HttpResponse:
     try:
-        ticket = Ticket.objects.select_related('estado', 'usuario_creador', 'area_asignada', 'usuario_asignado').get(id=ticket_id)
+        ticket = Ticket.objects.select_related(
+            'estado', 'usuario_creador__perfil__area', 'area_asignada', 'usuario_asignado'
+        ).get(id=ticket_id)
     except Ticket.DoesNotExist:
         return redirect('dashboard')
 
     user = request.user
 
-    ticket.comentarios_leidos_por.add(user)
-    
-    can_view_all = user.is_staff or user.groups.filter(name='Ver todos los tickets').exists()
+    # Solo se escribe la marca si hay algo nuevo: un GET de un ticket ya leído no genera escrituras
+    leido_hasta = LecturaTicket.objects.filter(usuario=user, ticket=ticket).values_list('leido_hasta', flat=True).first()
+    if leido_hasta is None or leido_hasta < ticket.fecha_ultima_modificacion:
+        LecturaTicket.marcar_leido(user.id, ticket.id, ticket.fecha_ultima_modificacion)
     
-    is_creator = ticket.usuario_creador == user
-    
-    is_assigned = ticket.usuario_asignado == user
-    
-    is_in_area = False
-    try:
-        if hasattr(user, 'perfil') and user.perfil.area:
-            if user.perfil.area == ticket.area_asignada:
-                is_in_area = True
-    except Perfil.DoesNotExist:
-        pass
-
-    if not (can_view_all or is_creator or is_assigned or is_in_area):
+    can_view, is_in_area = _permisos_ticket(request, ticket)
+    if not can_view:
         messages.error(request, "No tienes permiso para ver este ticket.")
         return redirect('dashboard')
 
     comment_form = CommentForm()
     status_form = StatusChangeForm(instance=ticket)
     
-    initial_attachments = ticket.adjuntos.filter(comentario__isnull=True)
+    initial_attachments = ticket.adjuntos.filter(comentario__isnull=True).select_related('contenido')
 
     if request.method == 'POST':
         if 'add_comment' in request.POST:
             comment_form = CommentForm(request.POST, request.FILES)
             if comment_form.is_valid():
-                if not ticket.usuario_asignado and is_in_area:
-                    ticket.usuario_asignado = user
-                    ticket.save()
-                    audit_log.info(f"TICKET ASIGNADO: Usuario '{user.username}' se auto-asignó el ticket #{ticket.id}.")
-
-                new_comment = comment_form.save(commit=False)
-                new_comment.ticket = ticket
-                new_comment.usuario_autor = user
-                new_comment.save()
-
-                for f in request.FILES.getlist('adjuntos'):
-                    ArchivoAdjunto.objects.create(ticket=ticket, comentario=new_comment, archivo=f)
-
-                audit_log.info(f"COMENTARIO AÑADIDO: Usuario '{user.username}' comentó en el ticket #{ticket.id}.")
+                auto_asignar = not ticket.usuario_asignado and is_in_area
+                _, asignado = comentarios.comentar(
+                    ticket, user, comment_form.cleaned_data['cuerpo_comentario'],
+                    request.FILES.getlist('adjuntos'), auto_asignar=auto_asignar,
+                )
+                if asignado:
+                    auditoria.registrar(
+                        auditoria.TICKET_ASIGNADO, f"Usuario '{user.username}' se auto-asignó el ticket #{ticket.id}.",
+                        actor=user, ticket=ticket, usuario=user, nuevo=user.username,
+                    )
+                auditoria.registrar(auditoria.COMENTARIO_ANADIDO, f"Usuario '{user.username}' comentó en el ticket #{ticket.id}.", actor=user, ticket=ticket)
                 return redirect('detalle_ticket', ticket_id=ticket.id)
 
         elif 'update_status' in request.POST:
             old_status = ticket.estado.nombre_estado
             status_form = StatusChangeForm(request.POST, instance=ticket)
             if status_form.is_valid():
-                updated_ticket = status_form.save()
-                new_status = updated_ticket.estado.nombre_estado
-                audit_log.info(f"CAMBIO DE ESTADO: Usuario '{user.username}' cambió el estado del ticket #{ticket.id} de '{old_status}' a '{new_status}'.")
+                with transaction.atomic():
+                    updated_ticket = status_form.save(commit=False)
+                    new_status = updated_ticket.estado.nombre_estado
+                    updated_ticket.save()
+                    if new_status != old_status:
+                        notificaciones.encolar_evento_ticket(ticket, notificaciones.CAMBIO_ESTADO, user, new_status)
+                auditoria.registrar(
+                    auditoria.CAMBIO_ESTADO,
+                    f"Usuario '{user.username}' cambió el estado del ticket #{ticket.id} de '{old_status}' a '{new_status}'.",
+                    actor=user, ticket=ticket, anterior=old_status, nuevo=new_status,
+                )
                 return redirect('detalle_ticket', ticket_id=ticket.id)
     
     context = {
@@ -354,10 +520,140 @@ def ticket_detalle_view(request: HttpRequest, ticket_id: int) -> HttpResponse:
         'comment_form': comment_form,
         'status_form': status_form,
         'user': user,
-        'initial_attachments': initial_attachments
+        'initial_attachments': initial_attachments,
+        'comentarios': cargar_comentarios(ticket.id),
+        'total_comentarios': ticket.comentarios.count(),
     }
     return render(request, 'gestion/ticket_detalle.html', context)
-    
+
+@login_required
+@require_POST
+def acciones_tickets_view(request: HttpRequest) -> HttpResponse:
+    """
+    Cambia el estado, el área o el asignado de los tickets marcados en el dashboard.
+    Solo para quienes ven las casillas: el detalle no deja a nadie más cambiar el área
+    ni el asignado. Los tickets que el usuario no puede ver se ignoran.
+    """
+    if not _acciones_masivas(request, contexto_autorizacion(request)):
+        return HttpResponse('No tienes permiso para modificar tickets en lote.', status=403)
+
+    siguiente = request.POST.get('siguiente', '')
+    if not url_has_allowed_host_and_scheme(siguiente, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        siguiente = 'dashboard'
+
+    ids = {int(valor) for valor in request.POST.getlist('tickets') if valor.isdigit()}
+    maximo = getattr(settings, 'ACCIONES_MAX_TICKETS', 500)
+    form = AccionesTicketsForm(request.POST)
+    if not ids or len(ids) > maximo or not form.is_valid():
+        messages.error(request, f"Seleccione entre 1 y {maximo} tickets y la acción a aplicar.")
+        return redirect(siguiente)
+
+    tickets = _tickets_permitidos(request).filter(id__in=ids)
+    cambiados = acciones_masivas.aplicar(tickets, form.cleaned_data['accion'], form.valor(), request.user)
+    messages.success(request, f"{cambiados} de {len(ids)} tickets actualizados.")
+    return redirect(siguiente)
+
+@login_required
+def comentarios_ticket_view(request: HttpRequest, ticket_id: int) -> JsonResponse:
+    """ Devuelve la página de comentarios anteriores al id `antes` como fragmento HTML. """
+    ticket = get_object_or_404(Ticket, id=ticket_id)
+    can_view, _ = _permisos_ticket(request, ticket)
+    if not can_view:
+        return JsonResponse({'error': 'No tienes permiso para ver este ticket.'}, status=403)
+
+    try:
+        antes = int(request.GET.get('antes', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Parámetro "antes" inválido.'}, status=400)
+
+    pagina = cargar_comentarios(ticket.id, antes=antes)
+    html = render_to_string('gestion/_comentarios.html', {'comentarios': pagina}, request=request)
+    return JsonResponse({'html': html, 'antes': pagina.cursor_anteriores})
+
+@login_required
+def descargar_adjunto_view(request: HttpRequest, adjunto_id: int, miniatura: bool = False) -> HttpResponse:
+    """ Descarga de un adjunto con el mismo control de visibilidad que el ticket; el envío lo hace el servidor web si está configurado. """
+    adjunto = get_object_or_404(
+        ArchivoAdjunto.objects.select_related('contenido', 'ticket').only(
+            'archivo', 'nombre', 'contenido', 'ticket__id', 'ticket__usuario_creador_id',
+            'ticket__usuario_asignado_id', 'ticket__area_asignada_id',
+        ),
+        id=adjunto_id,
+    )
+    can_view, _ = _permisos_ticket(request, adjunto.ticket)
+    if not can_view:
+        return HttpResponse('No tienes permiso para ver este archivo.', status=403)
+
+    contenido = adjunto.contenido
+    if contenido is None:
+        # Adjunto anterior al almacenamiento por contenido: se transmite desde MEDIA_ROOT
+        if miniatura or not adjunto.archivo:
+            return HttpResponse(status=404)
+        nombre = str(adjunto)
+        tipo_mime = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+        return adjuntos.responder(request, adjunto.archivo.path, nombre, tipo_mime)
+    if miniatura:
+        if not contenido.miniatura:
+            return HttpResponse(status=404)
+        return adjuntos.responder(
+            request, adjuntos.ruta_absoluta(contenido.miniatura), f'miniatura-{adjunto}.jpg', 'image/jpeg',
+            etag=f'{contenido.sha256}-m', ruta_interna=contenido.miniatura,
+        )
+    return adjuntos.responder(
+        request, adjuntos.ruta_absoluta(contenido.ruta), str(adjunto), contenido.tipo_mime,
+        etag=contenido.sha256, ruta_interna=contenido.ruta,
+    )
+
+@login_required
+@require_POST
+def importar_comentarios_view(request: HttpRequest) -> JsonResponse:
+    """
+    Importa hilos de comentarios del sistema anterior (solo staff). Cuerpo JSON:
+    {"hilos": [{"ticket_id": 1, "comentarios": [{"autor": "usuario", "cuerpo": "...", "fecha": "ISO 8601"}]}]}
+    Todo o nada: si un hilo no es válido no se importa ninguno.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No tienes permiso para importar comentarios.'}, status=403)
+    try:
+        hilos = json.loads(request.body)['hilos']
+        pedidos = [(int(hilo['ticket_id']), hilo['comentarios']) for hilo in hilos]
+        filas = [(c['autor'], c['cuerpo'], c['fecha']) for _, comentarios_hilo in pedidos for c in comentarios_hilo]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Formato inválido.'}, status=400)
+
+    tickets = Ticket.objects.in_bulk([ticket_id for ticket_id, _ in pedidos])
+    autores = User.objects.in_bulk({str(autor) for autor, _, _ in filas}, field_name='username')
+    faltantes = sorted({f'#{t}' for t, _ in pedidos if t not in tickets} | {str(a) for a, _, _ in filas if str(a) not in autores})
+    if faltantes:
+        return JsonResponse({'error': 'Tickets o autores inexistentes.', 'faltantes': faltantes}, status=400)
+
+    preparados = []
+    for ticket_id, comentarios_hilo in pedidos:
+        hilo = []
+        for c in comentarios_hilo:
+            try:
+                # parse_datetime da None si no tiene el formato, pero ValueError con '2024-02-30T10:00'
+                fecha = parse_datetime(str(c['fecha']))
+                if fecha is not None and timezone.is_naive(fecha):
+                    fecha = timezone.make_aware(fecha)
+            except ValueError:
+                fecha = None
+            if fecha is None or not str(c['cuerpo']).strip():
+                return JsonResponse({'error': f'Comentario inválido en el ticket #{ticket_id}.'}, status=400)
+            hilo.append((autores[str(c['autor'])], str(c['cuerpo']), fecha))
+        preparados.append((tickets[ticket_id], hilo))
+
+    total = 0
+    with transaction.atomic():
+        for ticket, hilo in preparados:
+            total += len(comentarios.importar_hilo(ticket, hilo))
+    for ticket, hilo in preparados:
+        auditoria.registrar(
+            auditoria.COMENTARIOS_IMPORTADOS, f"Usuario '{request.user.username}' importó {len(hilo)} comentarios en el ticket #{ticket.id}.",
+            actor=request.user, ticket=ticket, nuevo=len(hilo),
+        )
+    return JsonResponse({'importados': total})
+
 
 @login_required
 def lista_usuarios_view(request: HttpRequest) -> HttpResponse:
@@ -405,7 +701,10 @@ def crear_usuario_view(request: HttpRequest) -> HttpResponse:
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
             new_user = form.save()
-            audit_log.info(f"USUARIO CREADO: Admin '{request.user.username}' creó al usuario '{new_user.username}'.")
+            auditoria.registrar(
+                auditoria.USUARIO_CREADO, f"Admin '{request.user.username}' creó al usuario '{new_user.username}'.",
+                actor=request.user, usuario=new_user, nuevo=new_user.username,
+            )
             messages.success(request, '¡Usuario creado exitosamente!')
             return redirect('lista_usuarios')
     else:
@@ -423,7 +722,11 @@ def toggle_usuario_status_view(request: HttpRequest, user_id: int) -> HttpRespon
             new_status = "Habilitado" if not usuario_a_modificar.is_active else "Deshabilitado"
             usuario_a_modificar.is_active = not usuario_a_modificar.is_active
             usuario_a_modificar.save()
-            audit_log.info(f"ESTADO DE USUARIO: Admin '{request.user.username}' ha cambiado el estado de '{usuario_a_modificar.username}' a '{new_status}'.")
+            auditoria.registrar(
+                auditoria.ESTADO_USUARIO,
+                f"Admin '{request.user.username}' ha cambiado el estado de '{usuario_a_modificar.username}' a '{new_status}'.",
+                actor=request.user, usuario=usuario_a_modificar, nuevo=new_status,
+            )
     except User.DoesNotExist:
         pass
     return redirect('lista_usuarios')
@@ -440,7 +743,11 @@ def cambiar_contrasena_view(request: HttpRequest, user_id: int) -> HttpResponse:
         form = AdminPasswordChangeForm(user_to_change, request.POST)
         if form.is_valid():
             form.save()
-            audit_log.info(f"CAMBIO DE CONTRASEÑA: Admin '{request.user.username}' cambió la contraseña para el usuario '{user_to_change.username}'.")
+            auditoria.registrar(
+                auditoria.CAMBIO_CONTRASENA,
+                f"Admin '{request.user.username}' cambió la contraseña para el usuario '{user_to_change.username}'.",
+                actor=request.user, usuario=user_to_change,
+            )
             messages.success(request, f'¡Contraseña para {user_to_change.username} cambiada exitosamente!')
             return redirect('lista_usuarios')
     else:
@@ -479,7 +786,7 @@ def perfil_view(request: HttpRequest) -> HttpResponse:
 
 @login_required
 def crear_aviso_view(request: HttpRequest) -> HttpResponse:
-    if not request.user.groups.filter(name='Enviar Avisos').exists():
+    if not contexto_autorizacion(request).puede_enviar_avisos:
         return redirect('dashboard')
     if request.method == 'POST':
         form = AvisoForm(request.POST)
@@ -487,7 +794,7 @@ def crear_aviso_view(request: HttpRequest) -> HttpResponse:
             aviso = form.save(commit=False)
             aviso.autor = request.user
             aviso.save()
-            audit_log.info(f"AVISO CREADO: Admin '{request.user.username}' creó el aviso '{aviso.titulo}'.")
+            auditoria.registrar(auditoria.AVISO_CREADO, f"Admin '{request.user.username}' creó el aviso '{aviso.titulo}'.", actor=request.user, nuevo=aviso.titulo)
             return redirect('lista_avisos')
     else:
         form = AvisoForm()
@@ -495,48 +802,137 @@ def crear_aviso_view(request: HttpRequest) -> HttpResponse:
 
 @login_required
 def lista_avisos_view(request: HttpRequest) -> HttpResponse:
-    avisos = Aviso.objects.all()
-    user_can_send_avisos = request.user.groups.filter(name='Enviar Avisos').exists()
-    for aviso in avisos:
-        aviso.leido_por.add(request.user)
+    if request.method == 'POST':
+        if 'marcar_todos' in request.POST:
+            ultimo_id = Aviso.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+            LecturaAvisos.marcar_todos_leidos(request.user.id, ultimo_id)
+        elif request.POST.get('aviso_id', '').isdigit():
+            LecturaAvisos.marcar(request.user.id, int(request.POST['aviso_id']), request.POST.get('leido') == '1')
+        return redirect(request.get_full_path())
+
+    user_can_send_avisos = contexto_autorizacion(request).puede_enviar_avisos
+    pagina = paginar_por_cursor(
+        Aviso.objects.select_related('autor'),
+        'fecha_creacion',
+        getattr(settings, 'AVISOS_POR_PAGINA', 20),
+        despues=request.GET.get('despues', ''),
+        antes=request.GET.get('antes', ''),
+    ).construir_urls(request.GET)
+
+    # Se resaltan los que estaban sin leer antes de entrar; después se avanza la marca de agua
+    no_leidos_ids = set(LecturaAvisos.no_leidos(request.user).filter(id__in=pagina.ids).values_list('id', flat=True))
+    ultimo_id = Aviso.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    LecturaAvisos.avanzar(request.user.id, ultimo_id)
+
     context = {
-        'avisos': avisos,
+        'avisos': pagina,
+        'pagina': pagina,
+        'no_leidos_ids': no_leidos_ids,
         'user_can_send_avisos': user_can_send_avisos,
     }
     return render(request, 'gestion/lista_avisos.html', context)
 
+def _fecha_param(request: HttpRequest, nombre: str):
+    try:
+        return parse_date(request.GET.get(nombre) or '')
+    except ValueError:
+        return None
 
 @login_required
 def ver_logs_view(request: HttpRequest) -> HttpResponse:
     if not request.user.is_staff:
         return redirect('dashboard')
-    log_file_path = os.path.join(settings.BASE_DIR, 'audit.log')
-    log_lines = []
-    try:
-        with open(log_file_path, 'r') as f:
-            log_lines = f.readlines()[::-1]
-    except FileNotFoundError:
-        log_lines = ["El archivo de auditoría no ha sido creado todavía."]
-    return render(request, 'gestion/ver_logs.html', {'log_lines': log_lines})
+    filtros = {
+        'evento': request.GET.get('evento', ''),
+        'usuario': request.GET.get('usuario', '').strip(),
+        'desde': _fecha_param(request, 'desde'),
+        'hasta': _fecha_param(request, 'hasta'),
+    }
+    if not visor_logs.segmentos():
+        return render(request, 'gestion/ver_logs.html', {
+            'log_lines': ["El archivo de auditoría no ha sido creado todavía."], 'eventos': auditoria.EVENTOS, 'filtros': filtros,
+        })
+
+    pagina = visor_logs.leer_pagina(request.GET.get('cursor', ''), **filtros)
+    url_siguiente = None
+    if pagina.cursor_siguiente:
+        params = request.GET.copy()
+        params['cursor'] = pagina.cursor_siguiente
+        url_siguiente = f'?{params.urlencode()}'
+    context = {
+        'log_lines': pagina,
+        'eventos': auditoria.EVENTOS,
+        'filtros': filtros,
+        'url_siguiente': url_siguiente,
+        'es_primera_pagina': not request.GET.get('cursor'),
+    }
+    return render(request, 'gestion/ver_logs.html', context)
+
+@login_required
+def rendimiento_view(request: HttpRequest) -> HttpResponse:
+    """ URLs más lentas y consultas más repetidas de los últimos minutos, según gestion.rendimiento. """
+    if not request.user.is_staff:
+        return redirect('dashboard')
+    vistas, huellas = rendimiento.resumen()
+    limite = getattr(settings, 'RENDIMIENTO_FILAS', 30)
+    return render(request, 'gestion/rendimiento.html', {
+        'vistas': vistas[:limite],
+        'huellas': huellas[:limite],
+        'ventana': getattr(settings, 'RENDIMIENTO_VENTANA_MINUTOS', 15),
+    })
+
+@login_required
+def perfilador_view(request: HttpRequest) -> HttpResponse:
+    """ Muestras del buffer de gestion.perfilador, la más reciente primero. """
+    if not request.user.is_staff:
+        return redirect('dashboard')
+    return render(request, 'gestion/perfilador.html', {
+        'muestras': perfilador.muestras(),
+        'cada': getattr(settings, 'PERFILADOR_MUESTREO_CADA', 1000),
+    })
+
+@login_required
+def perfil_muestra_view(request: HttpRequest, muestra_id: str) -> HttpResponse:
+    """ Informe de una muestra; con ?formato=prof descarga el .prof. """
+    if not request.user.is_staff:
+        return redirect('dashboard')
+    muestra = perfilador.muestra(muestra_id)
+    if muestra is None:
+        raise Http404("La muestra ya no está en el buffer.")
+    if request.GET.get('formato') == 'prof':
+        if muestra['prof'] is None:
+            raise Http404("El perfil de esta muestra era demasiado grande para guardarlo.")
+        return perfilador.respuesta_prof(muestra['prof'], muestra['nombre_archivo'])
+    return render(request, 'gestion/perfil_request.html', {'muestra': muestra})
 
 @login_required
 def telefonos_view(request: HttpRequest) -> HttpResponse:
-    directorio = []
-    csv_file_path = os.path.join(settings.BASE_DIR, 'directorio.csv')
-    try:
-        with open(csv_file_path, mode='r', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                if len(row) == 2:
-                    nombre = row[0].replace('"', '').strip()
-                    interno = row[1].strip()
-                    if nombre and interno: 
-                        directorio.append({'nombre': nombre, 'interno': interno})
-    except FileNotFoundError:
-        print(f"ADVERTENCIA: El archivo 'directorio.csv' no se encontró en {csv_file_path}")
-    context = {'directorio': directorio}
+    contactos = directorio.obtener().contactos
+    context = {'directorio': [{'nombre': nombre, 'interno': interno} for nombre, interno in contactos]}
     return render(request, 'gestion/telefonos.html', context)
 
+def _respuesta_directorio(request: HttpRequest, actual, cache_control: str) -> HttpResponse:
+    """ Directorio en JSON compacto ([[nombre, interno], ...]), filtrable por prefijo con ?q=, con ETag. """
+    consulta = request.GET.get('q', '')
+    etag = quote_etag(f"{actual.etag}-{hashlib.sha1(consulta.encode('utf-8')).hexdigest()[:8]}" if consulta else actual.etag)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = JsonResponse({'contactos': actual.buscar(consulta)}, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = cache_control
+    return respuesta
+
+@login_required
+def directorio_telefonos_view(request: HttpRequest) -> HttpResponse:
+    """ Directorio completo (CSV y números de los perfiles) para la página con sesión. """
+    return _respuesta_directorio(request, directorio.obtener(), 'private, no-cache')
+
+@require_GET
+def directorio_telefonos_publico_view(request: HttpRequest) -> HttpResponse:
+    """ Solo lectura y sin sesión, para la página de teléfonos independiente: únicamente el directorio.csv. """
+    return _respuesta_directorio(request, directorio.obtener(publico=True), 'public, no-cache')
+
 @login_required
 def cambiar_area_view(request: HttpRequest, user_id: int) -> HttpResponse:
     if not request.user.is_staff:
@@ -584,13 +980,36 @@ def informes_view(request: HttpRequest) -> HttpResponse:
     """
     Vista mejorada para generar un informe completo del sistema de tickets.
     """
-    if not request.user.groups.filter(name='Informe').exists():
+    if not contexto_autorizacion(request).puede_ver_informes:
         return redirect('dashboard')
 
-    total_tickets = Ticket.objects.count()
-    tickets_pendientes = Ticket.objects.filter(estado__nombre_estado='Pendiente').count()
-    tickets_aceptados = Ticket.objects.filter(estado__nombre_estado='Aceptado').count()
-    tickets_finalizados = Ticket.objects.filter(estado__nombre_estado='Finalizado').count()
+    # Totales desde el rollup: su tamaño depende de estados × áreas × usuarios, no de la cantidad de tickets
+    resumen = list(ResumenTicket.objects.filter(total__gt=0).values_list(
+        'estado__nombre_estado', 'area_id_clave', 'usuario_asignado_id_clave', 'total', 'segundos_resolucion'
+    ))
+    por_estado = Counter()
+    por_area = Counter()
+    resolucion_por_area = {}
+    resueltos_por_usuario = Counter()
+    for estado, area_id, usuario_id, total, segundos in resumen:
+        por_estado[estado] += total
+        if area_id:
+            por_area[area_id] += total
+        if estado == 'Finalizado':
+            if area_id:
+                cantidad, suma = resolucion_por_area.get(area_id, (0, 0))
+                resolucion_por_area[area_id] = (cantidad + total, suma + segundos)
+            if usuario_id:
+                resueltos_por_usuario[usuario_id] += total
+
+    nombres_area = dict(Area.objects.filter(id__in=set(por_area) | set(resolucion_por_area)).values_list('id', 'nombre'))
+    top_usuarios = resueltos_por_usuario.most_common(10)
+    nombres_usuario = dict(User.objects.filter(id__in=[u for u, _ in top_usuarios]).values_list('id', 'username'))
+
+    total_tickets = sum(por_estado.values())
+    tickets_pendientes = por_estado['Pendiente']
+    tickets_aceptados = por_estado['Aceptado']
+    tickets_finalizados = por_estado['Finalizado']
     usuarios_activos = User.objects.filter(is_active=True).count()
     tickets_sin_finalizar = tickets_aceptados + tickets_pendientes
 
@@ -605,32 +1024,31 @@ def informes_view(request: HttpRequest) -> HttpResponse:
         porcentaje_tickets_finalizados = 0
         porcentaje_tickets_sin_finalizar = 0
 
-    tickets_asignados_por_area = Ticket.objects.filter(area_asignada__isnull=False) \
-        .values('area_asignada__nombre') \
-        .annotate(total=Count('id')) \
-        .order_by('-total')
+    tickets_asignados_por_area = [
+        {'area_asignada__nombre': nombres_area.get(area_id), 'total': total}
+        for area_id, total in por_area.most_common()
+    ]
 
-    tiempo_promedio_resolucion_area = Ticket.objects.filter(estado__nombre_estado='Finalizado', area_asignada__isnull=False) \
-        .values('area_asignada__nombre') \
-        .annotate(tiempo_promedio=Avg(F('fecha_actualizacion') - F('fecha_creacion'))) \
-        .order_by('tiempo_promedio')
+    tiempo_promedio_resolucion_area = sorted(
+        (
+            {'area_asignada__nombre': nombres_area.get(area_id), 'tiempo_promedio': timedelta(seconds=suma / cantidad)}
+            for area_id, (cantidad, suma) in resolucion_por_area.items() if cantidad
+        ),
+        key=lambda fila: fila['tiempo_promedio'],
+    )
 
-    tickets_resueltos_por_usuario = Ticket.objects.filter(estado__nombre_estado='Finalizado', usuario_asignado__isnull=False) \
-        .values('usuario_asignado__username') \
-        .annotate(total=Count('id')) \
-        .order_by('-total')[:10]
+    tickets_resueltos_por_usuario = [
+        {'usuario_asignado__username': nombres_usuario.get(usuario_id), 'total': total}
+        for usuario_id, total in top_usuarios
+    ]
 
     fecha_limite = timezone.now() - timedelta(days=5)
     tickets_estancados = Ticket.objects.exclude(estado__nombre_estado='Finalizado') \
         .filter(fecha_ultima_modificacion__lte=fecha_limite) \
-        .order_by('fecha_ultima_modificacion')
+        .only('id', 'titulo', 'fecha_ultima_modificacion') \
+        .order_by('fecha_ultima_modificacion')[:getattr(settings, 'INFORMES_MAX_ESTANCADOS', 100)]
 
-    titulos = Ticket.objects.values_list('titulo', flat=True)
-    texto_completo = " ".join(titulos).lower()
-    palabras = re.findall(r'\b\w+\b', texto_completo)
-    stopwords = ['de', 'la', 'el', 'en', 'y', 'a', 'los', 'del', 'con', 'por', 'para', 'un', 'una', 'se', 'no', 'que', 'es', 'este', 'esta']
-    palabras_filtradas = [p for p in palabras if p.isalpha() and p not in stopwords and len(p) > 2]
-    conteo_palabras = Counter(palabras_filtradas).most_common(10)
+    conteo_palabras = FrecuenciaPalabra.mas_frecuentes(10)
 
     context = {
         'total_tickets': total_tickets,
@@ -719,6 +1137,38 @@ def custom_500_view(request):
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+def _ip_cliente(request: HttpRequest) -> str:
+    """
+    IP del cliente para los límites de acceso_cp y la lista de /metrics.
+    Sin proxy, REMOTE_ADDR. Detrás de nginx REMOTE_ADDR es el propio proxy: hay que
+    poner CABECERA_IP_CLIENTE = 'HTTP_X_REAL_IP' y que nginx la pise siempre
+    (proxy_set_header X-Real-IP $remote_addr). Nunca X-Forwarded-For, que la manda el cliente.
+    """
+    return request.META.get(getattr(settings, 'CABECERA_IP_CLIENTE', 'REMOTE_ADDR'), '')
+
+def _demasiados_intentos(espera: float) -> JsonResponse:
+    metricas.ACCESO_CP.inc(resultado='limite_ip')
+    codigo, status, mensaje = acceso_cp.DEMASIADOS_INTENTOS
+    respuesta = JsonResponse({'status': status, 'message': mensaje}, status=codigo)
+    respuesta['Retry-After'] = acceso_cp.segundos_reintento(espera)
+    return respuesta
+
+def _ip_permitida(ip: str, redes) -> bool:
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in ipaddress.ip_network(red, strict=False) for red in redes)
+
+def metricas_view(request: HttpRequest) -> HttpResponse:
+    """
+    Métricas para Prometheus; solo desde las redes de METRICAS_IPS_PERMITIDAS
+    (por ejemplo ['10.0.5.20/32']). Sin esa lista no se sirven a nadie.
+    """
+    if not _ip_permitida(_ip_cliente(request), getattr(settings, 'METRICAS_IPS_PERMITIDAS', [])):
+        return HttpResponse('Acceso denegado.', status=403)
+    return HttpResponse(metricas.exposicion(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @csrf_exempt
 def verificar_acceso_cp(request):
     if request.method != 'POST':
@@ -726,27 +1176,50 @@ def verificar_acceso_cp(request):
 
     try:
         data = json.loads(request.body)
-        username = data.get('username')
-        password = data.get('password')
+        espera = acceso_cp.limite_ip(_ip_cliente(request))
+        if espera:
+            return _demasiados_intentos(espera)
 
-        if not username or not password:
-            return JsonResponse({'status': 'error', 'message': 'Faltan credenciales.'}, status=400)
+        codigo, status, mensaje = acceso_cp.verificar(data.get('username'), data.get('password'))
+        return JsonResponse({'status': status, 'message': mensaje}, status=codigo)
 
-        user = User.objects.filter(username__iexact=username).first()
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Error en el formato de datos (JSON).'}, status=400)
+    except Exception:
+        logger.exception("Error inesperado en verificar_acceso_cp")
+        return JsonResponse({'status': 'error', 'message': 'Error interno del servidor.'}, status=500)
 
-        if user and user.check_password(password):
-            if user.is_active:
-                if user.groups.filter(name='CP Access').exists():
-                    return JsonResponse({'status': 'ok', 'message': 'Acceso concedido.'})
-                else:
-                    return JsonResponse({'status': 'error', 'message': 'Usuario no tiene permisos para CP.'}, status=403)
-            else:
-                return JsonResponse({'status': 'error', 'message': 'La cuenta de usuario está inactiva.'}, status=403)
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Credenciales inválidas.'}, status=401)
+@csrf_exempt
+def verificar_acceso_cp_lote(request):
+    """
+    Verifica muchas credenciales de una vez (terminales que sincronizan tarjetas).
+    Cuerpo: {"credenciales": [{"username": ..., "password": ...}, ...]}; la respuesta
+    trae un resultado por credencial, en el mismo orden.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido.'}, status=405)
 
-    except json.JSONDecodeError:
+    try:
+        credenciales = json.loads(request.body)['credenciales']
+        if not isinstance(credenciales, list) or not all(isinstance(c, dict) for c in credenciales):
+            raise TypeError
+    except (json.JSONDecodeError, KeyError, TypeError):
         return JsonResponse({'status': 'error', 'message': 'Error en el formato de datos (JSON).'}, status=400)
-    except Exception as e:
-        print(f"ERROR INESPERADO en verificar_acceso_cp: {e}")
-        return JsonResponse({'status': 'error', 'message': 'Error interno del servidor.'}, status=500)
\ No newline at end of file
+
+    maximo = getattr(settings, 'CP_LOTE_MAXIMO', 100)
+    if len(credenciales) > maximo:
+        return JsonResponse({'status': 'error', 'message': f'Máximo {maximo} credenciales por lote.'}, status=400)
+
+    espera = acceso_cp.limite_ip(_ip_cliente(request), costo=max(len(credenciales), 1))
+    if espera:
+        return _demasiados_intentos(espera)
+
+    try:
+        resultados = [
+            {'username': username, 'status': status, 'code': codigo, 'message': mensaje}
+            for username, (codigo, status, mensaje) in acceso_cp.verificar_lote(credenciales)
+        ]
+    except Exception:
+        logger.exception("Error inesperado en verificar_acceso_cp_lote")
+        return JsonResponse({'status': 'error', 'message': 'Error interno del servidor.'}, status=500)
+    return JsonResponse({'status': 'ok', 'resultados': resultados})
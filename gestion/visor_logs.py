@@ -0,0 +1,276 @@
+# /var/www/tickets/gestion/visor_logs.py
+"""
+Lectura paginada del log de auditoría sin cargarlo entero en memoria.
+
+Las páginas se leen hacia atrás desde el final del archivo, en bloques, y el
+cursor es "segmento:offset" (bytes). Después del log activo se recorren los
+segmentos rotados (audit.log.1, audit.log.2.gz, ...) del más nuevo al más viejo.
+
+Cada segmento tiene un índice `<segmento>.idx` (JSON) con el offset donde empieza
+cada día. Se extiende de forma incremental a medida que crece el archivo y permite
+saltar a una fecha sin recorrer lo que hay después. Los índices van en su propia
+carpeta (AUDIT_LOG_INDICES_DIR) y no al lado del log: si no, el handler que rota
+audit.log.* los contaría como segmentos viejos y los borraría o rotaría.
+"""
+
+import gzip
+import json
+import os
+import re
+from collections import deque
+
+from django.conf import settings
+
+TAMANO_BLOQUE = 64 * 1024
+SUFIJO_INDICE = '.idx'
+
+_RE_FECHA = re.compile(rb'(\d{4}-\d{2}-\d{2})')
+_RE_EVENTO = re.compile(r"([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ ()]*?):\s")
+_RE_USUARIO = re.compile(r"'([^']*)'")
+
+
+def ruta_log() -> str:
+    return getattr(settings, 'AUDIT_LOG_PATH', os.path.join(settings.BASE_DIR, 'audit.log'))
+
+
+def carpeta_indices() -> str:
+    carpeta, base = os.path.split(ruta_log())
+    return getattr(settings, 'AUDIT_LOG_INDICES_DIR', os.path.join(carpeta, f'.indices-{base}'))
+
+
+def _ruta_indice(segmento: str) -> str:
+    return os.path.join(carpeta_indices(), segmento + SUFIJO_INDICE)
+
+
+def logs_por_pagina() -> int:
+    return getattr(settings, 'LOGS_POR_PAGINA', 200)
+
+
+def _fecha_de(linea: bytes):
+    """ Fecha ISO (str) del encabezado de la línea, o None si no tiene. """
+    coincidencia = _RE_FECHA.search(linea, 0, 40)
+    return coincidencia.group(1).decode('ascii') if coincidencia else None
+
+
+class LineaLog:
+    def __init__(self, linea: bytes, segmento: str, offset: int):
+        self.texto = linea.decode('utf-8', errors='replace').rstrip('\r\n')
+        self.segmento = segmento
+        self.offset = offset
+        self.fecha = _fecha_de(linea)
+        evento = _RE_EVENTO.search(self.texto)
+        self.evento = evento.group(1) if evento else ''
+        usuario = _RE_USUARIO.search(self.texto)
+        self.usuario = usuario.group(1) if usuario else ''
+
+    def __str__(self):
+        return self.texto
+
+
+class PaginaLog:
+    def __init__(self, lineas, cursor_siguiente):
+        self.lineas = lineas
+        self.cursor_siguiente = cursor_siguiente
+
+    def __iter__(self):
+        return iter(self.lineas)
+
+    def __len__(self):
+        return len(self.lineas)
+
+
+def segmentos():
+    """ Archivos del log (solo el nombre), del más nuevo al más viejo. """
+    carpeta, base = os.path.split(ruta_log())
+    try:
+        nombres = os.listdir(carpeta or '.')
+    except FileNotFoundError:
+        return []
+    # Sin los índices que versiones anteriores dejaban al lado (.idx y sus temporales .idx.<pid>)
+    rotados = [n for n in nombres if n.startswith(base + '.') and SUFIJO_INDICE not in n]
+    rotados.sort(key=lambda n: os.path.getmtime(os.path.join(carpeta, n)), reverse=True)
+    return ([base] if base in nombres else []) + rotados
+
+
+def _ruta(segmento: str) -> str:
+    return os.path.join(os.path.dirname(ruta_log()), segmento)
+
+
+def _es_gzip(segmento: str) -> bool:
+    return segmento.endswith('.gz')
+
+
+def _abrir(segmento: str):
+    ruta = _ruta(segmento)
+    return gzip.open(ruta, 'rb') if _es_gzip(segmento) else open(ruta, 'rb')
+
+
+def indice_de(segmento: str) -> dict:
+    """
+    {'firma': ..., 'tamano': bytes indexados, 'dias': [[fecha, offset], ...]} al día con el archivo.
+    Si el archivo fue rotado o truncado (cambia el inodo o se achica) se rehace desde cero.
+    Los offsets de los .gz son sobre el contenido descomprimido.
+    """
+    ruta = _ruta(segmento)
+    estado = os.stat(ruta)
+    firma = [estado.st_ino, estado.st_size] if _es_gzip(segmento) else [estado.st_ino]
+    try:
+        with open(_ruta_indice(segmento), 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+    except (OSError, ValueError):
+        indice = None
+    if not indice or indice.get('firma') != firma or (not _es_gzip(segmento) and estado.st_size < indice['tamano']):
+        indice = {'firma': firma, 'tamano': 0, 'dias': []}
+    elif _es_gzip(segmento) or estado.st_size == indice['tamano']:
+        return indice
+
+    dias = indice['dias']
+    ultima = dias[-1][0] if dias else None
+    offset = indice['tamano']
+    with _abrir(segmento) as f:
+        f.seek(offset)
+        for linea in f:
+            if not linea.endswith(b'\n'):
+                break  # línea a medio escribir: se indexa la próxima vez
+            fecha = _fecha_de(linea)
+            if fecha and fecha != ultima:
+                dias.append([fecha, offset])
+                ultima = fecha
+            offset += len(linea)
+    indice['tamano'] = offset
+
+    try:
+        os.makedirs(carpeta_indices(), exist_ok=True)
+        temporal = f'{_ruta_indice(segmento)}.{os.getpid()}'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(indice, f)
+        os.replace(temporal, _ruta_indice(segmento))
+    except OSError:
+        pass  # sin permiso de escritura el índice se recalcula en cada vista
+    return indice
+
+
+def _offset_despues_de(indice: dict, fecha: str):
+    """ Offset del primer día posterior a `fecha`, o None si el segmento termina antes. """
+    for dia, offset in indice['dias']:
+        if dia > fecha:
+            return offset
+    return None
+
+
+def _lineas_hacia_atras(f, fin: int):
+    """ (offset, línea) desde `fin` hacia el principio, leyendo bloques de TAMANO_BLOQUE. """
+    resto = b''
+    posicion = fin
+    while posicion > 0:
+        inicio = max(0, posicion - TAMANO_BLOQUE)
+        f.seek(inicio)
+        partes = (f.read(posicion - inicio) + resto).split(b'\n')
+        resto = partes[0]
+        offsets = []
+        offset = inicio + len(resto) + 1
+        for parte in partes[1:]:
+            offsets.append(offset)
+            offset += len(parte) + 1
+        for offset, parte in zip(reversed(offsets), reversed(partes[1:])):
+            if parte:
+                yield offset, parte
+        posicion = inicio
+    if resto:
+        yield 0, resto
+
+
+def _lineas_hacia_adelante(f, fin: int):
+    offset = 0
+    for linea in f:
+        if offset >= fin:
+            break
+        yield offset, linea.rstrip(b'\n')
+        offset += len(linea)
+
+
+def _buscar(segmento, fin, coincide, desde, cantidad):
+    """ Hasta `cantidad` líneas que coinciden antes de `fin`, de la más nueva a la más vieja, y si se cruzó `desde`. """
+    encontradas = []
+    with _abrir(segmento) as f:
+        if _es_gzip(segmento):
+            # gzip no permite leer hacia atrás: se recorre hacia adelante quedándose con las últimas
+            ultimas = deque(maxlen=cantidad)
+            cruzo_desde = False
+            for offset, linea in _lineas_hacia_adelante(f, fin):
+                if desde and (_fecha_de(linea) or desde) < desde:
+                    cruzo_desde = True
+                    continue
+                if coincide(linea):
+                    ultimas.append(LineaLog(linea, segmento, offset))
+            return list(reversed(ultimas)), cruzo_desde
+
+        for offset, linea in _lineas_hacia_atras(f, fin):
+            if desde and (_fecha_de(linea) or desde) < desde:
+                return encontradas, True
+            if coincide(linea):
+                encontradas.append(LineaLog(linea, segmento, offset))
+                if len(encontradas) >= cantidad:
+                    break
+    return encontradas, False
+
+
+def _filtro(evento: str, usuario: str):
+    evento_b = f'{evento}:'.encode('utf-8') if evento else None
+    usuario_b = f"'{usuario}'".encode('utf-8') if usuario else None
+
+    def coincide(linea: bytes) -> bool:
+        # Descarte barato sobre bytes; solo se parsea lo que puede coincidir
+        if evento_b and evento_b not in linea:
+            return False
+        if usuario_b and usuario_b not in linea:
+            return False
+        if not (evento or usuario):
+            return True
+        parseada = LineaLog(linea, '', 0)
+        return (not evento or parseada.evento == evento) and (not usuario or parseada.usuario == usuario)
+    return coincide
+
+
+def leer_pagina(cursor='', evento='', usuario='', desde=None, hasta=None, limite=None) -> PaginaLog:
+    """
+    Página de líneas del log, de la más reciente a la más antigua, filtrada por tipo de evento,
+    usuario (el primero entre comillas) y rango de fechas (date). `cursor` viene de la página anterior.
+    """
+    limite = limite or logs_por_pagina()
+    desde = desde.isoformat() if desde else None
+    hasta = hasta.isoformat() if hasta else None
+    coincide = _filtro(evento, usuario)
+
+    todos = segmentos()
+    segmento_cursor, offset_cursor = None, None
+    if cursor:
+        segmento_cursor, _, offset = cursor.rpartition(':')
+        if segmento_cursor not in todos or not offset.isdigit():
+            segmento_cursor = None
+        else:
+            offset_cursor = int(offset)
+            todos = todos[todos.index(segmento_cursor):]
+
+    lineas = []
+    for segmento in todos:
+        indice = indice_de(segmento)
+        if desde and indice['dias'] and indice['dias'][-1][0] < desde:
+            break  # este segmento y los siguientes son anteriores al rango
+
+        fin = os.path.getsize(_ruta(segmento)) if not _es_gzip(segmento) else indice['tamano']
+        if hasta:
+            despues = _offset_despues_de(indice, hasta)
+            if despues is not None:
+                fin = min(fin, despues)
+        if segmento == segmento_cursor:
+            fin = min(fin, offset_cursor)
+
+        encontradas, cruzo_desde = _buscar(segmento, fin, coincide, desde, limite - len(lineas))
+        lineas.extend(encontradas)
+        if len(lineas) >= limite:
+            ultima = lineas[-1]
+            return PaginaLog(lineas, f'{ultima.segmento}:{ultima.offset}')
+        if cruzo_desde:
+            break
+    return PaginaLog(lineas, None)
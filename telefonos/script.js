@@ -1,81 +1,84 @@
-document.addEventListener('DOMContentLoaded', function() {
-    const csvFilePath = 'directorio.csv';
+// Variante pública del directorio: esta página se abre sin sesión
+const directorioUrl = '/telefonos/publico.json';
+
+let searchTimer = null;
+let pendingRequest = null;
+
+function renderContacts(contactos) {
     const userTable = document.getElementById('userTable');
-    const loadingMessage = document.getElementById('loadingMessage');
+    userTable.innerHTML = '';
+
+    contactos.forEach(([userName, userExtension]) => {
+        const newRow = document.createElement('tr');
+
+        const nameCell = document.createElement('td');
+        nameCell.textContent = userName;
 
-    fetch(csvFilePath)
+        const extensionCell = document.createElement('td');
+        extensionCell.textContent = userExtension;
+
+        newRow.appendChild(nameCell);
+        newRow.appendChild(extensionCell);
+
+        newRow.style.cursor = 'pointer';
+        newRow.addEventListener('click', function() {
+            const textToCopy = `${userName} | Interno: ${userExtension}`;
+
+            navigator.clipboard.writeText(textToCopy).then(() => {
+                newRow.classList.add('copied');
+
+                setTimeout(() => {
+                    newRow.classList.remove('copied');
+                }, 500);
+            }).catch(err => {
+                console.error('Error al copiar al portapapeles:', err);
+            });
+        });
+
+        userTable.appendChild(newRow);
+    });
+}
+
+function loadContacts(query) {
+    if (pendingRequest) {
+        pendingRequest.abort();
+    }
+    pendingRequest = new AbortController();
+
+    const url = query ? `${directorioUrl}?q=${encodeURIComponent(query)}` : directorioUrl;
+    // El servidor responde con ETag: el navegador revalida y reutiliza su copia si no cambió
+    return fetch(url, { credentials: 'same-origin', signal: pendingRequest.signal })
         .then(response => {
             if (!response.ok) {
-                throw new Error('Error al cargar el archivo: ' + response.statusText);
+                throw new Error('Error al cargar el directorio: ' + response.statusText);
             }
-            return response.text();
+            return response.json();
         })
-        .then(csvText => {
+        .then(datos => renderContacts(datos.contactos));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const loadingMessage = document.getElementById('loadingMessage');
+
+    loadContacts('')
+        .then(() => {
             loadingMessage.style.display = 'none';
-            
-            const rows = csvText.trim().split('\n');
-            
-            rows.forEach(rowText => {
-                if (rowText.trim() === '') return;
-
-                const columns = rowText.split(',');
-                if (columns.length === 2) {
-                    const userName = columns[0].replace(/"/g, '').trim();
-                    const userExtension = columns[1].trim();
-
-                    const newRow = document.createElement('tr');
-                    
-                    const nameCell = document.createElement('td');
-                    nameCell.textContent = userName;
-                    
-                    const extensionCell = document.createElement('td');
-                    extensionCell.textContent = userExtension;
-                    
-                    newRow.appendChild(nameCell);
-                    newRow.appendChild(extensionCell);
-
-                    newRow.style.cursor = 'pointer'; 
-                    newRow.addEventListener('click', function() {
-                        const textToCopy = `${userName} | Interno: ${userExtension}`;
-                        
-                        navigator.clipboard.writeText(textToCopy).then(() => {
-                            newRow.classList.add('copied');
-                            
-                            setTimeout(() => {
-                                newRow.classList.remove('copied');
-                            }, 500);
-                        }).catch(err => {
-                            console.error('Error al copiar al portapapeles:', err);
-                        });
-                    });
-                    
-                    userTable.appendChild(newRow);
-                }
-            });
         })
         .catch(error => {
             loadingMessage.textContent = 'No se pudo cargar el directorio. Comuníquese al area de SISTEMAS 329.';
-            console.error('Error al leer el CSV:', error);
+            console.error('Error al leer el directorio:', error);
         });
 });
 
 const searchInput = document.getElementById('searchInput');
 
 searchInput.addEventListener('input', function() {
-    const filter = searchInput.value.toLowerCase();
-    const tableRows = document.getElementById('userTable').getElementsByTagName('tr');
-
-    for (let i = 0; i < tableRows.length; i++) {
-        let row = tableRows[i];
-        let userNameCell = row.getElementsByTagName('td')[0];
-        
-        if (userNameCell) {
-            let userName = userNameCell.textContent || userNameCell.innerText;
-            if (userName.toLowerCase().indexOf(filter) > -1) {
-                row.style.display = "";
-            } else {
-                row.style.display = "none";
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(function() {
+        loadContacts(searchInput.value.trim()).catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error al buscar en el directorio:', error);
             }
-        }
-    }
+        });
+    }, 200);
 });